@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# AGREGADOR
+# Descripcion: Estadisticas incrementales de los resultados, separadas por ejecucion (run)
+# Media y desviacion con el algoritmo de Welford: memoria constante sin importar
+# cuantos resultados lleguen
+# Las ejecuciones en modo sensibilidad acumulan ademas los indices de Sobol
+# Cada resultado trae el (run_id, seq) de su escenario: un bitmap de los seq vistos
+# descarta los duplicados (escenarios reentregados) y cuenta los faltantes
+# Las salidas adicionales (variantes) se evaluan sobre los mismos escenarios que la principal:
+# ademas de sus estadisticas se acumula la diferencia pareada contra la principal
+# Con muestreo por importancia o estratificado cada resultado trae su peso (p/q) y estrato:
+# EstimadorPonderado da la media y la probabilidad del evento de cola sin sesgo, con su
+# intervalo y el tamano de muestra efectivo
+# Las ejecuciones en modo barrido acumulan las estadisticas de cada punto de la reticula y su
+# diferencia pareada contra el primer punto (mismos escenarios base)
+# MonitorWorkers sigue los latidos de los workers: tasa (EWMA), rezagados y caidos
+# Un mensaje de resultados puede traer los de un lote de escenarios ('resultados' con seq
+# consecutivas desde 'seq'): expandir_resultado los separa y seqs_fallidos da los que no se
+# pudieron evaluar (se cuentan aparte para no confundirlos con mensajes perdidos)
+
+import math
+import time
+import statistics
+from config import (EWMA_ALFA, LATIDO_INTERVALO, LATIDOS_PERDIDOS_CAIDO, FACTOR_REZAGADO,
+                    CONFIANZA_SALIDAS, CONFIANZA_PONDERADO)
+from sensibilidad import IndicesSobol
+from barrido import puntos_barrido
+from bitmap import BitmapRoaring
+
+# Promedio movil exponencial (None = sin mediciones)
+def ewma(anterior, valor, alfa=EWMA_ALFA):
+    return valor if anterior is None else alfa * valor + (1 - alfa) * anterior
+
+# Campos por escenario de un mensaje de resultados de un lote -> campo de cada resultado
+CAMPOS_LOTE = {'resultados': 'resultado', 'pesos': 'peso', 'estratos': 'estrato', 'eventos': 'evento'}
+
+# Resultados individuales de un mensaje de resultados (uno solo si no es de un lote)
+# Los escenarios del lote que no se pudieron evaluar (None) se omiten
+def expandir_resultado(data):
+    if 'resultados' not in data:
+        yield data
+        return
+    base = {k: v for k, v in data.items() if k not in CAMPOS_LOTE and k != 'salidas'}
+    listas = [(campo, data[lista]) for lista, campo in CAMPOS_LOTE.items() if lista in data]
+    salidas = data.get('salidas')
+    for i, valor in enumerate(data['resultados']):
+        if valor is None:
+            continue
+        resultado = dict(base, seq=data['seq'] + i)
+        for campo, valores in listas:
+            resultado[campo] = valores[i]
+        if salidas:
+            resultado['salidas'] = {nombre: valores[i] for nombre, valores in salidas.items()}
+        yield resultado
+
+# Seqs de los escenarios de un lote que no se pudieron evaluar (None en 'resultados')
+def seqs_fallidos(data):
+    if 'resultados' not in data or data.get('seq') is None:
+        return []
+    return [data['seq'] + i for i, valor in enumerate(data['resultados']) if valor is None]
+
+# Media, varianza (Welford), minimo y maximo de una serie de valores
+class Acumulador:
+    def __init__(self):
+        self.total = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+        self.positivos = 0 # Valores mayores que cero (para diferencias)
+
+    def agregar(self, valor):
+        self.total += 1
+        delta = valor - self.media
+        self.media += delta / self.total
+        self.m2 += delta * (valor - self.media)
+        self.minimo = min(self.minimo, valor)
+        self.maximo = max(self.maximo, valor)
+        if valor > 0:
+            self.positivos += 1
+
+    # Varianza poblacional
+    @property
+    def varianza(self):
+        return self.m2 / self.total if self.total > 0 else 0.0
+
+    @property
+    def desviacion(self):
+        return math.sqrt(self.varianza)
+
+    # Semiancho del intervalo de confianza de la media (aproximacion normal)
+    def error_media(self, confianza=CONFIANZA_SALIDAS):
+        if self.total < 2:
+            return math.inf
+        z = statistics.NormalDist().inv_cdf((1 + confianza) / 2)
+        return z * math.sqrt(self.m2 / (self.total - 1) / self.total)
+
+# Estimaciones con pesos (muestreo por importancia) y estratos (equiprobables, asignacion
+# proporcional): en cada estrato h se promedia peso * valor y la estimacion es el promedio de
+# los estratos. Varianza: suma de s_h^2 / n_h entre H^2 (con un solo estrato es la de siempre)
+class EstimadorPonderado:
+    def __init__(self):
+        self.estratos = {} # estrato -> (Acumulador de peso * valor, Acumulador de peso * evento)
+        self.total = 0
+        self.suma_pesos = 0.0
+        self.suma_pesos2 = 0.0
+        self.con_evento = False # Algun resultado trae el indicador del evento de cola
+
+    def agregar(self, valor, peso=1.0, estrato=0, evento=None):
+        acumuladores = self.estratos.get(estrato)
+        if acumuladores is None:
+            acumuladores = (Acumulador(), Acumulador())
+            self.estratos[estrato] = acumuladores
+        acumuladores[0].agregar(peso * valor)
+        if evento is not None:
+            acumuladores[1].agregar(peso * evento)
+            self.con_evento = True
+        self.total += 1
+        self.suma_pesos += peso
+        self.suma_pesos2 += peso * peso
+
+    # (estimacion, varianza) combinando los estratos. indice 0 = valor, 1 = evento
+    def combinar(self, indice):
+        acumuladores = [par[indice] for par in self.estratos.values() if par[indice].total > 0]
+        if not acumuladores:
+            return 0.0, math.inf
+        cantidad = len(acumuladores)
+        estimacion = sum(a.media for a in acumuladores) / cantidad
+        if any(a.total < 2 for a in acumuladores):
+            return estimacion, math.inf
+        varianza = sum(a.m2 / (a.total - 1) / a.total for a in acumuladores) / cantidad ** 2
+        return estimacion, varianza
+
+    # Tamano de muestra efectivo de Kish: (suma w)^2 / suma w^2 (= total sin pesos)
+    @property
+    def ess(self):
+        return self.suma_pesos ** 2 / self.suma_pesos2 if self.suma_pesos2 > 0 else 0.0
+
+    # {media, media_ic, ess, total, estratos[, prob_evento, prob_ic, n_equivalente]}
+    # n_equivalente: escenarios sin ponderar que darian el mismo intervalo para la probabilidad
+    def resumen(self, confianza=CONFIANZA_PONDERADO):
+        z = statistics.NormalDist().inv_cdf((1 + confianza) / 2)
+        media, varianza = self.combinar(0)
+        resumen = {'media': media, 'media_ic': z * math.sqrt(varianza), 'ess': self.ess,
+                   'total': self.total, 'estratos': len(self.estratos)}
+        if self.con_evento:
+            probabilidad, varianza = self.combinar(1)
+            resumen['prob_evento'] = probabilidad
+            resumen['prob_ic'] = z * math.sqrt(varianza)
+            if 0 < varianza < math.inf:
+                resumen['n_equivalente'] = probabilidad * (1 - probabilidad) / varianza
+            else:
+                resumen['n_equivalente'] = None
+        return resumen
+
+# Estadisticas de cada punto de un barrido. Los valores llegan por escenario base en el orden de
+# los puntos; la diferencia contra el primer punto es pareada (numeros aleatorios comunes)
+class ResultadosBarrido:
+    def __init__(self, ejes):
+        self.ejes = ejes
+        self.puntos = puntos_barrido(ejes)
+        self.acumuladores = [Acumulador() for _ in self.puntos]
+        self.diferencias = [Acumulador() for _ in self.puntos]
+
+    # valores: escenarios x puntos aplanado (None en las filas que no se pudieron evaluar)
+    def agregar(self, valores):
+        cantidad = len(self.puntos)
+        for inicio in range(0, len(valores), cantidad):
+            fila = valores[inicio:inicio + cantidad]
+            base = fila[0]
+            for acumulador, diferencia, valor in zip(self.acumuladores, self.diferencias, fila):
+                if valor is None:
+                    continue
+                acumulador.agregar(valor)
+                if base is not None:
+                    diferencia.agregar(valor - base)
+
+    # [{punto, media, desviacion, media_ic, diferencia, diferencia_ic, reduccion_varianza, total}]
+    # reduccion_varianza: lo que se gana en la diferencia frente a puntos con escenarios independientes
+    def resumen(self, confianza=CONFIANZA_SALIDAS):
+        base = self.acumuladores[0]
+        resumen = []
+        for punto, acumulador, diferencia in zip(self.puntos, self.acumuladores, self.diferencias):
+            independiente = base.varianza + acumulador.varianza
+            resumen.append({
+                'punto': punto,
+                'media': acumulador.media,
+                'desviacion': acumulador.desviacion,
+                'media_ic': acumulador.error_media(confianza),
+                'diferencia': diferencia.media,
+                'diferencia_ic': diferencia.error_media(confianza),
+                'reduccion_varianza': 1 - diferencia.varianza / independiente if independiente > 0 else 0.0,
+                'total': acumulador.total,
+            })
+        return resumen
+
+class EstadisticasEjecucion:
+    def __init__(self, run_id, modelo='Desconocido'):
+        self.run_id = run_id # Ejecucion a la que pertenecen los resultados
+        self.modelo = modelo # Nombre del modelo
+        self.total = 0 # Total de resultados
+        self.media = 0.0 # Media acumulada
+        self.m2 = 0.0 # Suma de cuadrados de las diferencias (Welford)
+        self.minimo = math.inf
+        self.maximo = -math.inf
+        self.workers = {} # worker_id -> {'procesados', 'ultimo_resultado'}
+        self.tiempo_inicio = None # Tiempo del primer resultado
+        self.ultimo_resultado_tiempo = None # Tiempo del ultimo resultado
+        self.sobol = None # IndicesSobol (solo ejecuciones en modo sensibilidad)
+        self.vistos = BitmapRoaring() # seq de los escenarios (o lotes) ya contados
+        self.duplicados = 0 # Resultados descartados por repetidos
+        self.fallidos = 0 # Escenarios que el worker no pudo evaluar (su seq cuenta como visto)
+        self.salidas = {} # nombre -> Acumulador de cada salida adicional
+        self.diferencias = {} # nombre -> Acumulador de (salida - principal) en el mismo escenario
+        self.ponderado = None # EstimadorPonderado (resultados con peso, estrato o evento)
+        self.barrido = None # ResultadosBarrido (solo ejecuciones en modo barrido)
+
+    # Registra el seq de un resultado. False si ya se habia contado (duplicado)
+    # Resultados sin seq (versiones anteriores) siempre se cuentan
+    def registrar(self, seq):
+        if seq is None or self.vistos.agregar(seq):
+            return True
+        self.duplicados += 1
+        return False
+
+    # Registra el seq de un escenario que no se pudo evaluar: no es un faltante
+    def registrar_fallido(self, seq):
+        if self.registrar(seq):
+            self.fallidos += 1
+
+    # Agrega un resultado de un worker. Regresa False si era duplicado
+    # salidas: {nombre: valor} de las salidas adicionales evaluadas en el mismo escenario
+    # peso, estrato, evento: muestreo por importancia / estratificado y evento de cola (0 o 1)
+    # Media, desviacion, minimo y maximo siguen siendo los de los valores sin ponderar
+    def agregar(self, valor, worker_id='desconocido', seq=None, salidas=None,
+                peso=None, estrato=None, evento=None):
+        if not self.registrar(seq):
+            return False
+        if peso is not None or estrato is not None or evento is not None:
+            if self.ponderado is None:
+                self.ponderado = EstimadorPonderado()
+            self.ponderado.agregar(valor, 1.0 if peso is None else peso,
+                                   0 if estrato is None else estrato, evento)
+        for nombre, valor_salida in (salidas or {}).items():
+            if nombre not in self.salidas:
+                self.salidas[nombre] = Acumulador()
+                self.diferencias[nombre] = Acumulador()
+            self.salidas[nombre].agregar(valor_salida)
+            self.diferencias[nombre].agregar(valor_salida - valor)
+        self.total += 1
+        delta = valor - self.media
+        self.media += delta / self.total
+        self.m2 += delta * (valor - self.media)
+        self.minimo = min(self.minimo, valor)
+        self.maximo = max(self.maximo, valor)
+
+        if worker_id not in self.workers: # Si es nuevo, se registra
+            self.workers[worker_id] = {'procesados': 0, 'ultimo_resultado': 0}
+        self.workers[worker_id]['procesados'] += 1
+        self.workers[worker_id]['ultimo_resultado'] = valor
+
+        ahora = time.time()
+        if self.tiempo_inicio is None:
+            self.tiempo_inicio = ahora
+        self.ultimo_resultado_tiempo = ahora
+        return True
+
+    # Agrega un lote evaluado de sensibilidad
+    # f(A) y f(B) son muestras independientes del modelo: tambien cuentan para media y desviacion
+    def agregar_sobol(self, sobol, worker_id='desconocido', seq=None):
+        if not self.registrar(seq):
+            return False
+        if self.sobol is None:
+            self.sobol = IndicesSobol(sobol['variables'])
+        self.sobol.agregar(sobol['fA'], sobol['fB'], sobol['fAB'])
+        extras = sobol.get('salidas', {})
+        for i, valor in enumerate(sobol['fA'] + sobol['fB']):
+            self.agregar(valor, worker_id, salidas={nombre: valores[i] for nombre, valores in extras.items()})
+        return True
+
+    # Agrega un mensaje evaluado de un barrido
+    # Media, desviacion y conteo de los workers son los del primer punto de la reticula
+    def agregar_barrido(self, barrido, worker_id='desconocido', seq=None):
+        if not self.registrar(seq):
+            return False
+        if self.barrido is None:
+            self.barrido = ResultadosBarrido(barrido['ejes'])
+        self.barrido.agregar(barrido['valores'])
+        cantidad = len(self.barrido.puntos)
+        for valor in barrido['valores'][::cantidad]:
+            if valor is not None:
+                self.agregar(valor, worker_id)
+            else:
+                self.fallidos += 1
+        return True
+
+    # Comparacion de cada salida adicional contra la principal:
+    # {nombre: {media, desviacion, diferencia, diferencia_ic, prob_mayor, reduccion_varianza}}
+    # reduccion_varianza: 1 - Var(dif) / (Var(principal) + Var(salida)), lo que se gana frente a
+    # correr cada variante con sus propios numeros aleatorios
+    def comparacion(self):
+        varianza_principal = self.m2 / self.total if self.total > 0 else 0.0
+        comparacion = {}
+        for nombre, salida in self.salidas.items():
+            diferencia = self.diferencias[nombre]
+            independiente = varianza_principal + salida.varianza
+            comparacion[nombre] = {
+                'media': salida.media,
+                'desviacion': salida.desviacion,
+                'diferencia': diferencia.media,
+                'diferencia_ic': diferencia.error_media(),
+                'prob_mayor': diferencia.positivos / diferencia.total if diferencia.total else 0.0,
+                'reduccion_varianza': 1 - diferencia.varianza / independiente if independiente > 0 else 0.0,
+            }
+        return comparacion
+
+    # Escenarios (o lotes) que faltan entre 0 y el mayor seq recibido (perdidos o aun en camino)
+    # Los que fallaron en el worker no cuentan (ver fallidos)
+    @property
+    def faltantes(self):
+        return self.vistos.huecos()
+
+    # Desviacion estandar poblacional (igual que np.std)
+    @property
+    def desviacion(self):
+        return math.sqrt(self.m2 / self.total) if self.total > 0 else 0.0
+
+# Estado de los workers a partir de sus latidos (exchange de latidos)
+# La tasa se calcula con los escenarios procesados entre latidos y la hora de llegada
+# (no depende del reloj de cada worker); tasa_mensajes igual con los mensajes (un mensaje
+# puede traer un lote de escenarios)
+class MonitorWorkers:
+    def __init__(self):
+        self.workers = {} # worker_id -> datos del ultimo latido, tasa y estado
+
+    # Registra un latido
+    def registrar_latido(self, latido, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        worker_id = str(latido['worker_id'])
+        datos = self.workers.get(worker_id)
+        mensajes = latido.get('mensajes', latido['procesados'])
+        if datos is None:
+            datos = {'tasa': None, 'tasa_mensajes': None, 'estado': 'activo'}
+            self.workers[worker_id] = datos
+        elif latido['procesados'] >= datos['procesados'] and mensajes >= datos['mensajes']:
+            transcurrido = ahora - datos['ultimo_latido']
+            if transcurrido > 0:
+                datos['tasa'] = ewma(datos['tasa'], (latido['procesados'] - datos['procesados']) / transcurrido)
+                datos['tasa_mensajes'] = ewma(datos['tasa_mensajes'], (mensajes - datos['mensajes']) / transcurrido)
+        else:
+            # El worker se reinicio: se vuelve a medir
+            datos['tasa'] = None
+            datos['tasa_mensajes'] = None
+        datos.update(procesados=latido['procesados'], mensajes=mensajes, ultimo_latido=ahora,
+                     prefetch=latido.get('prefetch'), rtt=latido.get('rtt'),
+                     tiempo_mensaje=latido.get('tiempo_mensaje'))
+
+    # Recalcula el estado de cada worker: 'caido' si faltan LATIDOS_PERDIDOS_CAIDO latidos,
+    # 'rezagado' si su tasa es menor a FACTOR_REZAGADO de la mediana de los activos
+    # Regresa los cambios [(worker_id, estado anterior, estado nuevo)]
+    def revisar(self, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        limite = LATIDO_INTERVALO * LATIDOS_PERDIDOS_CAIDO
+        vivos = {w: d for w, d in self.workers.items() if ahora - d['ultimo_latido'] <= limite}
+        tasas = [d['tasa'] for d in vivos.values() if d['tasa'] is not None]
+        mediana = statistics.median(tasas) if len(tasas) >= 2 else 0
+
+        cambios = []
+        for worker_id, datos in self.workers.items():
+            if worker_id not in vivos:
+                estado = 'caido'
+            elif mediana > 0 and datos['tasa'] is not None and datos['tasa'] < FACTOR_REZAGADO * mediana:
+                estado = 'rezagado'
+            else:
+                estado = 'activo'
+            if estado != datos['estado']:
+                cambios.append((worker_id, datos['estado'], estado))
+                datos['estado'] = estado
+        return cambios
+
+    # Segundos desde el ultimo latido de un worker
+    def silencio(self, worker_id, ahora=None):
+        datos = self.workers.get(str(worker_id))
+        if datos is None:
+            return None
+        return (time.time() if ahora is None else ahora) - datos['ultimo_latido']
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# BARRIDO DE PARAMETROS
+# Descripcion: Ejecucion (modo 'barrido') que evalua el modelo en una reticula de parametros de
+# sus distribuciones (p. ej. velocidad.mean de 60 a 120) en una sola pasada
+# Ejes: "variable.parametro" -> lista de valores o {'desde', 'hasta', 'pasos'}
+# Los puntos son el producto cartesiano de los ejes (el primer eje cambia mas lento)
+# Numeros aleatorios comunes: las distribuciones del catalogo son de localizacion y escala, asi
+# que cada escenario sortea un valor base por variable (u uniforme, z normal estandar,
+# e exponencial de escala 1) y cada punto lo transforma con sus parametros. Las diferencias
+# entre puntos no cargan el ruido de muestreo independiente de cada uno
+# Un mensaje lleva n escenarios base evaluados en todos los puntos:
+#   filas = escenario 0 (punto 0 ... punto P-1), escenario 1 (...), ...
+
+import itertools
+import math
+import random
+from config import BARRIDO_PUNTOS_MAXIMOS
+from catalogo import DISTRIBUCIONES, ModeloInvalido, normalizar_variable
+
+# Valores de un eje: lista de numeros o {'desde', 'hasta', 'pasos'} (extremos incluidos)
+def valores_eje(clave, definicion):
+    if isinstance(definicion, dict):
+        if set(definicion) != {'desde', 'hasta', 'pasos'}:
+            raise ModeloInvalido(f"Barrido: el eje '{clave}' debe ser una lista o {{desde, hasta, pasos}}")
+        desde, hasta, pasos = definicion['desde'], definicion['hasta'], definicion['pasos']
+        if isinstance(pasos, bool) or not isinstance(pasos, int) or pasos < 1:
+            raise ModeloInvalido(f"Barrido: 'pasos' del eje '{clave}' debe ser un entero positivo")
+        if pasos == 1:
+            definicion = [desde]
+        else:
+            definicion = [desde + (hasta - desde) * i / (pasos - 1) for i in range(pasos)]
+    if not isinstance(definicion, list) or not definicion:
+        raise ModeloInvalido(f"Barrido: el eje '{clave}' no tiene valores")
+    for valor in definicion:
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+            raise ModeloInvalido(f"Barrido: el eje '{clave}' tiene un valor no numerico ({valor!r})")
+    return [round(valor, 6) for valor in definicion]
+
+# Valida los ejes contra el plan. Regresa [[clave, valores]] en el orden recibido
+# (acepta los ejes ya normalizados)
+def normalizar_ejes(ejes, plan):
+    if isinstance(ejes, dict):
+        ejes = list(ejes.items())
+    if not isinstance(ejes, list) or not ejes:
+        raise ModeloInvalido("Barrido: 'ejes' debe ser un objeto {\"variable.parametro\": valores}")
+    configs = dict(plan)
+    normalizados = []
+    for eje in ejes:
+        if not isinstance(eje, (list, tuple)) or len(eje) != 2 or not isinstance(eje[0], str):
+            raise ModeloInvalido("Barrido: cada eje debe ser \"variable.parametro\": valores")
+        clave, definicion = eje
+        variable, _, parametro = clave.rpartition('.')
+        if variable not in configs:
+            raise ModeloInvalido(f"Barrido: variable no declarada '{variable or clave}'")
+        distribucion = configs[variable]['distribucion']
+        if parametro not in DISTRIBUCIONES[distribucion]:
+            raise ModeloInvalido(f"Barrido: '{parametro}' no es parametro de '{distribucion}' ({variable})")
+        if any(clave == otro for otro, _ in normalizados):
+            raise ModeloInvalido(f"Barrido: eje repetido '{clave}'")
+        normalizados.append([clave, valores_eje(clave, definicion)])
+    if math.prod(len(valores) for _, valores in normalizados) > BARRIDO_PUNTOS_MAXIMOS:
+        raise ModeloInvalido(f"Barrido: mas de {BARRIDO_PUNTOS_MAXIMOS} puntos en total")
+    return normalizados
+
+# Puntos de la reticula: [{clave: valor}] (producto cartesiano de los ejes)
+def puntos_barrido(ejes):
+    claves = [clave for clave, _ in ejes]
+    return [dict(zip(claves, combinacion)) for combinacion in itertools.product(*(v for _, v in ejes))]
+
+# Texto corto de un punto ("velocidad.mean=60, precio.std=5")
+def etiqueta_punto(punto):
+    return ', '.join(f"{clave}={valor:g}" for clave, valor in punto.items())
+
+# Ejes escritos en una linea: "velocidad.mean=60:120:4; precio.std=5,10,30"
+# (desde:hasta:pasos o lista separada por comas)
+def leer_ejes(texto):
+    ejes = {}
+    for parte in texto.split(';'):
+        if not parte.strip():
+            continue
+        clave, separador, valores = parte.partition('=')
+        if not separador:
+            raise ModeloInvalido(f"Barrido: eje sin valores '{parte.strip()}'")
+        try:
+            if ':' in valores:
+                desde, hasta, pasos = valores.split(':')
+                ejes[clave.strip()] = {'desde': float(desde), 'hasta': float(hasta), 'pasos': int(pasos)}
+            else:
+                ejes[clave.strip()] = [float(valor) for valor in valores.split(',')]
+        except ValueError:
+            raise ModeloInvalido(f"Barrido: valores invalidos en '{parte.strip()}'")
+    return ejes
+
+# Valor base con el que se sortea cada distribucion (el mismo para todos los puntos)
+def sortear_base(distribucion):
+    if distribucion == 'normal':
+        return random.gauss(0, 1)
+    if distribucion == 'exponential':
+        return random.expovariate(1.0)
+    return random.random()
+
+# Transforma el valor base con los parametros de un punto (como generar_valor del productor:
+# los negativos se reflejan y se redondea a 4 decimales)
+def transformar(distribucion, params, base):
+    if distribucion == 'normal':
+        valor = params['mean'] + params['std'] * base
+    elif distribucion == 'exponential':
+        valor = params['scale'] * base
+    else:
+        valor = params['min'] + (params['max'] - params['min']) * base
+    return round(abs(valor), 4)
+
+# Plan de un barrido: variables del plan y la configuracion de cada variable en cada punto
+# Los barridos usan la distribucion nominal (se ignoran propuestas y estratos)
+class PlanBarrido:
+    def __init__(self, plan, ejes):
+        self.ejes = normalizar_ejes(ejes, plan)
+        self.puntos = puntos_barrido(self.ejes)
+        self.variables = [nombre for nombre, _ in plan]
+        self.distribuciones = [config['distribucion'] for _, config in plan]
+        # Parametros [punto][variable] (cada combinacion se valida como en el catalogo)
+        self.parametros = []
+        for punto in self.puntos:
+            parametros = []
+            for nombre, config in plan:
+                params = dict(config['parametros'])
+                for clave, valor in punto.items():
+                    variable, _, parametro = clave.rpartition('.')
+                    if variable == nombre:
+                        params[parametro] = valor
+                try:
+                    normalizar_variable(nombre, dict(config, parametros=params))
+                except ModeloInvalido as e:
+                    raise ModeloInvalido(f"Barrido ({etiqueta_punto(punto)}): {e}")
+                parametros.append(params)
+            self.parametros.append(parametros)
+
+    # Filas de un escenario base evaluado en todos los puntos
+    def filas(self):
+        base = [sortear_base(distribucion) for distribucion in self.distribuciones]
+        return [[transformar(distribucion, params, b)
+                 for distribucion, params, b in zip(self.distribuciones, parametros, base)]
+                for parametros in self.parametros]
+
+    def __len__(self):
+        return len(self.puntos)
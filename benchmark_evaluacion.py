@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# BENCHMARK DE BACKENDS DE EVALUACION
+# Descripcion: Mide filas/s de cada backend de evaluacion (escalar, numpy, numba) sobre los
+# modelos del catalogo, con escenarios muestreados segun el plan de cada modelo
+# Verifica ademas que todos los backends den el mismo resultado que eval
+# No necesita broker
+#
+# Uso: python benchmark_evaluacion.py [filas] [modelo ...]
+# Ejemplo: python benchmark_evaluacion.py 200000 modelo_beneficio.json
+
+import sys
+import time
+import numpy as np
+from catalogo import Catalogo, texto_formula
+from evaluacion import BACKENDS, crear_evaluador
+
+FILAS_ESCALAR = 20000 # El backend escalar se mide con menos filas (es el mas lento)
+
+# Muestra filas (filas x variables) segun el plan de muestreo del modelo
+def muestrear(plan, filas, rng):
+    columnas = []
+    for _, config_variable in plan:
+        params = config_variable['parametros']
+        if config_variable['distribucion'] == 'uniform':
+            columnas.append(rng.uniform(params['min'], params['max'], filas))
+        elif config_variable['distribucion'] == 'normal':
+            columnas.append(rng.normal(params['mean'], params['std'], filas))
+        else:
+            columnas.append(rng.exponential(params['scale'], filas))
+    return np.column_stack(columnas)
+
+# Filas por segundo de un backend (mejor de varias repeticiones)
+def medir(evaluador, nombres, matriz, repeticiones=3):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = evaluador.evaluar_lote(nombres, matriz)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return len(matriz) / mejor, salida
+
+def main():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    catalogo = Catalogo()
+    catalogo.escanear()
+    entradas = [catalogo.obtener(clave) for clave in sys.argv[2:]] or catalogo.listar()
+    rng = np.random.default_rng(42)
+
+    print("=" * 60)
+    print(f" BENCHMARK DE EVALUACION - {filas} filas")
+    print("=" * 60)
+
+    tabla = []
+    for entrada in entradas:
+        if entrada is None:
+            print(f"[ERROR] Modelo no encontrado en el catalogo")
+            continue
+        modelo = dict(entrada.modelo, hash=entrada.hash)
+        nombres = [variable for variable, _ in entrada.plan]
+        matriz = muestrear(entrada.plan, filas, rng)
+        print(f"\n[*] {entrada.nombre}: {texto_formula(modelo)}")
+
+        referencia = None
+        # Los modelos de trayectoria tienen un solo evaluador (se compara contra si mismo)
+        backends = ('trayectoria',) if modelo.get('tipo') == 'trayectoria' else BACKENDS
+        for backend in backends:
+            inicio = time.perf_counter()
+            evaluador = crear_evaluador(modelo, backend)
+            preparacion = time.perf_counter() - inicio
+            if evaluador.backend != backend:
+                print(f"    {backend:<8} no disponible (se usaria {evaluador.backend})")
+                continue
+            datos = matriz[:FILAS_ESCALAR] if backend in ('escalar', 'trayectoria') else matriz
+            tasa, salida = medir(evaluador, nombres, datos)
+            if referencia is None:
+                referencia = salida
+            iguales = np.allclose(salida[:len(referencia)], referencia, equal_nan=True)
+            tabla.append((entrada.nombre, backend, tasa))
+            print(f"    {backend:<8} {tasa:>14,.0f} filas/s | preparacion {preparacion * 1000:8.1f} ms | "
+                  f"{'[EXITO] igual a eval' if iguales else '[ERROR] difiere de eval'}")
+
+    print()
+    print(f"{'modelo':<28}{'backend':<10}{'filas/s':>16}{'vs escalar':>12}")
+    escalar = {nombre: tasa for nombre, backend, tasa in tabla if backend == 'escalar'}
+    for nombre, backend, tasa in tabla:
+        relativo = f"{tasa / escalar[nombre]:>11.1f}x" if nombre in escalar else f"{'-':>12}"
+        print(f"{nombre[:27]:<28}{backend:<10}{tasa:>16,.0f}{relativo}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# BENCHMARK DE PERFILES DE DURABILIDAD
+# Descripcion: Mide contra el broker configurado el rendimiento de cada perfil de
+# durabilidad (durable, fast, confirmed-batch) usando los mismos caminos de publicacion
+# que el productor (escenarios) y el worker (resultados + ack)
+# Usa colas temporales 'bench.<perfil>' que se eliminan al terminar
+#
+# Uso: python benchmark_perfiles.py [mensajes] [perfil ...]
+# Ejemplo: python benchmark_perfiles.py 20000 durable fast
+
+import pika
+import json
+import random
+import sys
+import time
+from config import (RABBIT_HOST, RABBIT_USER, RABBIT_PASS, PERFILES,
+                   LOTE_CONFIRMACION)
+from colas import obtener_perfil, declarar_cola, propiedades_mensaje
+
+# Escenario tipico (modelo de beneficio)
+def escenario_ejemplo():
+    return {
+        'precio': round(random.gauss(100, 15), 4),
+        'costo': round(random.gauss(60, 8), 4),
+        'unidades': round(random.uniform(100, 1000), 4)
+    }
+
+# Publica como el productor: un mensaje por escenario, transacciones por lote si aplica
+def medir_publicacion(channel, cola, perfil, mensajes):
+    propiedades = propiedades_mensaje(perfil)
+    confirmado = obtener_perfil(perfil)['confirmado']
+    cuerpos = [json.dumps(escenario_ejemplo()).encode('utf-8') for _ in range(mensajes)]
+
+    inicio = time.perf_counter()
+    for i, body in enumerate(cuerpos, 1):
+        channel.basic_publish(exchange='', routing_key=cola, body=body, properties=propiedades)
+        if confirmado and i % LOTE_CONFIRMACION == 0:
+            channel.tx_commit()
+    if confirmado:
+        channel.tx_commit()
+    return mensajes / (time.perf_counter() - inicio)
+
+# Consume como el worker: publica un resultado por escenario y hace ack
+# En confirmed-batch el ack es multiple despues del commit del lote
+def medir_consumo(connection, channel, cola, cola_res, perfil, mensajes):
+    propiedades = propiedades_mensaje(perfil)
+    confirmado = obtener_perfil(perfil)['confirmado']
+    canal_res = connection.channel()
+    if confirmado:
+        canal_res.tx_select()
+    channel.basic_qos(prefetch_count=LOTE_CONFIRMACION if confirmado else 1)
+
+    estado = {'procesados': 0, 'pendientes': 0}
+
+    def callback(ch, method, props, body):
+        escenario = json.loads(body)
+        resultado = {'escenario': escenario,
+                     'resultado': (escenario['precio'] - escenario['costo']) * escenario['unidades'],
+                     'timestamp': time.time()}
+        canal_res.basic_publish(exchange='', routing_key=cola_res,
+                                body=json.dumps(resultado).encode('utf-8'),
+                                properties=propiedades)
+        estado['procesados'] += 1
+        if confirmado:
+            estado['pendientes'] += 1
+            if estado['pendientes'] >= LOTE_CONFIRMACION or estado['procesados'] == mensajes:
+                canal_res.tx_commit()
+                ch.basic_ack(delivery_tag=method.delivery_tag, multiple=True)
+                estado['pendientes'] = 0
+        else:
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+        if estado['procesados'] >= mensajes:
+            ch.stop_consuming()
+
+    inicio = time.perf_counter()
+    channel.basic_consume(queue=cola, on_message_callback=callback, auto_ack=False)
+    channel.start_consuming()
+    duracion = time.perf_counter() - inicio
+    canal_res.close()
+    return mensajes / duracion
+
+def main():
+    mensajes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    perfiles = sys.argv[2:] or list(PERFILES)
+
+    creds = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
+    params = pika.ConnectionParameters(host=RABBIT_HOST, credentials=creds)
+
+    print("=" * 60)
+    print(f" BENCHMARK DE PERFILES - {mensajes} mensajes")
+    print("=" * 60)
+
+    filas = []
+    for perfil in perfiles:
+        obtener_perfil(perfil)
+        cola = f"bench.{perfil}"
+        cola_res = f"bench.{perfil}.resultados"
+
+        connection = pika.BlockingConnection(params)
+        channel = connection.channel()
+        try:
+            declarar_cola(channel, cola, perfil)
+            declarar_cola(channel, cola_res, perfil)
+            channel.queue_purge(queue=cola)
+            channel.queue_purge(queue=cola_res)
+            if obtener_perfil(perfil)['confirmado']:
+                channel.tx_select()
+
+            publicacion = medir_publicacion(channel, cola, perfil, mensajes)
+            # El consumo usa un canal nuevo (el de publicacion puede estar en modo transaccion)
+            canal_consumo = connection.channel()
+            consumo = medir_consumo(connection, canal_consumo, cola, cola_res, perfil, mensajes)
+            filas.append((perfil, publicacion, consumo))
+            print(f"[EXITO] {perfil}: publicacion {publicacion:,.0f} msg/s | "
+                  f"consumo+resultado {consumo:,.0f} msg/s")
+        finally:
+            try:
+                limpieza = connection.channel()
+                limpieza.queue_delete(queue=cola)
+                limpieza.queue_delete(queue=cola_res)
+            except Exception:
+                pass
+            connection.close()
+
+    print()
+    print(f"{'perfil':<18}{'publicacion msg/s':>20}{'consumo msg/s':>18}")
+    for perfil, publicacion, consumo in filas:
+        print(f"{perfil:<18}{publicacion:>20,.0f}{consumo:>18,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# BITACORA DE ESCENARIOS
+# Descripcion: Registro de solo-agregar (memory-mapped) de los escenarios de una ejecucion
+# Con la bitacora una ejecucion se puede repetir (comando 'replay') con exactamente los mismos
+# escenarios: por ejemplo contra una formula corregida o contra otra version de los workers
+# Formato del archivo:
+#   - MAGIA (8 bytes) + longitud (uint32) + cabecera JSON (run_id, modo, modelo, hash...)
+#   - Registros: longitud (uint32) + seq (uint64) + contenido: objeto JSON con el escenario
+#     (o lote de Saltelli) y, con muestreo ponderado, su peso y estrato
+# El archivo crece por segmentos de BITACORA_SEGMENTO bytes; al cerrarse se recorta al ultimo
+# registro. Si el productor se cae, la lectura se detiene en el primer registro vacio o incompleto
+#
+# Uso: python bitacora.py <run_id | archivo> (resumen de una bitacora)
+
+import json
+import mmap
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from config import DIRECTORIO_BITACORAS, BITACORA_SEGMENTO
+from catalogo import texto_formula
+
+MAGIA = b'MCBITAC1'
+LONGITUD = struct.Struct('<I')
+REGISTRO = struct.Struct('<IQ') # Longitud del contenido y seq original
+
+# Ruta de la bitacora de una ejecucion
+def ruta_bitacora(run_id, directorio=DIRECTORIO_BITACORAS):
+    return Path(directorio) / f"{run_id}.bitacora"
+
+class BitacoraInvalida(Exception):
+    pass
+
+# Escritura de la bitacora de una ejecucion (varios hilos de serializacion pueden agregar)
+class EscritorBitacora:
+    def __init__(self, ruta, cabecera, segmento=BITACORA_SEGMENTO):
+        self.ruta = Path(ruta)
+        self.segmento = max(int(segmento), 4096)
+        self.lock = threading.Lock()
+        self.registros = 0 # Escenarios (o lotes) escritos
+        self.descartados = 0 # Llegaron despues de cerrar la bitacora
+        self.cerrada = False
+
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        datos = json.dumps(dict(cabecera, creada=time.time())).encode('utf-8')
+        self.archivo = open(self.ruta, 'w+b')
+        self.archivo.write(MAGIA + LONGITUD.pack(len(datos)) + datos)
+        self.fin = self.archivo.tell() # Donde va el siguiente registro
+        self.capacidad = 0
+        self.mapa = None
+        self.crecer(self.fin)
+
+    # Amplia el archivo (y su mapa) para que quepan 'necesarios' bytes
+    def crecer(self, necesarios):
+        capacidad = self.capacidad or self.segmento
+        while capacidad < necesarios:
+            capacidad += self.segmento
+        if self.mapa is not None:
+            self.mapa.flush()
+            self.mapa.close()
+        self.archivo.truncate(capacidad)
+        self.mapa = mmap.mmap(self.archivo.fileno(), capacidad)
+        self.capacidad = capacidad
+
+    # Agrega el contenido (bytes JSON) de un escenario con su seq original
+    def agregar(self, seq, contenido):
+        with self.lock:
+            if self.cerrada:
+                self.descartados += 1
+                return False
+            fin = self.fin + REGISTRO.size + len(contenido)
+            if fin > self.capacidad:
+                self.crecer(fin)
+            REGISTRO.pack_into(self.mapa, self.fin, len(contenido), seq)
+            self.mapa[self.fin + REGISTRO.size:fin] = contenido
+            self.fin = fin
+            self.registros += 1
+            return True
+
+    # Baja el mapa a disco y recorta el archivo al ultimo registro
+    def cerrar(self):
+        with self.lock:
+            if self.cerrada:
+                return
+            self.cerrada = True
+            self.mapa.flush()
+            self.mapa.close()
+            self.archivo.truncate(self.fin)
+            self.archivo.close()
+
+# Lectura de una bitacora: cabecera y registros (seq, contenido) en orden de escritura
+class LectorBitacora:
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self.archivo = open(self.ruta, 'rb')
+        try:
+            self.mapa = mmap.mmap(self.archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Archivo vacio
+            self.archivo.close()
+            raise BitacoraInvalida(f"Bitacora vacia: {self.ruta}")
+        if self.mapa[:len(MAGIA)] != MAGIA:
+            self.mapa.close()
+            self.archivo.close()
+            raise BitacoraInvalida(f"No es una bitacora de escenarios: {self.ruta}")
+        inicio = len(MAGIA) + LONGITUD.size
+        longitud, = LONGITUD.unpack_from(self.mapa, len(MAGIA))
+        self.cabecera = json.loads(self.mapa[inicio:inicio + longitud])
+        self.inicio = inicio + longitud # Primer registro
+        self.posicion = self.inicio
+        self.lock = threading.Lock() # Varios hilos de muestreo pueden leer
+        self.cerrada = False
+
+    # Siguiente registro (seq, contenido) o None al llegar al final
+    def siguiente(self):
+        with self.lock:
+            if self.cerrada or self.posicion + REGISTRO.size > len(self.mapa):
+                return None
+            longitud, seq = REGISTRO.unpack_from(self.mapa, self.posicion)
+            fin = self.posicion + REGISTRO.size + longitud
+            if longitud == 0 or fin > len(self.mapa): # Espacio sin usar o registro incompleto
+                return None
+            contenido = self.mapa[self.posicion + REGISTRO.size:fin]
+            self.posicion = fin
+            return seq, contenido
+
+    # Recorre todos los registros desde el inicio (sin mover la posicion de siguiente())
+    def __iter__(self):
+        posicion = self.inicio
+        while posicion + REGISTRO.size <= len(self.mapa):
+            longitud, seq = REGISTRO.unpack_from(self.mapa, posicion)
+            fin = posicion + REGISTRO.size + longitud
+            if longitud == 0 or fin > len(self.mapa):
+                return
+            yield seq, self.mapa[posicion + REGISTRO.size:fin]
+            posicion = fin
+
+    def cerrar(self):
+        with self.lock:
+            if not self.cerrada:
+                self.cerrada = True
+                self.mapa.close()
+                self.archivo.close()
+
+# Resumen de una bitacora por consola
+def main():
+    if len(sys.argv) < 2:
+        print("Uso: python bitacora.py <run_id | archivo>")
+        sys.exit(1)
+    ruta = Path(sys.argv[1])
+    if not ruta.exists():
+        ruta = ruta_bitacora(sys.argv[1])
+    try:
+        lector = LectorBitacora(ruta)
+    except (OSError, BitacoraInvalida) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+
+    cabecera = lector.cabecera
+    registros = 0
+    seqs = set()
+    for seq, _ in lector:
+        registros += 1
+        seqs.add(seq)
+    lector.cerrar()
+
+    print(f"[INFORMACION] Bitacora: {ruta} ({ruta.stat().st_size:,} bytes)")
+    print(f"    Ejecucion: {cabecera['run_id']} | Modo: {cabecera['modo']} | Perfil: {cabecera['perfil']}")
+    print(f"    Modelo: {cabecera['modelo'].get('nombre', 'N/A')} ({cabecera.get('hash')})")
+    print(f"    Formula: {texto_formula(cabecera['modelo'])}")
+    print(f"    Creada: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(cabecera['creada']))}")
+    print(f"    Registros: {registros} (seq {min(seqs, default=0)}..{max(seqs, default=0)})")
+
+if __name__ == "__main__":
+    main()
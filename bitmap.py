@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# BITMAP
+# Descripcion: Conjunto de enteros no negativos al estilo roaring bitmap
+# Los enteros se agrupan por sus 16 bits altos; cada grupo (contenedor) guarda los 16 bits bajos:
+#   - arreglo: lista ordenada (array 'H') mientras tenga pocos elementos (<= 4096, 2 bytes c/u)
+#   - bits: 65536 bits (8 KB) cuando esta mas lleno
+#   - lleno: los 65536 valores presentes (no ocupa memoria)
+# Con secuencias casi consecutivas (seq de escenarios) la memoria queda acotada:
+# solo los contenedores con huecos ocupan espacio
+
+from array import array
+from bisect import bisect_left
+
+LIMITE_ARREGLO = 4096 # Elementos maximos de un contenedor arreglo
+TAMANO_CONTENEDOR = 1 << 16
+LLENO = 'lleno' # Contenedor con todos los valores
+
+class BitmapRoaring:
+    def __init__(self):
+        self.contenedores = {} # 16 bits altos -> array('H') | bytearray | LLENO
+        self.cantidades = {} # 16 bits altos -> elementos del contenedor
+        self.total = 0
+        self.maximo = -1 # Mayor valor agregado
+
+    # Agrega un valor. Regresa False si ya estaba (duplicado)
+    def agregar(self, valor):
+        alto, bajo = valor >> 16, valor & 0xFFFF
+        contenedor = self.contenedores.get(alto)
+        if contenedor is LLENO:
+            return False
+        if contenedor is None:
+            contenedor = array('H')
+            self.contenedores[alto] = contenedor
+            self.cantidades[alto] = 0
+
+        if isinstance(contenedor, array):
+            i = bisect_left(contenedor, bajo)
+            if i < len(contenedor) and contenedor[i] == bajo:
+                return False
+            contenedor.insert(i, bajo)
+            if len(contenedor) > LIMITE_ARREGLO:
+                self.contenedores[alto] = self.a_bits(contenedor)
+        else:
+            byte, bit = bajo >> 3, 1 << (bajo & 7)
+            if contenedor[byte] & bit:
+                return False
+            contenedor[byte] |= bit
+
+        self.cantidades[alto] += 1
+        if self.cantidades[alto] == TAMANO_CONTENEDOR:
+            self.contenedores[alto] = LLENO
+        self.total += 1
+        if valor > self.maximo:
+            self.maximo = valor
+        return True
+
+    def __contains__(self, valor):
+        alto, bajo = valor >> 16, valor & 0xFFFF
+        contenedor = self.contenedores.get(alto)
+        if contenedor is None:
+            return False
+        if contenedor is LLENO:
+            return True
+        if isinstance(contenedor, array):
+            i = bisect_left(contenedor, bajo)
+            return i < len(contenedor) and contenedor[i] == bajo
+        return bool(contenedor[bajo >> 3] & (1 << (bajo & 7)))
+
+    def __len__(self):
+        return self.total
+
+    # Valores que faltan entre 0 y el mayor valor visto
+    def huecos(self):
+        return self.maximo + 1 - self.total
+
+    # Convierte un contenedor arreglo en uno de bits
+    def a_bits(self, arreglo):
+        bits = bytearray(TAMANO_CONTENEDOR // 8)
+        for bajo in arreglo:
+            bits[bajo >> 3] |= 1 << (bajo & 7)
+        return bits
@@ -0,0 +1,590 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# BROKER LOCAL
+# Descripcion: Sustituto local de RabbitMQ para pruebas de carga sin servidor
+# - Servidor: colas y exchanges en memoria de un solo proceso, expuestos con multiprocessing.managers
+# - Cliente: ConexionLocal / CanalLocal con la parte de la interfaz de pika.BlockingConnection
+#   que usa el proyecto. Con BROKER_LOCAL = "host:puerto" el GestorConexion usa este cliente
+# Soporta: exchanges '', direct, fanout y x-consistent-hash, TTL por cola y por mensaje,
+# dead-lettering (x-dead-letter-exchange / x-dead-letter-routing-key, por TTL o nack sin requeue),
+# prefetch por consumidor y por canal (global_qos), ack/nack (multiple), basic_get y transacciones
+# (del lado del cliente)
+# Las colas con dead-lettering se revisan cada ESPERA_SONDEO s para expirar sus mensajes aunque nadie
+# las consulte (como el temporizador de TTL de RabbitMQ); las demas expiran al consultarse
+# No soporta: persistencia, x-expires, auto-delete ni colas exclusivas (se aceptan y se ignoran).
+# Si un cliente muere sin cerrar sus canales, sus mensajes sin ack no se devuelven a la cola
+# Seguridad: multiprocessing.managers usa pickle, quien se conecta con la clave puede ejecutar
+# codigo en el host. Por defecto solo escucha en 127.0.0.1 y la clave se genera en cada arranque
+# (variable de entorno BROKER_LOCAL_CLAVE; los procesos que se lanzan despues la heredan)
+#
+# Uso: python broker_local.py [puerto] [--publico]
+
+import argparse
+import os
+import pika
+import secrets
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, deque, Counter
+from heapq import heappush, heappop
+from multiprocessing.managers import BaseManager
+from types import SimpleNamespace
+from config import BROKER_LOCAL_PUERTO
+
+VARIABLE_CLAVE = 'BROKER_LOCAL_CLAVE' # Variable de entorno con la clave de los clientes
+ESPERA_SONDEO = 0.01 # Segundos entre consultas cuando no hay mensajes
+LOTE_ENTREGA = 100 # Mensajes maximos por consulta para consumidores sin prefetch
+
+# Campos de pika.BasicProperties que viajan con cada mensaje
+CAMPOS_PROPIEDADES = ('content_type', 'content_encoding', 'headers', 'delivery_mode', 'priority',
+                      'correlation_id', 'reply_to', 'expiration', 'message_id', 'timestamp',
+                      'type', 'user_id', 'app_id', 'cluster_id')
+
+class ErrorBroker(Exception):
+    def __init__(self, codigo, texto):
+        super().__init__(codigo, texto)
+        self.codigo = codigo
+        self.texto = texto
+
+class BrokerLocal:
+    def __init__(self):
+        self.lock = threading.Lock() # El servidor atiende cada cliente en su propio hilo
+        self.colas = {} # nombre -> {'mensajes': deque, 'ttl', contadores}
+        self.exchanges = {} # nombre -> {'tipo', 'enlaces': [(cola, routing_key)]}
+        self.sin_confirmar = {} # canal -> OrderedDict(tag -> (cola, mensaje))
+        self.siguiente_tag = 0
+        self.sin_ruta = Counter() # exchange -> mensajes que no llegaron a ninguna cola
+
+    # Declara una cola. Regresa (nombre, mensajes listos) o None si es pasiva y no existe
+    def declarar_cola(self, nombre, argumentos=None, pasiva=False):
+        with self.lock:
+            if not nombre:
+                nombre = f"amq.gen-{uuid.uuid4().hex[:12]}"
+            cola = self.colas.get(nombre)
+            if cola is None:
+                if pasiva:
+                    return None
+                argumentos = argumentos or {}
+                dlx = None
+                if 'x-dead-letter-exchange' in argumentos:
+                    dlx = (argumentos['x-dead-letter-exchange'], argumentos.get('x-dead-letter-routing-key'))
+                cola = {'mensajes': deque(), 'ttl': argumentos.get('x-message-ttl'), 'dlx': dlx,
+                        'publicados': 0, 'entregados': 0, 'confirmados': 0,
+                        'expirados': 0, 'descartados': 0}
+                self.colas[nombre] = cola
+            self.expirar(cola, nombre)
+            return nombre, len(cola['mensajes'])
+
+    def eliminar_cola(self, nombre):
+        with self.lock:
+            cola = self.colas.pop(nombre, None)
+            for exchange in self.exchanges.values():
+                exchange['enlaces'] = [e for e in exchange['enlaces'] if e[0] != nombre]
+            return len(cola['mensajes']) if cola else 0
+
+    def purgar_cola(self, nombre):
+        with self.lock:
+            cola = self.cola(nombre)
+            cantidad = len(cola['mensajes'])
+            cola['mensajes'].clear()
+            return cantidad
+
+    def declarar_exchange(self, nombre, tipo='direct'):
+        with self.lock:
+            self.exchanges.setdefault(nombre, {'tipo': tipo, 'enlaces': []})
+
+    def eliminar_exchange(self, nombre):
+        with self.lock:
+            self.exchanges.pop(nombre, None)
+
+    def enlazar(self, cola, exchange, routing_key):
+        with self.lock:
+            self.cola(cola)
+            enlaces = self.exchange(exchange)['enlaces']
+            if (cola, routing_key) not in enlaces:
+                enlaces.append((cola, routing_key))
+
+    def desenlazar(self, cola, exchange, routing_key):
+        with self.lock:
+            enlaces = self.exchange(exchange)['enlaces']
+            if (cola, routing_key) in enlaces:
+                enlaces.remove((cola, routing_key))
+
+    def publicar(self, exchange, routing_key, body, propiedades):
+        with self.lock:
+            return self.enrutar(exchange, routing_key, body, propiedades)
+
+    # Publica varios mensajes de una vez (commit de una transaccion)
+    def publicar_lote(self, mensajes):
+        with self.lock:
+            for exchange, routing_key, body, propiedades in mensajes:
+                self.enrutar(exchange, routing_key, body, propiedades)
+
+    # Entrega hasta n mensajes de la cola: [(tag, body, propiedades, reentregado)]
+    def obtener(self, nombre, n, canal, auto_ack):
+        with self.lock:
+            return self.entregar(self.cola(nombre), nombre, n, canal, auto_ack)
+
+    # Varias consultas en una sola llamada: [(canal, cola, n, auto_ack)] -> [entregas]
+    # Las colas que ya no existen no entregan nada
+    def obtener_varias(self, solicitudes):
+        with self.lock:
+            respuestas = []
+            for canal, nombre, n, auto_ack in solicitudes:
+                cola = self.colas.get(nombre)
+                respuestas.append(self.entregar(cola, nombre, n, canal, auto_ack) if cola else [])
+            return respuestas
+
+    # Ack de un tag (o de todos hasta el tag). Regresa los tags confirmados
+    def confirmar(self, canal, tag, multiple):
+        with self.lock:
+            tags = self.seleccionar(canal, tag, multiple)
+            for t in tags:
+                nombre, _ = self.sin_confirmar[canal].pop(t)
+                if nombre in self.colas:
+                    self.colas[nombre]['confirmados'] += 1
+            return tags
+
+    # Nack de un tag (o de todos hasta el tag). Con requeue vuelven al frente de su cola
+    def rechazar(self, canal, tag, multiple, requeue):
+        with self.lock:
+            tags = self.seleccionar(canal, tag, multiple)
+            for t in reversed(tags):
+                nombre, mensaje = self.sin_confirmar[canal].pop(t)
+                self.devolver(nombre, mensaje, requeue)
+            return tags
+
+    # Al cerrar un canal sus mensajes sin ack vuelven a la cola
+    def cerrar_canal(self, canal):
+        with self.lock:
+            pendientes = self.sin_confirmar.pop(canal, {})
+            for nombre, mensaje in reversed(list(pendientes.values())):
+                self.devolver(nombre, mensaje, True)
+
+    # Contadores de cada cola y mensajes sin ruta (para las pruebas de carga)
+    def estadisticas(self):
+        with self.lock:
+            sin_confirmar = Counter()
+            for pendientes in self.sin_confirmar.values():
+                for nombre, _ in pendientes.values():
+                    sin_confirmar[nombre] += 1
+            colas = {}
+            for nombre, cola in self.colas.items():
+                self.expirar(cola, nombre)
+                datos = {k: v for k, v in cola.items() if k not in ('mensajes', 'ttl', 'dlx')}
+                datos['listos'] = len(cola['mensajes'])
+                datos['sin_confirmar'] = sin_confirmar[nombre]
+                colas[nombre] = datos
+            return {'colas': colas, 'sin_ruta': dict(self.sin_ruta)}
+
+    # Expira los mensajes de las colas con dead-lettering (hilo del servidor)
+    def vigilar_ttl(self):
+        while True:
+            time.sleep(ESPERA_SONDEO)
+            with self.lock:
+                for nombre, cola in list(self.colas.items()):
+                    if cola['dlx'] is not None:
+                        self.expirar(cola, nombre)
+
+    # --- Internos (se llaman con el lock tomado) ---
+
+    def cola(self, nombre):
+        cola = self.colas.get(nombre)
+        if cola is None:
+            raise ErrorBroker(404, f"NOT_FOUND - no queue '{nombre}'")
+        return cola
+
+    def exchange(self, nombre):
+        exchange = self.exchanges.get(nombre)
+        if exchange is None:
+            raise ErrorBroker(404, f"NOT_FOUND - no exchange '{nombre}'")
+        return exchange
+
+    def enrutar(self, exchange, routing_key, body, propiedades):
+        if exchange == '':
+            destinos = [routing_key] if routing_key in self.colas else []
+        else:
+            datos = self.exchange(exchange)
+            enlaces = datos['enlaces']
+            if datos['tipo'] == 'fanout':
+                destinos = [cola for cola, _ in enlaces]
+            elif datos['tipo'] == 'x-consistent-hash':
+                # Todos los shards pesan lo mismo: hash de la routing key modulo shards
+                destinos = [enlaces[zlib.crc32(routing_key.encode('utf-8')) % len(enlaces)][0]] if enlaces else []
+            else:
+                destinos = [cola for cola, clave in enlaces if clave == routing_key]
+        destinos = list(dict.fromkeys(destinos))
+        if not destinos:
+            self.sin_ruta[exchange] += 1
+            return 0
+
+        ttl_mensaje = propiedades.get('expiration')
+        for nombre in destinos:
+            cola = self.colas[nombre]
+            ttls = [int(t) for t in (ttl_mensaje, cola['ttl']) if t is not None]
+            expira = time.time() + min(ttls) / 1000 if ttls else None
+            cola['mensajes'].append([body, propiedades, expira, False])
+            cola['publicados'] += 1
+        return len(destinos)
+
+    # Quita los mensajes expirados del frente de la cola (como RabbitMQ)
+    def expirar(self, cola, nombre):
+        ahora = time.time()
+        mensajes = cola['mensajes']
+        while mensajes and mensajes[0][2] is not None and mensajes[0][2] <= ahora:
+            self.dead_letter(cola, nombre, mensajes.popleft(), 'expired')
+            cola['expirados'] += 1
+
+    # Reenvia un mensaje expirado o rechazado al exchange de dead-letter de su cola (si tiene)
+    # Sin 'expiration' y con el encabezado x-death como RabbitMQ
+    def dead_letter(self, cola, nombre, mensaje, razon):
+        if cola['dlx'] is None:
+            return
+        exchange, routing_key = cola['dlx']
+        if exchange and exchange not in self.exchanges:
+            return # Como RabbitMQ: sin el exchange el mensaje se pierde
+        propiedades = {k: v for k, v in mensaje[1].items() if k != 'expiration'}
+        encabezados = dict(propiedades.get('headers') or {})
+        encabezados['x-death'] = [{'queue': nombre, 'reason': razon, 'count': 1, 'exchange': '',
+                                   'routing-keys': [nombre], 'time': int(time.time())}] + \
+            list(encabezados.get('x-death', []))
+        propiedades['headers'] = encabezados
+        self.enrutar(exchange, routing_key or nombre, mensaje[0], propiedades)
+
+    def entregar(self, cola, nombre, n, canal, auto_ack):
+        self.expirar(cola, nombre)
+        entregas = []
+        mensajes = cola['mensajes']
+        while mensajes and len(entregas) < n:
+            mensaje = mensajes.popleft()
+            if mensaje[2] is not None and mensaje[2] <= time.time():
+                self.dead_letter(cola, nombre, mensaje, 'expired')
+                cola['expirados'] += 1
+                continue
+            self.siguiente_tag += 1
+            tag = self.siguiente_tag
+            cola['entregados'] += 1
+            if auto_ack:
+                cola['confirmados'] += 1
+            else:
+                self.sin_confirmar.setdefault(canal, OrderedDict())[tag] = (nombre, mensaje)
+            entregas.append((tag, mensaje[0], mensaje[1], mensaje[3]))
+        return entregas
+
+    def seleccionar(self, canal, tag, multiple):
+        pendientes = self.sin_confirmar.get(canal, {})
+        if multiple:
+            return [t for t in pendientes if tag == 0 or t <= tag]
+        return [tag] if tag in pendientes else []
+
+    def devolver(self, nombre, mensaje, requeue):
+        cola = self.colas.get(nombre)
+        if cola is None:
+            return
+        if requeue:
+            mensaje[3] = True # Reentregado
+            cola['mensajes'].appendleft(mensaje)
+        else:
+            self.dead_letter(cola, nombre, mensaje, 'rejected')
+            cola['descartados'] += 1
+
+class ServidorBroker(BaseManager):
+    pass
+
+class ClienteBroker(BaseManager):
+    pass
+
+ClienteBroker.register('broker')
+
+# Clave del broker local (la de la variable de entorno). Con generar=True, si no hay, se crea una
+# aleatoria y se deja en el entorno para los procesos que se lancen despues
+def clave_broker(generar=False):
+    clave = os.environ.get(VARIABLE_CLAVE)
+    if not clave and generar:
+        clave = secrets.token_hex(16)
+        os.environ[VARIABLE_CLAVE] = clave
+    return clave.encode('utf-8') if clave else None
+
+# Arranca el servidor en un hilo del proceso actual. Regresa el BrokerLocal
+# (quien lo arranca puede leer sus estadisticas sin pasar por la red)
+def iniciar_servidor(puerto=BROKER_LOCAL_PUERTO, host='127.0.0.1'):
+    broker = BrokerLocal()
+    ServidorBroker.register('broker', callable=lambda: broker)
+    servidor = ServidorBroker(address=(host, puerto), authkey=clave_broker(generar=True)).get_server()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    threading.Thread(target=broker.vigilar_ttl, daemon=True).start()
+    return broker
+
+# Convierte pika.BasicProperties en un diccionario serializable
+def propiedades_a_dict(properties):
+    if properties is None:
+        return {}
+    return {campo: getattr(properties, campo) for campo in CAMPOS_PROPIEDADES
+            if getattr(properties, campo, None) is not None}
+
+class ConexionLocal:
+    def __init__(self, direccion):
+        host, puerto = direccion.rsplit(':', 1)
+        clave = clave_broker()
+        if clave is None:
+            raise pika.exceptions.AMQPConnectionError(
+                f"Broker local en {direccion}: falta la clave (variable de entorno {VARIABLE_CLAVE})")
+        try:
+            cliente = ClienteBroker(address=(host, int(puerto)), authkey=clave)
+            cliente.connect()
+            self.broker = cliente.broker()
+        except (OSError, EOFError) as e:
+            raise pika.exceptions.AMQPConnectionError(f"Broker local no disponible en {direccion}: {e!r}")
+        self.id = uuid.uuid4().hex[:8]
+        self.canales = []
+        self.temporizadores = [] # heap de (momento, orden, fn)
+        self.orden = 0
+        self.numero_canales = 0
+        self.is_open = True
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    # Llama al broker; si se cae la conexion se reporta como en pika
+    def llamar(self, metodo, *args):
+        if not self.is_open:
+            raise pika.exceptions.ConnectionWrongStateError("Conexion cerrada")
+        try:
+            return getattr(self.broker, metodo)(*args)
+        except (OSError, EOFError) as e:
+            self.is_open = False
+            raise pika.exceptions.AMQPConnectionError(repr(e))
+
+    def channel(self):
+        self.numero_canales += 1
+        canal = CanalLocal(self, f"{self.id}.{self.numero_canales}")
+        self.canales.append(canal)
+        return canal
+
+    def call_later(self, segundos, fn):
+        self.orden += 1
+        heappush(self.temporizadores, (time.time() + segundos, self.orden, fn))
+        return self.orden
+
+    # Atiende temporizadores y entrega mensajes a los consumidores durante time_limit segundos
+    def process_data_events(self, time_limit=0):
+        fin = time.time() + (time_limit or 0)
+        while True:
+            while self.temporizadores and self.temporizadores[0][0] <= time.time():
+                heappop(self.temporizadores)[2]()
+            entregados = self.despachar()
+            restante = fin - time.time()
+            if restante <= 0:
+                return
+            if not entregados:
+                time.sleep(min(ESPERA_SONDEO, restante))
+
+    def sleep(self, segundos):
+        self.process_data_events(time_limit=segundos)
+
+    # Pide mensajes para todos los consumidores con lugar libre (una sola llamada al broker)
+    def despachar(self):
+        solicitudes = []
+        destinos = []
+        for canal in self.canales:
+            if not canal.is_open:
+                continue
+            # Lugar libre del limite global del canal; el primer consumidor rota en cada
+            # consulta para que un shard no se quede con todo el limite
+            libres_canal = None
+            if canal.prefetch_canal:
+                libres_canal = canal.prefetch_canal - sum(len(c['en_vuelo']) for c in canal.consumidores)
+            canal.turno = (canal.turno + 1) % max(len(canal.consumidores), 1)
+            for consumidor in canal.consumidores[canal.turno:] + canal.consumidores[:canal.turno]:
+                if consumidor['auto_ack'] or not consumidor['prefetch']:
+                    libres = LOTE_ENTREGA
+                else:
+                    libres = consumidor['prefetch'] - len(consumidor['en_vuelo'])
+                if libres_canal is not None and not consumidor['auto_ack']:
+                    libres = min(libres, libres_canal)
+                    libres_canal -= max(libres, 0)
+                if libres > 0:
+                    solicitudes.append((canal.id, consumidor['cola'], libres, consumidor['auto_ack']))
+                    destinos.append((canal, consumidor))
+        if not solicitudes:
+            return 0
+
+        entregados = 0
+        for (canal, consumidor), entregas in zip(destinos, self.llamar('obtener_varias', solicitudes)):
+            for tag, body, propiedades, reentregado in entregas:
+                if not canal.is_open: # Se cerro en un callback: el broker ya los devolvio
+                    break
+                if not consumidor['auto_ack']:
+                    consumidor['en_vuelo'].add(tag)
+                method = SimpleNamespace(delivery_tag=tag, redelivered=reentregado,
+                                         routing_key=consumidor['cola'], consumer_tag=consumidor['tag'])
+                consumidor['callback'](canal, method, pika.BasicProperties(**propiedades), body)
+                entregados += 1
+        return entregados
+
+    def close(self):
+        for canal in list(self.canales):
+            canal.close()
+        self.is_open = False
+
+class CanalLocal:
+    def __init__(self, conexion, id):
+        self.conexion = conexion
+        self.id = id
+        self.is_open = True
+        self.prefetch = 0 # Se aplica a los consumidores que se registren despues (como pika)
+        self.prefetch_canal = 0 # Limite compartido por todos los consumidores (global_qos)
+        self.turno = 0 # Consumidor que pide primero en la siguiente consulta
+        self.consumidores = []
+        self.transaccion = None # Lista de mensajes pendientes de commit (tx_select)
+        self.consumiendo = False
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    # Llama al broker; un error del broker cierra el canal como en RabbitMQ
+    def llamar(self, metodo, *args):
+        if not self.is_open:
+            raise pika.exceptions.ChannelWrongStateError("Canal cerrado")
+        try:
+            return self.conexion.llamar(metodo, *args)
+        except ErrorBroker as e:
+            self.close()
+            raise pika.exceptions.ChannelClosedByBroker(e.codigo, e.texto)
+
+    def queue_declare(self, queue='', passive=False, durable=False, exclusive=False,
+                      auto_delete=False, arguments=None):
+        respuesta = self.llamar('declarar_cola', queue, arguments, passive)
+        if respuesta is None:
+            self.close()
+            raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+        nombre, mensajes = respuesta
+        return SimpleNamespace(method=SimpleNamespace(queue=nombre, message_count=mensajes,
+                                                      consumer_count=0))
+
+    def queue_delete(self, queue, if_unused=False, if_empty=False):
+        return SimpleNamespace(method=SimpleNamespace(message_count=self.llamar('eliminar_cola', queue)))
+
+    def queue_purge(self, queue):
+        return SimpleNamespace(method=SimpleNamespace(message_count=self.llamar('purgar_cola', queue)))
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None):
+        self.llamar('enlazar', queue, exchange, routing_key if routing_key is not None else queue)
+
+    def queue_unbind(self, queue, exchange=None, routing_key=None, arguments=None):
+        self.llamar('desenlazar', queue, exchange, routing_key if routing_key is not None else queue)
+
+    def exchange_declare(self, exchange, exchange_type='direct', passive=False, durable=False,
+                         auto_delete=False, internal=False, arguments=None):
+        self.llamar('declarar_exchange', exchange, exchange_type)
+
+    def exchange_delete(self, exchange=None, if_unused=False):
+        self.llamar('eliminar_exchange', exchange)
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False):
+        if global_qos:
+            self.prefetch_canal = prefetch_count
+        else:
+            self.prefetch = prefetch_count
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, exclusive=False,
+                      consumer_tag=None, arguments=None):
+        self.queue_declare(queue, passive=True) # Falla como RabbitMQ si la cola no existe
+        tag = consumer_tag or f"ctag.{self.id}.{len(self.consumidores) + 1}"
+        self.consumidores.append({'cola': queue, 'callback': on_message_callback, 'auto_ack': auto_ack,
+                                  'prefetch': self.prefetch, 'en_vuelo': set(), 'tag': tag})
+        return tag
+
+    def basic_cancel(self, consumer_tag):
+        self.consumidores = [c for c in self.consumidores if c['tag'] != consumer_tag]
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        mensaje = (exchange, routing_key, body, propiedades_a_dict(properties))
+        if self.transaccion is not None:
+            self.transaccion.append(mensaje)
+        else:
+            self.llamar('publicar', *mensaje)
+
+    def basic_get(self, queue, auto_ack=False):
+        entregas = self.llamar('obtener', queue, 1, self.id, auto_ack)
+        if not entregas:
+            return None, None, None
+        tag, body, propiedades, reentregado = entregas[0]
+        method = SimpleNamespace(delivery_tag=tag, redelivered=reentregado, routing_key=queue,
+                                 message_count=0)
+        return method, pika.BasicProperties(**propiedades), body
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.liberar(self.llamar('confirmar', self.id, delivery_tag, multiple))
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self.liberar(self.llamar('rechazar', self.id, delivery_tag, multiple, requeue))
+
+    def basic_reject(self, delivery_tag=0, requeue=True):
+        self.basic_nack(delivery_tag, False, requeue)
+
+    # Libera el lugar de prefetch de los mensajes confirmados o rechazados
+    def liberar(self, tags):
+        for consumidor in self.consumidores:
+            consumidor['en_vuelo'].difference_update(tags)
+
+    def tx_select(self):
+        self.transaccion = []
+
+    def tx_commit(self):
+        mensajes, self.transaccion = self.transaccion or [], []
+        if mensajes:
+            self.llamar('publicar_lote', mensajes)
+
+    def tx_rollback(self):
+        self.transaccion = []
+
+    def start_consuming(self):
+        self.consumiendo = True
+        while self.consumiendo and self.is_open and self.consumidores:
+            self.conexion.process_data_events(time_limit=1)
+
+    def stop_consuming(self):
+        self.consumiendo = False
+
+    def close(self):
+        if not self.is_open:
+            return
+        self.is_open = False
+        self.consumidores = []
+        if self in self.conexion.canales:
+            self.conexion.canales.remove(self)
+        try:
+            self.conexion.llamar('cerrar_canal', self.id) # Devuelve a la cola lo que no tuvo ack
+        except Exception:
+            pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Broker local de pruebas (sustituto de RabbitMQ)")
+    parser.add_argument('puerto', type=int, nargs='?', default=BROKER_LOCAL_PUERTO)
+    parser.add_argument('--publico', action='store_true',
+                        help="Escuchar en todas las interfaces (cualquiera con la clave puede ejecutar codigo aqui)")
+    args = parser.parse_args()
+    host = '0.0.0.0' if args.publico else '127.0.0.1'
+    generada = VARIABLE_CLAVE not in os.environ
+    clave = clave_broker(generar=True).decode('utf-8')
+    iniciar_servidor(args.puerto, host=host)
+    print(f"[EXITO] Broker local escuchando en {host}:{args.puerto}")
+    if args.publico:
+        print(f"[ADVERTENCIA] Broker expuesto en todas las interfaces: la clave da acceso al proceso")
+    print(f"[INFORMACION] En config.py: BROKER_LOCAL = \"127.0.0.1:{args.puerto}\"")
+    if generada:
+        print(f"[INFORMACION] Clave generada para esta ejecucion. En cada proceso cliente:")
+        print(f"    export {VARIABLE_CLAVE}={clave}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n[*] Broker local detenido")
+
+if __name__ == "__main__":
+    main()
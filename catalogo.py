@@ -0,0 +1,463 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# CATALOGO DE MODELOS
+# Descripcion: Modelos disponibles en DIRECTORIO_MODELOS, validados una sola vez
+# - Cada modelo se identifica por el hash de su contenido (no por el nombre del archivo)
+# - Validacion completa: campos, variables usadas vs declaradas, parametros de cada
+#   distribucion y formula segura (solo aritmetica sobre las variables declaradas; no se aceptan
+#   potencias entre constantes como 9**9**9, que colgarian al evaluador calculando un entero enorme)
+# - Cache de validacion: el plan de muestreo y las advertencias se guardan en
+#   DIRECTORIO_CACHE_MODELOS y volver a usar un modelo ya visto no lo vuelve a validar. No es una
+#   cache de codigo: cada worker traduce y compila la formula para su backend (crear_evaluador;
+#   el backend numba guarda su propio codigo compilado)
+# - Un modelo puede declarar salidas adicionales ("salidas": {nombre: formula}) que se evaluan
+#   sobre los mismos escenarios que la formula principal (numeros aleatorios comunes)
+# - Un modelo puede declarar como se muestrea ("muestreo": propuestas, estratos y evento) para
+#   estimar colas con muestreo por importancia y estratificado (ver muestreo.py)
+# - Un modelo de tipo 'trayectoria' no tiene formula: declara variables de estado, su valor inicial,
+#   como se actualizan en cada paso (con aleatorios por paso) y las estadisticas de la trayectoria
+#   que se regresan. Su plan lleva ademas la variable 'semilla' de los aleatorios por paso
+
+import ast
+import hashlib
+import json
+import marshal
+import math
+import os
+import sys
+from pathlib import Path
+from config import (DIRECTORIO_MODELOS, DIRECTORIO_CACHE_MODELOS, ESTRATOS_MAXIMOS,
+                    TRAYECTORIA_PASOS_MAXIMOS)
+
+VERSION_CACHE = 3 # Subir al cambiar la validacion o el formato del plan (invalida la cache en disco)
+
+# Parametros de cada distribucion: nombre -> valor por defecto (None = obligatorio)
+DISTRIBUCIONES = {
+    'uniform': {'min': 0, 'max': 1},
+    'normal': {'mean': 0, 'std': 1},
+    'exponential': {'scale': 1},
+}
+
+# Parametros de la propuesta (muestreo por importancia) de cada distribucion -> valor por defecto
+PROPUESTAS = {
+    'uniform': {'inclinacion': 0},
+    'normal': {'desplazamiento': 0, 'escala': 1},
+    'exponential': {'inclinacion': 0},
+}
+EVENTOS = ('menor', 'mayor') # Evento de cola: resultado < umbral o resultado > umbral
+
+CAMPOS_REQUERIDOS = ['nombre', 'descripcion', 'formula', 'variables']
+SALIDA_PRINCIPAL = 'principal' # Nombre de la salida de 'formula'
+
+# Modelos de trayectoria: campos en lugar de 'formula', estadisticas que se pueden pedir y
+# nombres reservados ('dt' y 'paso' en las expresiones, 'semilla' en el plan)
+TIPOS_MODELO = ('formula', 'trayectoria')
+CAMPOS_TRAYECTORIA = ['pasos', 'estado', 'actualizacion', 'estadisticas']
+ESTADISTICAS_TRAYECTORIA = ('final', 'maximo', 'minimo', 'media', 'caida_maxima',
+                            'caida_maxima_relativa', 'tiempo_sobre', 'tiempo_bajo')
+VARIABLE_SEMILLA = 'semilla'
+SEMILLA_MAXIMA = 2 ** 31
+
+# Nodos permitidos en una formula: numeros, variables, aritmetica y comparaciones
+NODOS_PERMITIDOS = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub, ast.IfExp, ast.Compare, ast.BoolOp, ast.And, ast.Or, ast.Not,
+    ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+)
+
+class ModeloInvalido(ValueError):
+    pass
+
+# True si la expresion no usa variables (solo constantes y operadores)
+def es_constante(nodo):
+    return not any(isinstance(hijo, ast.Name) for hijo in ast.walk(nodo))
+
+# Verifica que la formula solo use aritmetica sobre las variables dadas
+# Regresa (arbol AST, variables usadas)
+def analizar_formula(formula, variables):
+    try:
+        arbol = ast.parse(formula, mode='eval')
+    except SyntaxError as e:
+        raise ModeloInvalido(f"Formula con error de sintaxis: {e.msg}")
+
+    usadas = set()
+    for nodo in ast.walk(arbol):
+        if not isinstance(nodo, NODOS_PERMITIDOS):
+            raise ModeloInvalido(f"Formula no permitida: usa '{type(nodo).__name__}'")
+        if isinstance(nodo, ast.Constant) and not isinstance(nodo.value, (int, float)):
+            raise ModeloInvalido(f"Formula no permitida: constante {nodo.value!r}")
+        if isinstance(nodo, ast.Name):
+            usadas.add(nodo.id)
+        # Con base y exponente constantes Python calcula la potencia exacta (9**9**9 no termina)
+        if isinstance(nodo, ast.BinOp) and isinstance(nodo.op, ast.Pow) and \
+                es_constante(nodo.left) and es_constante(nodo.right):
+            raise ModeloInvalido("Formula no permitida: potencia entre constantes (escribir el valor)")
+
+    no_declaradas = usadas - set(variables)
+    if no_declaradas:
+        raise ModeloInvalido(f"Formula usa variables no declaradas: {sorted(no_declaradas)}")
+    return arbol, usadas
+
+# Valida los parametros de una variable y regresa su configuracion normalizada
+# (distribucion explicita y todos sus parametros)
+def normalizar_variable(nombre, config_variable):
+    if not isinstance(config_variable, dict):
+        raise ModeloInvalido(f"Variable '{nombre}': la configuracion debe ser un objeto")
+    distribucion = config_variable.get('distribucion', 'uniform')
+    if distribucion not in DISTRIBUCIONES:
+        raise ModeloInvalido(f"Variable '{nombre}': distribucion desconocida '{distribucion}'")
+
+    recibidos = config_variable.get('parametros', {})
+    desconocidos = set(recibidos) - set(DISTRIBUCIONES[distribucion])
+    if desconocidos:
+        raise ModeloInvalido(f"Variable '{nombre}': parametros desconocidos {sorted(desconocidos)} "
+                             f"para '{distribucion}'")
+    parametros = {}
+    for parametro, defecto in DISTRIBUCIONES[distribucion].items():
+        valor = recibidos.get(parametro, defecto)
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+            raise ModeloInvalido(f"Variable '{nombre}': parametro '{parametro}' no es numerico")
+        parametros[parametro] = valor
+
+    if distribucion == 'uniform' and parametros['min'] > parametros['max']:
+        raise ModeloInvalido(f"Variable '{nombre}': min mayor que max")
+    if distribucion == 'normal' and parametros['std'] < 0:
+        raise ModeloInvalido(f"Variable '{nombre}': std negativa")
+    if distribucion == 'exponential' and parametros['scale'] <= 0:
+        raise ModeloInvalido(f"Variable '{nombre}': scale debe ser positiva")
+
+    return dict(config_variable, distribucion=distribucion, parametros=parametros)
+
+# Valida la propuesta de una variable ya normalizada. Regresa la propuesta con todos sus parametros
+def normalizar_propuesta(nombre, config_variable, propuesta):
+    distribucion, params = config_variable['distribucion'], config_variable['parametros']
+    if not isinstance(propuesta, dict):
+        raise ModeloInvalido(f"Propuesta de '{nombre}': debe ser un objeto")
+    desconocidos = set(propuesta) - set(PROPUESTAS[distribucion])
+    if desconocidos:
+        raise ModeloInvalido(f"Propuesta de '{nombre}': parametros desconocidos {sorted(desconocidos)} "
+                             f"para '{distribucion}'")
+    normalizada = {}
+    for parametro, defecto in PROPUESTAS[distribucion].items():
+        valor = propuesta.get(parametro, defecto)
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+            raise ModeloInvalido(f"Propuesta de '{nombre}': parametro '{parametro}' no es numerico")
+        normalizada[parametro] = valor
+
+    if distribucion == 'normal' and (normalizada['escala'] <= 0 or params['std'] == 0):
+        raise ModeloInvalido(f"Propuesta de '{nombre}': escala y std deben ser positivas")
+    if distribucion == 'exponential' and normalizada['inclinacion'] >= 1 / params['scale']:
+        raise ModeloInvalido(f"Propuesta de '{nombre}': la inclinacion debe ser menor que 1/scale "
+                             f"({1 / params['scale']:g})")
+    return normalizada
+
+# Valida el bloque 'muestreo' contra el plan de muestreo. Regresa el bloque normalizado
+#   propuestas: {variable: parametros de la propuesta}
+#   estratos: {variable: numero de estratos}
+#   evento: {'menor': umbral} o {'mayor': umbral} (probabilidad que se estima)
+def normalizar_muestreo(muestreo, plan):
+    if not isinstance(muestreo, dict):
+        raise ModeloInvalido("'muestreo' debe ser un objeto")
+    desconocidos = set(muestreo) - {'propuestas', 'estratos', 'evento'}
+    if desconocidos:
+        raise ModeloInvalido(f"Muestreo: campos desconocidos {sorted(desconocidos)}")
+    configs = dict(plan)
+    for campo in ('propuestas', 'estratos'):
+        if not isinstance(muestreo.get(campo, {}), dict):
+            raise ModeloInvalido(f"Muestreo: '{campo}' debe ser un objeto {{variable: ...}}")
+        faltantes = set(muestreo.get(campo, {})) - set(configs)
+        if faltantes:
+            raise ModeloInvalido(f"Muestreo: variables no declaradas en '{campo}': {sorted(faltantes)}")
+
+    propuestas = {nombre: normalizar_propuesta(nombre, configs[nombre], propuesta)
+                  for nombre, propuesta in muestreo.get('propuestas', {}).items()}
+    estratos = {}
+    for nombre, cantidad in muestreo.get('estratos', {}).items():
+        if isinstance(cantidad, bool) or not isinstance(cantidad, int) or cantidad < 1:
+            raise ModeloInvalido(f"Muestreo: estratos de '{nombre}' debe ser un entero positivo")
+        estratos[nombre] = cantidad
+    if math.prod(estratos.values()) > ESTRATOS_MAXIMOS:
+        raise ModeloInvalido(f"Muestreo: mas de {ESTRATOS_MAXIMOS} estratos en total")
+
+    normalizado = {'propuestas': propuestas, 'estratos': estratos}
+    evento = muestreo.get('evento')
+    if evento is not None:
+        if (not isinstance(evento, dict) or len(evento) != 1 or next(iter(evento)) not in EVENTOS or
+                isinstance(next(iter(evento.values())), bool) or
+                not isinstance(next(iter(evento.values())), (int, float))):
+            raise ModeloInvalido("Muestreo: 'evento' debe ser {\"menor\": umbral} o {\"mayor\": umbral}")
+        normalizado['evento'] = dict(evento)
+    return normalizado
+
+# Plan con las propuestas y estratos de un bloque 'muestreo' normalizado
+# (reemplaza los que ya tuviera el plan)
+def aplicar_muestreo(plan, muestreo):
+    nuevo = []
+    for nombre, config in plan:
+        config = {clave: valor for clave, valor in config.items() if clave not in ('propuesta', 'estratos')}
+        if nombre in muestreo['propuestas']:
+            config['propuesta'] = muestreo['propuestas'][nombre]
+        if muestreo['estratos'].get(nombre, 1) > 1:
+            config['estratos'] = muestreo['estratos'][nombre]
+        nuevo.append((nombre, config))
+    return nuevo
+
+# Valida el modelo completo. Regresa (plan de muestreo, advertencias)
+# El plan es la lista [(variable, configuracion normalizada)] en el orden del modelo
+def validar_modelo(modelo):
+    if not isinstance(modelo, dict):
+        raise ModeloInvalido("El modelo debe ser un objeto JSON")
+    tipo = modelo.get('tipo', 'formula')
+    if tipo not in TIPOS_MODELO:
+        raise ModeloInvalido(f"Tipo de modelo desconocido: '{tipo}'")
+    requeridos = CAMPOS_REQUERIDOS if tipo == 'formula' else \
+        [campo for campo in CAMPOS_REQUERIDOS if campo != 'formula'] + CAMPOS_TRAYECTORIA
+    for campo in requeridos:
+        if campo not in modelo:
+            raise ModeloInvalido(f"Modelo invalido: falta campo '{campo}'")
+    variables = modelo['variables']
+    if not isinstance(variables, dict) or not variables:
+        raise ModeloInvalido("El modelo debe declarar al menos una variable")
+
+    plan = [(nombre, normalizar_variable(nombre, config)) for nombre, config in variables.items()]
+    plan = aplicar_muestreo(plan, normalizar_muestreo(modelo.get('muestreo', {}), plan))
+    if tipo == 'trayectoria':
+        usadas = validar_trayectoria(modelo)
+        plan.append((VARIABLE_SEMILLA, {'distribucion': 'uniform',
+                                        'parametros': {'min': 0, 'max': SEMILLA_MAXIMA}}))
+    else:
+        usadas = analizar_formula(modelo['formula'], variables)[1]
+        usadas |= validar_salidas(modelo.get('salidas', {}), variables)
+
+    advertencias = []
+    sin_usar = set(variables) - usadas
+    if sin_usar:
+        advertencias.append(f"Variables declaradas que la formula no usa: {sorted(sin_usar)}")
+    return plan, advertencias
+
+# Valida la parte de trayectoria de un modelo. Regresa las variables que usan sus expresiones
+#   pasos: numero de pasos; dt: duracion de cada paso (1 por defecto)
+#   aleatorios: {nombre: distribucion} que se sortean en cada paso de cada trayectoria
+#   estado: {nombre: expresion inicial} (sobre las variables y dt)
+#   actualizacion: {estado: expresion} del siguiente valor (sobre variables, estados del paso
+#     anterior, aleatorios del paso, dt y paso). Los estados sin actualizacion no cambian
+#   estadisticas: {nombre: {'estado', 'tipo'[, 'umbral']}}; la primera es la salida principal
+def validar_trayectoria(modelo):
+    variables = modelo['variables']
+    pasos = modelo['pasos']
+    if isinstance(pasos, bool) or not isinstance(pasos, int) or not 1 <= pasos <= TRAYECTORIA_PASOS_MAXIMOS:
+        raise ModeloInvalido(f"Trayectoria: 'pasos' debe ser un entero entre 1 y {TRAYECTORIA_PASOS_MAXIMOS}")
+    dt = modelo.get('dt', 1)
+    if isinstance(dt, bool) or not isinstance(dt, (int, float)) or dt <= 0:
+        raise ModeloInvalido("Trayectoria: 'dt' debe ser un numero positivo")
+    if modelo.get('salidas'):
+        raise ModeloInvalido("Trayectoria: las salidas se declaran en 'estadisticas'")
+    for campo in ('aleatorios', 'estado', 'actualizacion', 'estadisticas'):
+        if not isinstance(modelo.get(campo, {}), dict):
+            raise ModeloInvalido(f"Trayectoria: '{campo}' debe ser un objeto")
+    aleatorios = modelo.get('aleatorios', {})
+    estados = modelo['estado']
+    if not estados:
+        raise ModeloInvalido("Trayectoria: debe declarar al menos un estado")
+
+    # Los nombres no se pueden repetir entre variables, estados, aleatorios y los reservados
+    vistos = set(variables)
+    for nombre in list(estados) + list(aleatorios) + ['dt', 'paso', VARIABLE_SEMILLA]:
+        if nombre in vistos:
+            raise ModeloInvalido(f"Trayectoria: nombre repetido o reservado '{nombre}'")
+        vistos.add(nombre)
+    for nombre, config in aleatorios.items():
+        normalizar_variable(nombre, config)
+
+    usadas = set()
+    for nombre, expresion in estados.items():
+        try:
+            usadas |= analizar_formula(str(expresion), list(variables) + ['dt'])[1]
+        except ModeloInvalido as e:
+            raise ModeloInvalido(f"Estado '{nombre}': {e}")
+    permitidas = list(variables) + list(estados) + list(aleatorios) + ['dt', 'paso']
+    for nombre, expresion in modelo['actualizacion'].items():
+        if nombre not in estados:
+            raise ModeloInvalido(f"Trayectoria: actualizacion de un estado no declarado '{nombre}'")
+        if not isinstance(expresion, str):
+            raise ModeloInvalido(f"Actualizacion de '{nombre}': la expresion debe ser texto")
+        try:
+            usadas |= analizar_formula(expresion, permitidas)[1]
+        except ModeloInvalido as e:
+            raise ModeloInvalido(f"Actualizacion de '{nombre}': {e}")
+
+    if not modelo['estadisticas']:
+        raise ModeloInvalido("Trayectoria: debe pedir al menos una estadistica")
+    for nombre, estadistica in modelo['estadisticas'].items():
+        if not isinstance(estadistica, dict) or estadistica.get('estado') not in estados:
+            raise ModeloInvalido(f"Estadistica '{nombre}': 'estado' debe ser un estado declarado")
+        if estadistica.get('tipo') not in ESTADISTICAS_TRAYECTORIA:
+            raise ModeloInvalido(f"Estadistica '{nombre}': tipo desconocido '{estadistica.get('tipo')}' "
+                                 f"(tipos: {', '.join(ESTADISTICAS_TRAYECTORIA)})")
+        umbral = estadistica.get('umbral')
+        if estadistica['tipo'].startswith('tiempo_') and \
+                (isinstance(umbral, bool) or not isinstance(umbral, (int, float))):
+            raise ModeloInvalido(f"Estadistica '{nombre}': '{estadistica['tipo']}' necesita un 'umbral' numerico")
+    return usadas & set(variables)
+
+# Texto de la formula de un modelo para mostrarla (la actualizacion si es de trayectoria)
+def texto_formula(modelo):
+    if modelo.get('tipo') != 'trayectoria':
+        return modelo['formula']
+    actualizacion = '; '.join(f"{estado} <- {expresion}" for estado, expresion in modelo['actualizacion'].items())
+    return f"{modelo['pasos']} pasos | {actualizacion}"
+
+# Valida las salidas adicionales {nombre: formula}. Regresa las variables que usan
+def validar_salidas(salidas, variables):
+    if not isinstance(salidas, dict):
+        raise ModeloInvalido("'salidas' debe ser un objeto {nombre: formula}")
+    usadas = set()
+    for nombre, formula in salidas.items():
+        if not nombre or nombre == SALIDA_PRINCIPAL:
+            raise ModeloInvalido(f"Nombre de salida invalido: '{nombre}'")
+        if not isinstance(formula, str):
+            raise ModeloInvalido(f"Salida '{nombre}': la formula debe ser texto")
+        try:
+            usadas |= analizar_formula(formula, variables)[1]
+        except ModeloInvalido as e:
+            raise ModeloInvalido(f"Salida '{nombre}': {e}")
+    return usadas
+
+# Salidas del modelo [(nombre, formula)], la principal primero
+def salidas_modelo(modelo):
+    return [(SALIDA_PRINCIPAL, modelo['formula'])] + list(modelo.get('salidas', {}).items())
+
+# Agrega al modelo las salidas de otros modelos (variantes) para evaluarlas sobre los mismos
+# escenarios. Cada variante solo puede usar variables del modelo base
+# La salida principal de una variante se llama como la variante; las demas '<variante>.<salida>'
+def combinar_variantes(modelo, variantes):
+    if any(m.get('tipo') == 'trayectoria' for m in [modelo] + [v.modelo for v in variantes]):
+        raise ModeloInvalido("Los modelos de trayectoria no admiten variantes")
+    salidas = dict(modelo.get('salidas', {}))
+    for variante in variantes:
+        for nombre, formula in salidas_modelo(variante.modelo):
+            clave = variante.nombre if nombre == SALIDA_PRINCIPAL else f"{variante.nombre}.{nombre}"
+            while clave in salidas or clave == SALIDA_PRINCIPAL:
+                clave += "'"
+            salidas[clave] = formula
+    try:
+        validar_salidas(salidas, modelo['variables'])
+    except ModeloInvalido as e:
+        raise ModeloInvalido(f"Variante incompatible con '{modelo.get('nombre')}': {e}")
+    return dict(modelo, salidas=salidas)
+
+# Hash del contenido del modelo (independiente de espacios y orden de las llaves)
+def hash_modelo(modelo):
+    canonico = json.dumps(modelo, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()[:16]
+
+class EntradaCatalogo:
+    def __init__(self, archivo, hash, modelo, plan, advertencias):
+        self.archivo = archivo # Nombre del archivo en DIRECTORIO_MODELOS
+        self.hash = hash # Hash del contenido
+        self.modelo = modelo # Modelo tal cual (se publica a los workers)
+        self.plan = plan # [(variable, configuracion normalizada)]
+        self.advertencias = advertencias
+
+    @property
+    def nombre(self):
+        return self.modelo.get('nombre', self.archivo)
+
+class Catalogo:
+    def __init__(self, directorio=DIRECTORIO_MODELOS, cache=DIRECTORIO_CACHE_MODELOS):
+        self.directorio = Path(directorio)
+        self.cache = Path(cache)
+        self.entradas = {} # hash -> EntradaCatalogo
+        self.archivos = {} # archivo -> hash
+        self.invalidos = {} # archivo -> error
+
+    # Revisa el directorio de modelos. Los modelos ya conocidos (mismo hash) no se revalidan
+    def escanear(self):
+        self.archivos = {}
+        self.invalidos = {}
+        if not self.directorio.is_dir():
+            print(f"[ADVERTENCIA] No existe el directorio de modelos '{self.directorio}'")
+            return self.listar()
+        for ruta in sorted(self.directorio.glob('*.json')):
+            try:
+                with open(ruta, 'r', encoding='utf-8') as f:
+                    modelo = json.load(f)
+                entrada = self.registrar(ruta.name, modelo)
+                self.archivos[ruta.name] = entrada.hash
+            except json.JSONDecodeError as e:
+                self.invalidos[ruta.name] = f"Error al parsear JSON: {e}"
+            except ModeloInvalido as e:
+                self.invalidos[ruta.name] = str(e)
+        for archivo, error in self.invalidos.items():
+            print(f"[ERROR] Modelo '{archivo}' descartado: {error}")
+        return self.listar()
+
+    # Valida un modelo (o toma el resultado de la cache en disco)
+    def registrar(self, archivo, modelo):
+        hash = hash_modelo(modelo)
+        entrada = self.entradas.get(hash)
+        if entrada is None:
+            entrada = self.leer_cache(archivo, hash, modelo)
+        if entrada is None:
+            plan, advertencias = validar_modelo(modelo)
+            entrada = EntradaCatalogo(archivo, hash, modelo, plan, advertencias)
+            self.escribir_cache(entrada)
+        entrada.archivo = archivo
+        self.entradas[hash] = entrada
+        return entrada
+
+    # Entrada por hash o por nombre de archivo. Si no se conoce, se vuelve a escanear
+    def obtener(self, clave):
+        clave = os.path.basename(str(clave))
+        for intento in range(2):
+            if clave in self.entradas:
+                return self.entradas[clave]
+            if clave in self.archivos:
+                return self.entradas[self.archivos[clave]]
+            if clave in self.invalidos:
+                raise ModeloInvalido(self.invalidos[clave])
+            if intento == 0:
+                self.escanear()
+        return None
+
+    # Entradas validas ordenadas por archivo
+    def listar(self):
+        return [self.entradas[h] for _, h in sorted(self.archivos.items())]
+
+    # Ruta del archivo de cache (depende de la version de la validacion y de la de Python,
+    # que fija el formato de marshal)
+    def ruta_cache(self, hash):
+        return self.cache / f"{hash}.v{VERSION_CACHE}.{sys.implementation.cache_tag}.marshal"
+
+    # Entrada guardada en la cache. Se descarta si es de otra version o si su plan no
+    # corresponde a las variables del modelo
+    def leer_cache(self, archivo, hash, modelo):
+        ruta = self.ruta_cache(hash)
+        try:
+            with open(ruta, 'rb') as f:
+                datos = marshal.load(f)
+            if datos.get('version') != VERSION_CACHE:
+                raise ValueError(f"version {datos.get('version')} (se esperaba {VERSION_CACHE})")
+            plan = [tuple(paso) for paso in datos['plan']]
+            nombres = [nombre for nombre, _ in plan]
+            esperados = list(modelo.get('variables', {}))
+            if nombres[:len(esperados)] != esperados:
+                raise ValueError("el plan no corresponde a las variables del modelo")
+            return EntradaCatalogo(archivo, hash, modelo, plan, datos['advertencias'])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[ADVERTENCIA] Cache de modelo '{archivo}' invalida, se revalida: {e}")
+            return None
+
+    def escribir_cache(self, entrada):
+        try:
+            self.cache.mkdir(parents=True, exist_ok=True)
+            temporal = self.ruta_cache(entrada.hash).with_suffix('.tmp')
+            with open(temporal, 'wb') as f:
+                marshal.dump({'version': VERSION_CACHE, 'plan': entrada.plan,
+                              'advertencias': entrada.advertencias}, f)
+            os.replace(temporal, self.ruta_cache(entrada.hash))
+        except OSError as e:
+            print(f"[ADVERTENCIA] No se pudo escribir la cache del modelo '{entrada.archivo}': {e}")
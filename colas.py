@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# COLAS
+# Descripcion: Nombres, declaracion y propiedades de publicacion de las colas de
+# escenarios y resultados segun el perfil de durabilidad (ver PERFILES en config.py)
+# Escenarios y resultados estan particionados en K shards:
+#   escenarios<sufijo>.<i> y resultados<sufijo>.<i>, i = 0..K-1
+# Los escenarios se reparten con un exchange de hash consistente: agregar un shard
+# solo redirige ~1/K de las claves nuevas y no obliga a purgar nada
+
+import pika
+from config import (QUEUE_MODELO, QUEUE_MODELOS_EXPIRADOS, QUEUE_ESCENARIOS, QUEUE_RESULTADOS, PERFILES, PERFIL_DURABILIDAD,
+                   MODELO_TTL, NUM_SHARDS, EXCHANGE_ESCENARIOS, SHARD_EXCHANGE_TIPO, SHARDS_POR_WORKER)
+
+# Valida el perfil y regresa su configuracion
+def obtener_perfil(perfil=None):
+    perfil = perfil or PERFIL_DURABILIDAD
+    if perfil not in PERFILES:
+        raise ValueError(f"Perfil de durabilidad desconocido: '{perfil}' "
+                         f"(opciones: {', '.join(PERFILES)})")
+    return PERFILES[perfil]
+
+# Cola del modelo de una ejecucion (run)
+def cola_modelo(run_id):
+    return f"{QUEUE_MODELO}.{run_id}"
+
+# Declara la cola del modelo de una ejecucion: el mensaje expira con el TTL
+# y la cola se borra sola cuando nadie la usa
+# Al expirar, el broker manda el modelo a QUEUE_MODELOS_EXPIRADOS (dead-letter): el productor
+# se entera en cuanto pasa sin consultar la cola
+def declarar_cola_modelo(channel, run_id):
+    return channel.queue_declare(
+        queue=cola_modelo(run_id),
+        durable=True, # Persistente
+        arguments={'x-message-ttl': MODELO_TTL, # Modelo con TTL
+                   'x-expires': MODELO_TTL * 2, # Cola sin uso se elimina
+                   'x-dead-letter-exchange': '', # Modelo expirado -> cola de expiraciones
+                   'x-dead-letter-routing-key': QUEUE_MODELOS_EXPIRADOS}
+    )
+
+# Nombre de la cola de escenarios del perfil y shard
+def cola_escenarios(perfil=None, shard=0):
+    return f"{QUEUE_ESCENARIOS}{obtener_perfil(perfil)['sufijo']}.{shard}"
+
+# Nombre de la cola de resultados del perfil y shard
+def cola_resultados(perfil=None, shard=0):
+    return f"{QUEUE_RESULTADOS}{obtener_perfil(perfil)['sufijo']}.{shard}"
+
+# Colas de escenarios de todos los shards de un perfil
+def colas_escenarios(perfil=None, shards=NUM_SHARDS):
+    return [cola_escenarios(perfil, i) for i in range(shards)]
+
+# Colas de resultados de todos los shards de un perfil
+def colas_resultados(perfil=None, shards=NUM_SHARDS):
+    return [cola_resultados(perfil, i) for i in range(shards)]
+
+# Exchange que reparte los escenarios del perfil entre sus shards
+def exchange_escenarios(perfil=None):
+    return EXCHANGE_ESCENARIOS + obtener_perfil(perfil)['sufijo']
+
+# Exchange y routing key para publicar un escenario con la clave dada
+def destino_escenario(perfil, clave, shards=NUM_SHARDS):
+    if SHARD_EXCHANGE_TIPO:
+        return exchange_escenarios(perfil), str(clave)
+    # Sin exchange de hash: el productor elige el shard
+    return '', cola_escenarios(perfil, clave % shards)
+
+# Shard de resultados que corresponde a un shard de escenarios
+def shard_resultados(shard):
+    return shard % NUM_SHARDS
+
+# Shards que consume un worker
+def shards_de_worker(worker_id, shards=NUM_SHARDS):
+    if SHARDS_POR_WORKER <= 0 or SHARDS_POR_WORKER >= shards:
+        return list(range(shards))
+    try:
+        inicio = int(worker_id) - 1
+    except ValueError:
+        inicio = sum(ord(c) for c in str(worker_id)) # IDs no numericos
+    return sorted({(inicio + j) % shards for j in range(SHARDS_POR_WORKER)})
+
+# Declara una cola con los argumentos del perfil
+def declarar_cola(channel, nombre_cola, perfil=None):
+    config = obtener_perfil(perfil)
+    return channel.queue_declare(queue=nombre_cola, durable=config['durable'],
+                                 auto_delete=config['auto_delete'])
+
+# Declara un shard de escenarios y lo enlaza al exchange del perfil
+def declarar_shard_escenarios(channel, perfil, shard):
+    cola = cola_escenarios(perfil, shard)
+    declarar_cola(channel, cola, perfil)
+    if SHARD_EXCHANGE_TIPO:
+        # En x-consistent-hash la routing key del binding es el peso del shard
+        channel.queue_bind(queue=cola, exchange=exchange_escenarios(perfil), routing_key='1')
+
+# Deja de enviar escenarios a un shard (lo que ya tiene se sigue consumiendo)
+def desenlazar_shard_escenarios(channel, perfil, shard):
+    if SHARD_EXCHANGE_TIPO:
+        channel.queue_unbind(queue=cola_escenarios(perfil, shard),
+                             exchange=exchange_escenarios(perfil), routing_key='1')
+
+# Declara exchange, shards de escenarios y shards de resultados de un perfil
+def declarar_colas_perfil(channel, perfil=None, shards=NUM_SHARDS):
+    config = obtener_perfil(perfil)
+    if SHARD_EXCHANGE_TIPO:
+        channel.exchange_declare(exchange=exchange_escenarios(perfil),
+                                 exchange_type=SHARD_EXCHANGE_TIPO,
+                                 durable=config['durable'])
+    for shard in range(shards):
+        declarar_shard_escenarios(channel, perfil, shard)
+    for cola in colas_resultados(perfil):
+        declarar_cola(channel, cola, perfil)
+
+# Propiedades de los mensajes publicados con el perfil
+def propiedades_mensaje(perfil=None):
+    return pika.BasicProperties(delivery_mode=obtener_perfil(perfil)['delivery_mode'])
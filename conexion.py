@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# CONEXION
+# Descripcion: Gestor de conexiones a RabbitMQ compartido por productor, workers y dashboard
+# - Heartbeats configurados para detectar conexiones muertas
+# - Reconexion con retroceso exponencial y jitter
+# - Una conexion y un conjunto de canales con nombre por hilo (pika no es thread-safe)
+# - Tras reconectar: re-declara la topologia, re-registra consumidores y
+#   re-publica los mensajes que no alcanzaron a confirmarse
+
+import pika
+import random
+import threading
+import time
+from config import (RABBIT_HOST, RABBIT_USER, RABBIT_PASS, RABBIT_HEARTBEAT,
+                   RECONEXION_BASE, RECONEXION_MAX, RECONEXION_INTENTOS, BROKER_LOCAL)
+
+# Errores que indican que la conexion o el canal ya no sirven
+ERRORES_CONEXION = (
+    pika.exceptions.AMQPConnectionError,
+    pika.exceptions.ConnectionWrongStateError,
+    pika.exceptions.ChannelWrongStateError,
+    pika.exceptions.ChannelClosed,
+)
+
+class GestorConexion:
+    def __init__(self, nombre, heartbeat=RABBIT_HEARTBEAT, broker_local=BROKER_LOCAL):
+        self.nombre = nombre # Nombre del componente (para los mensajes)
+        self.heartbeat = heartbeat # Segundos entre heartbeats
+        self.broker_local = broker_local # "host:puerto" del broker local de pruebas (None = RabbitMQ)
+        self.local = threading.local() # Conexion, canales y consumidores de cada hilo
+        self.topologia = [] # Funciones fn(channel) que declaran colas/exchanges
+        self.al_reconectar = [] # Funciones fn() que se llaman despues de reconectar
+        self.conexiones = [] # Todas las conexiones abiertas (para cerrarlas al salir)
+        self.lock = threading.Lock()
+        self.cerrado = False
+
+    # Estado del hilo actual (se crea la primera vez)
+    def estado(self):
+        if not hasattr(self.local, 'conexion'):
+            self.local.conexion = None
+            self.local.canales = {} # nombre -> canal
+            self.local.preparar = {} # nombre -> fn(channel) al crear el canal (tx_select, etc)
+            self.local.consumidores = [] # (cola, callback, prefetch, auto_ack, canal)
+            self.local.prefetch_canal = {} # canal -> limite compartido por sus consumidores
+            self.local.sin_confirmar = {} # canal transaccional -> [(exchange, routing_key, body, properties)]
+            self.local.consumiendo = False
+            self.local.reconexiones = 0
+        return self.local
+
+    # Parametros de conexion con heartbeat
+    def parametros(self):
+        creds = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
+        return pika.ConnectionParameters(
+            host=RABBIT_HOST,
+            credentials=creds,
+            heartbeat=self.heartbeat,
+            blocked_connection_timeout=self.heartbeat * 2 # No quedarse bloqueado si el broker aplica flow control
+        )
+
+    # Conexion nueva a RabbitMQ o al broker local de pruebas
+    # (broker_local solo se importa si se usa: produccion no depende del arnes de pruebas)
+    def nueva_conexion(self):
+        if self.broker_local:
+            from broker_local import ConexionLocal
+            return ConexionLocal(self.broker_local)
+        return pika.BlockingConnection(self.parametros())
+
+    # Espera antes del intento n: retroceso exponencial con jitter completo
+    def espera_reintento(self, intento):
+        return random.uniform(0, min(RECONEXION_MAX, RECONEXION_BASE * (2 ** intento)))
+
+    # Registra una funcion que declara colas/exchanges en cada (re)conexion
+    def agregar_topologia(self, fn):
+        self.topologia.append(fn)
+
+    # Conexion del hilo actual. Se conecta (con reintentos) si no hay o se perdio
+    # intentos: maximo de intentos (0 = infinitos). None usa RECONEXION_INTENTOS
+    def conexion(self, intentos=None):
+        estado = self.estado()
+        if estado.conexion is not None and estado.conexion.is_open:
+            return estado.conexion
+
+        intentos = RECONEXION_INTENTOS if intentos is None else intentos
+        intento = 0
+        while not self.cerrado:
+            try:
+                conexion = self.nueva_conexion()
+                break
+            except pika.exceptions.AMQPConnectionError as e:
+                intento += 1
+                if intentos and intento >= intentos:
+                    raise
+                espera = self.espera_reintento(intento)
+                print(f"[ADVERTENCIA] {self.nombre} - No se pudo conectar a RabbitMQ ({e!r}), "
+                      f"reintentando en {espera:.1f}s (intento {intento})")
+                time.sleep(espera)
+        else:
+            raise pika.exceptions.ConnectionWrongStateError("Gestor de conexion cerrado")
+
+        reconexion = estado.conexion is not None
+        estado.conexion = conexion
+        estado.canales = {}
+        with self.lock:
+            self.conexiones = [c for c in self.conexiones if c.is_open]
+            self.conexiones.append(conexion)
+
+        # Re-declarar topologia en un canal temporal
+        for fn in self.topologia:
+            canal = conexion.channel()
+            fn(canal)
+            if canal.is_open:
+                canal.close()
+
+        if reconexion:
+            estado.reconexiones += 1
+            print(f"[EXITO] {self.nombre} - Reconectado a RabbitMQ (reconexiones: {estado.reconexiones})")
+            for fn in self.al_reconectar:
+                fn()
+            self.republicar_pendientes()
+        return conexion
+
+    # Hay una conexion abierta en el hilo actual
+    def conectado(self):
+        conexion = self.estado().conexion
+        return conexion is not None and conexion.is_open
+
+    # Canal con nombre del hilo actual (se crea o recrea si se cerro)
+    # preparar: fn(channel) que se aplica al crear el canal (ej. tx_select)
+    def canal(self, nombre='principal', preparar=None):
+        estado = self.estado()
+        if preparar is not None:
+            estado.preparar[nombre] = preparar
+        conexion = self.conexion()
+        canal = estado.canales.get(nombre)
+        if canal is None or not canal.is_open:
+            canal = conexion.channel()
+            if nombre in estado.preparar:
+                estado.preparar[nombre](canal)
+            estado.canales[nombre] = canal
+        return canal
+
+    # Descarta la conexion del hilo actual para que la siguiente operacion reconecte
+    def descartar(self):
+        estado = self.estado()
+        conexion = estado.conexion
+        estado.canales = {}
+        if conexion is not None and conexion.is_open:
+            try:
+                conexion.close()
+            except Exception:
+                pass
+
+    # Publica un mensaje reintentando ante errores de conexion
+    # En canales transaccionales el mensaje queda pendiente hasta confirmar() (un tx_commit por
+    # lote; con BlockingConnection los publisher confirms esperan el ack de cada mensaje)
+    # y se re-publica si la conexion cae antes del commit
+    def publicar(self, routing_key, body, properties=None, exchange='', canal='principal',
+                 transaccional=False, intentos=None):
+        estado = self.estado()
+        if transaccional:
+            estado.preparar[canal] = lambda ch: ch.tx_select()
+            estado.sin_confirmar.setdefault(canal, []).append((exchange, routing_key, body, properties))
+
+        intentos = RECONEXION_INTENTOS if intentos is None else intentos
+        intento = 0
+        while True:
+            try:
+                self.canal(canal).basic_publish(exchange=exchange, routing_key=routing_key,
+                                                body=body, properties=properties)
+                return
+            except ERRORES_CONEXION as e:
+                intento += 1
+                if self.cerrado or (intentos and intento >= intentos):
+                    raise
+                print(f"[ADVERTENCIA] {self.nombre} - Error al publicar ({e!r}), reconectando...")
+                if transaccional:
+                    # La reconexion re-publica todo lo pendiente (incluido este mensaje)
+                    self.descartar()
+                    self.esperar_reconexion(intento)
+                    return
+                self.descartar()
+                time.sleep(self.espera_reintento(intento))
+
+    # Reconecta despues de un error (con espera) y re-publica pendientes
+    def esperar_reconexion(self, intento=1):
+        time.sleep(self.espera_reintento(intento))
+        self.conexion()
+
+    # Confirma (commit) los mensajes pendientes de un canal transaccional
+    def confirmar(self, canal='principal'):
+        estado = self.estado()
+        if not estado.sin_confirmar.get(canal):
+            return
+        intento = 0
+        while True:
+            try:
+                self.canal(canal).tx_commit()
+                estado.sin_confirmar[canal] = []
+                return
+            except ERRORES_CONEXION as e:
+                if self.cerrado:
+                    raise
+                intento += 1
+                print(f"[ADVERTENCIA] {self.nombre} - Error al confirmar lote ({e!r}), reconectando...")
+                self.descartar()
+                self.esperar_reconexion(intento)
+
+    # Mensajes publicados sin confirmar en el hilo actual
+    def pendientes(self, canal='principal'):
+        return len(self.estado().sin_confirmar.get(canal, []))
+
+    # Re-publica mensajes transaccionales que no alcanzaron a confirmarse
+    def republicar_pendientes(self):
+        estado = self.estado()
+        for canal, mensajes in estado.sin_confirmar.items():
+            if not mensajes:
+                continue
+            print(f"[INFORMACION] {self.nombre} - Re-publicando {len(mensajes)} mensajes sin confirmar")
+            ch = self.canal(canal)
+            for exchange, routing_key, body, properties in mensajes:
+                ch.basic_publish(exchange=exchange, routing_key=routing_key,
+                                 body=body, properties=properties)
+
+    # Registra un consumidor del hilo actual (se vuelve a registrar tras reconectar)
+    # Si ya se esta consumiendo, el consumidor se registra de inmediato
+    def consumir(self, cola, callback, prefetch=1, auto_ack=False, canal='consumo'):
+        estado = self.estado()
+        estado.consumidores.append((cola, callback, prefetch, auto_ack, canal))
+        if estado.consumiendo and self.conectado():
+            ch = self.canal(canal)
+            ch.basic_qos(prefetch_count=prefetch)
+            ch.basic_consume(queue=cola, on_message_callback=callback, auto_ack=auto_ack)
+
+    # Limite de mensajes sin ack compartido por todos los consumidores del canal (QoS global)
+    # Se suma al limite de cada consumidor y se puede cambiar en cualquier momento
+    def ajustar_prefetch(self, prefetch, canal='consumo'):
+        estado = self.estado()
+        estado.prefetch_canal[canal] = prefetch
+        if estado.consumiendo and self.conectado():
+            self.canal(canal).basic_qos(prefetch_count=prefetch, global_qos=True)
+
+    # Consume los consumidores registrados hasta detener_consumo()
+    # Si la conexion cae, reconecta y los vuelve a registrar
+    def iniciar_consumo(self):
+        estado = self.estado()
+        estado.consumiendo = True
+        intento = 0
+        while estado.consumiendo and not self.cerrado:
+            try:
+                conexion = self.conexion()
+                for cola, callback, prefetch, auto_ack, nombre_canal in estado.consumidores:
+                    ch = self.canal(nombre_canal)
+                    ch.basic_qos(prefetch_count=prefetch) # QoS por consumidor
+                    ch.basic_consume(queue=cola, on_message_callback=callback, auto_ack=auto_ack)
+                for nombre_canal, prefetch in estado.prefetch_canal.items():
+                    self.canal(nombre_canal).basic_qos(prefetch_count=prefetch, global_qos=True)
+                intento = 0
+                while estado.consumiendo and not self.cerrado:
+                    conexion.process_data_events(time_limit=1)
+            except ERRORES_CONEXION as e:
+                if not estado.consumiendo or self.cerrado:
+                    break
+                intento += 1
+                espera = self.espera_reintento(intento)
+                print(f"[ADVERTENCIA] {self.nombre} - Conexion perdida ({e!r}), "
+                      f"reconectando en {espera:.1f}s...")
+                self.descartar()
+                time.sleep(espera)
+
+    # Detiene iniciar_consumo() del hilo actual (llamar desde un callback)
+    def detener_consumo(self):
+        self.estado().consumiendo = False
+
+    # Programa fn en la conexion del hilo actual
+    def call_later(self, segundos, fn):
+        return self.conexion().call_later(segundos, fn)
+
+    # Espera atendiendo heartbeats de la conexion del hilo actual
+    def dormir(self, segundos):
+        try:
+            self.conexion().sleep(segundos)
+        except ERRORES_CONEXION:
+            self.descartar()
+            time.sleep(segundos)
+
+    # Atiende eventos pendientes (heartbeats) sin bloquear
+    def procesar_eventos(self):
+        estado = self.estado()
+        if estado.conexion is None or not estado.conexion.is_open:
+            return
+        try:
+            estado.conexion.process_data_events(time_limit=0)
+        except ERRORES_CONEXION:
+            self.descartar()
+
+    # Cierra la conexion del hilo actual
+    def cerrar_hilo(self):
+        self.descartar()
+        self.estado().conexion = None
+
+    # Cierra todas las conexiones (al terminar el proceso)
+    def cerrar(self):
+        self.cerrado = True
+        with self.lock:
+            conexiones = list(self.conexiones)
+            self.conexiones = []
+        for conexion in conexiones:
+            try:
+                if conexion.is_open:
+                    conexion.close()
+            except Exception:
+                pass
@@ -2,9 +2,20 @@
 RABBIT_HOST = "172.31.12.207"
 RABBIT_USER = "admin"
 RABBIT_PASS = "admin"
+RABBIT_HEARTBEAT = 30 # Segundos entre heartbeats (detecta conexiones muertas)
+RABBIT_GESTION_PUERTO = 15672 # API HTTP del plugin de administracion (contadores por cola para limpiar_colas.py)
+# Broker local de pruebas (broker_local.py) en lugar de RabbitMQ: "host:puerto" o None
+BROKER_LOCAL = None
+BROKER_LOCAL_PUERTO = 5679 # Puerto por defecto de broker_local.py
+
+# Reconexion automatica (retroceso exponencial con jitter)
+RECONEXION_BASE = 0.5 # Espera base en segundos
+RECONEXION_MAX = 30 # Espera maxima en segundos
+RECONEXION_INTENTOS = 0 # Maximo de intentos por operacion (0 = sin limite)
 
 # Colas del sistema
 QUEUE_MODELO = "modelo" # Se publica el modelo para ser consumido por workers
+QUEUE_MODELOS_EXPIRADOS = "modelos_expirados" # Dead-letter de las colas de modelo: el productor recibe cada expiracion
 QUEUE_ESCENARIOS = "escenarios" # Se publican varios escenarios de acuerdo al modelo
 QUEUE_RESULTADOS = "resultados" # Los workers publican sus resultados. Dashboard los consume para mostrar estadisticas
 QUEUE_COMANDOS = "comandos"  # Comandos de la interfaz (dashboard) para que el productor cargue modelos diferentes
@@ -14,3 +25,132 @@ MODELO_TTL = 60000  # 2 minutos
 
 # Intervalo de generacion de escenarios (segundos)
 ESCENARIO_INTERVAL = 0.05
+
+# Control de workers (comandos dirigidos a un worker especifico o a todos)
+EXCHANGE_CONTROL_WORKERS = "control_workers" # Exchange directo, routing key = id del worker
+QUEUE_CONTROL_WORKER = "control_worker" # Prefijo de la cola de control de cada worker
+CONTROL_TODOS = "todos" # Routing key para enviar un comando a todos los workers
+
+# Perfilado bajo demanda
+DIRECTORIO_PERFILES = "perfiles" # Carpeta donde se escriben los perfiles
+PERFIL_INTERVALO_MUESTREO = 0.005 # Segundos entre muestras (modo muestreo)
+
+# Perfiles de durabilidad / rendimiento para escenarios y resultados
+#   durable: colas durables y mensajes persistentes (el broker hace fsync de cada mensaje)
+#   fast: mensajes transitorios en colas no durables (un escenario perdido se regenera)
+#     Las colas son por perfil y shard, compartidas por todas las ejecuciones, y no son auto-delete:
+#     solo el productor las enlaza al exchange, y si se borraran al irse el ultimo consumidor (caida,
+#     reinicio o reduccion de workers) el worker las volveria a declarar sin binding y los
+#     escenarios se perderian sin ruta. Desaparecen al reiniciar el broker
+#   confirmed-batch: colas durables, mensajes persistentes confirmados en lotes (transacciones)
+#     Se usan transacciones AMQP y no publisher confirms: con BlockingConnection (pika) cada
+#     basic_publish en modo confirm_delivery() espera su propio ack, un viaje de ida y vuelta por
+#     mensaje; tx_commit cuesta uno por lote de LOTE_CONFIRMACION. El broker local solo implementa tx
+# Cada perfil usa sus propias colas (RabbitMQ no permite redeclarar una cola con otra durabilidad)
+PERFILES = {
+    'durable': {'sufijo': '', 'durable': True, 'auto_delete': False,
+                'delivery_mode': 2, 'confirmado': False},
+    'fast': {'sufijo': '.fast', 'durable': False, 'auto_delete': False,
+             'delivery_mode': 1, 'confirmado': False},
+    'confirmed-batch': {'sufijo': '.confirmado', 'durable': True, 'auto_delete': False,
+                        'delivery_mode': 2, 'confirmado': True},
+}
+PERFIL_DURABILIDAD = "durable" # Perfil por defecto (el comando cambiar_modelo puede indicar otro)
+LOTE_CONFIRMACION = 100 # Mensajes por transaccion en el perfil confirmed-batch
+INTERVALO_CONFIRMACION = 0.5 # Segundos maximos antes de confirmar un lote incompleto
+
+# Particionado (shards) de escenarios y resultados
+# Una cola de RabbitMQ vive en un solo nucleo de un solo nodo: con K shards el trabajo
+# se reparte entre K colas escenarios.<i> / resultados.<i>
+NUM_SHARDS = 4 # K por defecto (el comando 'ajustar_shards' lo cambia en caliente)
+EXCHANGE_ESCENARIOS = "escenarios.shards" # Exchange que reparte escenarios entre shards
+# Tipo del exchange de escenarios. 'x-consistent-hash' requiere el plugin
+# rabbitmq_consistent_hash_exchange; con None el productor reparte los escenarios por si mismo
+SHARD_EXCHANGE_TIPO = "x-consistent-hash"
+# Shards que consume cada worker (0 = todos). Con N > 0 el worker <id> consume
+# los shards (id-1) ... (id-1+N-1) modulo K
+SHARDS_POR_WORKER = 0
+
+# Ejecuciones (runs) concurrentes
+MAX_MODELOS_WORKER = 32 # Modelos de ejecuciones que cada worker guarda en memoria
+INTENTOS_MODELO = 5 # Lecturas de la cola de modelo antes de darla por expirada
+ESPERA_MODELO = 0.05 # Segundos entre lecturas (otro worker puede tener el modelo tomado)
+
+# Analisis de sensibilidad (indices de Sobol)
+SOBOL_BLOQUE = 32 # Filas base (n) por lote: cada lote lleva n * (k + 2) evaluaciones
+SOBOL_BOOTSTRAP = 200 # Replicas bootstrap para los intervalos de confianza
+SOBOL_CONFIANZA = 0.95 # Nivel de confianza de los intervalos
+
+# Pipeline del productor: muestreo -> serializacion -> publicacion
+# Cada etapa tiene sus propios hilos; entre etapas viajan lotes por colas acotadas
+HILOS_MUESTREO = 1 # Hilos que generan escenarios
+HILOS_SERIALIZACION = 1 # Hilos que convierten escenarios a JSON
+HILOS_PUBLICACION = 2 # Hilos que publican (cada uno con su propia conexion)
+SERIALIZACION_PROCESOS = 0 # Procesos para serializar (0 = en los hilos; >0 cuando el JSON es el cuello de botella)
+PIPELINE_LOTE = 50 # Mensajes maximos por lote entre etapas
+PIPELINE_ESPERA_MAX = 0.2 # Segundos maximos para juntar un lote
+PIPELINE_CAPACIDAD = 8 # Lotes en espera entre etapas (contrapresion)
+PIPELINE_REPORTE = 10 # Segundos entre reportes de rendimiento por etapa
+
+# Catalogo de modelos
+DIRECTORIO_MODELOS = "modelos" # Carpeta con los modelos (*.json)
+DIRECTORIO_CACHE_MODELOS = ".cache_modelos" # Planes de muestreo validados por hash
+
+# Evaluacion de formulas en los workers (lotes de sensibilidad)
+# 'escalar' (eval fila por fila), 'numpy' (por columnas) o 'numba' (ciclo compilado; si Numba
+# no esta instalado se usa numpy)
+BACKEND_EVALUACION = "numpy"
+
+# Latidos de los workers y prefetch adaptativo
+EXCHANGE_LATIDOS = "latidos" # Exchange fanout: cada worker publica su estado, el dashboard lo consume
+LATIDO_INTERVALO = 2 # Segundos entre latidos de cada worker
+LATIDOS_PERDIDOS_CAIDO = 3 # Latidos sin llegar para marcar un worker como caido
+FACTOR_REZAGADO = 0.5 # Worker rezagado: su tasa es menor a esta fraccion de la mediana
+EWMA_ALFA = 0.3 # Peso de la ultima medicion en los promedios moviles exponenciales
+# Limite de escenarios sin ack por worker (compartido por todos sus shards). En cada latido
+# se recalcula como los mensajes que el worker procesa durante PREFETCH_MARGEN viajes al broker
+PREFETCH_INICIAL = 10
+PREFETCH_MINIMO = 1 # Por cada shard que consume el worker
+PREFETCH_MAXIMO = 500
+PREFETCH_MARGEN = 2
+
+# Salidas adicionales (variantes sobre los mismos escenarios)
+CONFIANZA_SALIDAS = 0.95 # Nivel del intervalo de la diferencia pareada contra la salida principal
+
+# Bitacora de escenarios (replay): registro en disco de los escenarios de una ejecucion
+GRABAR_ESCENARIOS = False # Grabar todas las ejecuciones (cada comando puede pedirlo con 'grabar')
+DIRECTORIO_BITACORAS = "bitacoras" # Una bitacora <run_id>.bitacora por ejecucion grabada
+BITACORA_SEGMENTO = 4 * 1024 * 1024 # Bytes que crece el archivo cada vez que se llena
+
+# Muestreo por importancia y estratificado (bloque 'muestreo' del modelo o del comando)
+ESTRATOS_MAXIMOS = 4096 # Estratos maximos por ejecucion (producto de los estratos de cada variable)
+CONFIANZA_PONDERADO = 0.95 # Nivel de los intervalos de las estimaciones ponderadas
+
+# Supervisor de workers (supervisor.py): escala los procesos worker de este host
+SUPERVISOR_MIN_WORKERS = 1
+SUPERVISOR_MAX_WORKERS = 8
+SUPERVISOR_INTERVALO = 2 # Segundos entre revisiones de la cola y los procesos
+SUPERVISOR_DRENADO = 10 # Segundos en los que se quiere vaciar lo que hay en cola
+SUPERVISOR_UTILIZACION = 0.8 # Fraccion de su capacidad medida que se le asigna a cada worker
+SUPERVISOR_ESPERA_BAJA = 30 # Segundos necesitando menos workers antes de reducir
+SUPERVISOR_ESPERA_DRENADO = 15 # Segundos para terminar de drenar (despues SIGINT y, al doble, se mata)
+SUPERVISOR_BACKOFF_BASE = 1 # Espera antes de reiniciar un worker caido (se duplica en cada caida seguida)
+SUPERVISOR_BACKOFF_MAX = 60
+SUPERVISOR_ESTABLE = 60 # Segundos corriendo tras los que las caidas seguidas vuelven a cero
+DIRECTORIO_SUPERVISOR = "supervisor" # Salida de los workers administrados (worker_<id>.log)
+
+# Escenarios por mensaje (modo montecarlo): el productor junta varios escenarios en un mensaje para
+# que cada mensaje le tome al worker unos LOTE_ESCENARIOS_OBJETIVO segundos de evaluacion
+# (costo por escenario que los workers reportan en sus latidos). El comando puede fijarlo con 'lote'
+LOTE_ESCENARIOS_OBJETIVO = 0.01 # Segundos de evaluacion por mensaje
+LOTE_ESCENARIOS_MAXIMO = 1000 # Escenarios maximos por mensaje
+
+# Barrido de parametros (modo barrido): reticula de parametros de las distribuciones evaluada
+# sobre los mismos escenarios base. Cada mensaje lleva los escenarios base que quepan en el
+# tamano de lote (filas = escenarios x puntos)
+BARRIDO_PUNTOS_MAXIMOS = 1000 # Puntos maximos de la reticula (producto de los ejes)
+
+# Modelos de trayectoria (tipo 'trayectoria'): los workers simulan las trayectorias de un lote a la
+# vez (arreglos numpy) por bloques de TRAYECTORIA_BLOQUE para acotar la memoria
+TRAYECTORIA_BLOQUE = 4096 # Trayectorias simuladas a la vez
+TRAYECTORIA_PASOS_MAXIMOS = 100000 # Pasos maximos de un modelo
@@ -8,30 +8,38 @@ import pika
 import json
 import time
 import threading
+import uuid
 from pathlib import Path
 from config import (RABBIT_HOST, RABBIT_USER, RABBIT_PASS,
-                   QUEUE_COMANDOS, QUEUE_RESULTADOS, MODELO_TTL)
+                   QUEUE_COMANDOS, QUEUE_RESULTADOS, MODELO_TTL,
+                   PERFILES, PERFIL_DURABILIDAD, SOBOL_CONFIANZA, CONFIANZA_SALIDAS,
+                   EXCHANGE_LATIDOS, LATIDO_INTERVALO, LATIDOS_PERDIDOS_CAIDO, GRABAR_ESCENARIOS)
+from colas import colas_resultados, declarar_cola
+from conexion import GestorConexion
+from agregador import EstadisticasEjecucion, MonitorWorkers, expandir_resultado, seqs_fallidos
+from barrido import leer_ejes, etiqueta_punto
+from catalogo import Catalogo
 
 class DashboardGUI:
     def __init__(self, root):
         # Variables para la interfaz
         self.root = root
         self.root.title("Dashboard - Simulación Montecarlo Distribuida")
-        self.root.geometry("900x650")
+        self.root.geometry("900x950")
         self.root.resizable(True, True)
         
         # Variables para la logica
-        self.connection = None # Conexion
-        self.channel = None # Canal
-        self.modelo_actual = tk.StringVar(value="Sin modelo cargado") # Modelo que se quiere cargar
-        self.total_resultados = 0 # Total resultados
-        self.resultados = [] # Resultados obtenidos
-        self.workers_stats = {} # Estadisticas de los workers
-        self.tiempo_inicio = None # Tiempo inicial del modelo
+        self.gestor = GestorConexion('Dashboard') # Conexiones (una por hilo) con reconexion automatica
+        self.ejecuciones = {} # run_id -> EstadisticasEjecucion (una por ejecucion concurrente)
+        self.lock_ejecuciones = threading.Lock() # Los resultados llegan en otro hilo
+        self.ejecuciones_sin_resultados = set() # Ejecuciones ya avisadas como expiradas
         self.escuchando = False # Escuchar resultados de RESULTADOS
-        self.ultimo_resultado_tiempo = None # 
+        self.monitor = MonitorWorkers() # Tasa y estado de cada worker (latidos)
+        # Cola propia ligada al exchange de latidos (cada dashboard recibe todos los latidos)
+        self.cola_latidos = f"{EXCHANGE_LATIDOS}.dashboard.{uuid.uuid4().hex[:8]}"
         
-        # Modelos disponibles
+        # Modelos disponibles (catalogo del directorio de modelos)
+        self.catalogo = Catalogo()
         self.modelos_disponibles = self.detectar_modelos()
         
         # Crear interfaz
@@ -46,16 +54,22 @@ class DashboardGUI:
         # Actualizar UI cada cierto tiempo
         self.actualizar_ui()
     
-    # Detectar modelos disponibles
+    # Detectar modelos disponibles en el catalogo (solo los validos)
     def detectar_modelos(self):
-        modelos = []
-        # Directamente pasamos la lista de los nombres con los modelos
-        # para que no dependa de tener los modelos en archivos
-        for archivo in ['modelo_tiempo.json', 'modelo_area.json', 'modelo_beneficio.json']:
-            modelos.append({
-                        'archivo': archivo,
-                    })
-        return modelos
+        return [{'archivo': entrada.archivo, 'nombre': entrada.nombre, 'hash': entrada.hash}
+                for entrada in self.catalogo.escanear()]
+    
+    # Vuelve a escanear el directorio de modelos
+    def actualizar_modelos(self):
+        self.modelos_disponibles = self.detectar_modelos()
+        self.combo_modelos['values'] = [
+            f"{m['nombre']} ({m['archivo']})" for m in self.modelos_disponibles
+        ]
+        if self.modelos_disponibles and self.combo_modelos.current() < 0:
+            self.combo_modelos.current(0)
+        for archivo, error in self.catalogo.invalidos.items():
+            self.agregar_log(f"[ERROR] Modelo '{archivo}' descartado: {error}")
+        self.agregar_log(f"[INFORMACION] {len(self.modelos_disponibles)} modelos en el catálogo")
     
     # Crea interfaz grafica
     def crear_interfaz(self):
@@ -63,13 +77,30 @@ class DashboardGUI:
         frame_control = tk.LabelFrame(self.root, text="Control de Modelos", font=('Arial', 12, 'bold'))
         frame_control.pack(fill=tk.X, padx=10, pady=10)
         
-        # Modelo actual
-        tk.Label(frame_control, text="Modelo Actual:", font=('Arial', 10, 'bold')).grid(
+        # Ejecucion que se muestra en las estadisticas
+        tk.Label(frame_control, text="Ejecución:", font=('Arial', 10, 'bold')).grid(
             row=0, column=0, padx=10, pady=5, sticky=tk.W
         )
-        lbl_modelo = tk.Label(frame_control, textvariable=self.modelo_actual, font=('Arial', 10),
-                fg='darkgreen', wraplength=400)
-        lbl_modelo.grid(row=0, column=1, columnspan=2, padx=10, pady=5, sticky=tk.W)
+        self.combo_ejecuciones = ttk.Combobox(frame_control, width=40, state='readonly')
+        self.combo_ejecuciones.grid(row=0, column=1, padx=10, pady=5, sticky=tk.W)
+        
+        # Boton Detener ejecucion (solo la seleccionada, las demas siguen)
+        btn_detener = tk.Button(
+            frame_control,
+            text="Detener Ejecución",
+            command=self.detener_ejecucion,
+            bg='#f44336',
+            fg='white',
+            font=('Arial', 10, 'bold'),
+            padx=20,
+            pady=5
+        )
+        btn_detener.grid(row=0, column=2, padx=10, pady=5)
+        
+        # Boton Replay: repite la ejecucion seleccionada (grabada) con el modelo seleccionado
+        btn_replay = tk.Button(frame_control, text="Replay", command=self.replay,
+                               font=('Arial', 9))
+        btn_replay.grid(row=0, column=3, padx=5, pady=5)
         
         # Selector de modelos
         tk.Label(frame_control, text="Seleccionar Modelo:", font=('Arial', 10)).grid(
@@ -79,17 +110,17 @@ class DashboardGUI:
         self.combo_modelos = ttk.Combobox(frame_control, width=40, state='readonly')
         # Nombres de los modelos en la combobox
         self.combo_modelos['values'] = [
-            f"{m['archivo']}" for m in self.modelos_disponibles
+            f"{m['nombre']} ({m['archivo']})" for m in self.modelos_disponibles
         ]
         if self.modelos_disponibles:
             self.combo_modelos.current(0)
         self.combo_modelos.grid(row=1, column=1, padx=10, pady=5, sticky=tk.W)
         
-        # Boton Insertar modelo
+        # Boton Iniciar ejecucion del modelo
         btn_cambiar = tk.Button(
             frame_control, 
-            text="Insertar Modelo", 
-            command=self.cambiar_modelo,
+            text="Iniciar Ejecución", 
+            command=self.iniciar_ejecucion,
             bg='#4CAF50',
             fg='white',
             font=('Arial', 10, 'bold'),
@@ -98,6 +129,11 @@ class DashboardGUI:
         )
         btn_cambiar.grid(row=1, column=2, padx=10, pady=5)
         
+        # Boton para volver a leer el directorio de modelos
+        btn_actualizar = tk.Button(frame_control, text="Actualizar", command=self.actualizar_modelos,
+                                   font=('Arial', 9))
+        btn_actualizar.grid(row=1, column=3, padx=5, pady=5)
+        
         # TTL info
         ttl_segundos = MODELO_TTL / 1000
         tk.Label(frame_control, 
@@ -105,8 +141,87 @@ class DashboardGUI:
                 font=('Arial', 9),
                 fg='gray').grid(row=2, column=1, padx=10, pady=5, sticky=tk.W)
         
+        # Perfil de durabilidad con el que se ejecutara el modelo
+        self.combo_perfil = ttk.Combobox(frame_control, width=16, state='readonly',
+                                         values=list(PERFILES))
+        self.combo_perfil.set(PERFIL_DURABILIDAD)
+        self.combo_perfil.grid(row=2, column=2, padx=10, pady=5)
+        
+        # Peso y prioridad de la ejecucion frente a las demas
+        tk.Label(frame_control, text="Peso / Prioridad:", font=('Arial', 10)).grid(
+            row=3, column=0, padx=10, pady=5, sticky=tk.W
+        )
+        frame_planificacion = tk.Frame(frame_control)
+        frame_planificacion.grid(row=3, column=1, padx=10, pady=5, sticky=tk.W)
+        
+        self.spin_peso = tk.Spinbox(frame_planificacion, from_=0.1, to=100, increment=0.5, width=6)
+        self.spin_peso.delete(0, tk.END)
+        self.spin_peso.insert(0, '1')
+        self.spin_peso.pack(side=tk.LEFT)
+        
+        self.spin_prioridad = tk.Spinbox(frame_planificacion, from_=0, to=10, width=4)
+        self.spin_prioridad.pack(side=tk.LEFT, padx=5)
+        
+        # Modo: montecarlo, sensibilidad (indices de Sobol) o barrido de parametros
+        self.combo_modo = ttk.Combobox(frame_planificacion, width=12, state='readonly',
+                                       values=['montecarlo', 'sensibilidad', 'barrido'])
+        self.combo_modo.current(0)
+        self.combo_modo.pack(side=tk.LEFT, padx=5)
+        
+        # Perfilado bajo demanda del productor o de un worker
+        tk.Label(frame_control, text="Perfilar:", font=('Arial', 10)).grid(
+            row=4, column=0, padx=10, pady=5, sticky=tk.W
+        )
+        frame_perfil = tk.Frame(frame_control)
+        frame_perfil.grid(row=4, column=1, padx=10, pady=5, sticky=tk.W)
+        
+        self.combo_perfil_destino = ttk.Combobox(frame_perfil, width=10, state='readonly',
+                                                 values=['productor', 'worker'])
+        self.combo_perfil_destino.current(0)
+        self.combo_perfil_destino.pack(side=tk.LEFT)
+        
+        tk.Label(frame_perfil, text="ID:", font=('Arial', 9)).pack(side=tk.LEFT, padx=(5, 0))
+        self.entry_perfil_worker = tk.Entry(frame_perfil, width=6)
+        self.entry_perfil_worker.insert(0, 'todos')
+        self.entry_perfil_worker.pack(side=tk.LEFT)
+        
+        self.combo_perfil_modo = ttk.Combobox(frame_perfil, width=9, state='readonly',
+                                              values=['cprofile', 'muestreo'])
+        self.combo_perfil_modo.current(0)
+        self.combo_perfil_modo.pack(side=tk.LEFT, padx=5)
+        
+        self.spin_perfil_segundos = tk.Spinbox(frame_perfil, from_=1, to=600, width=4)
+        self.spin_perfil_segundos.delete(0, tk.END)
+        self.spin_perfil_segundos.insert(0, '10')
+        self.spin_perfil_segundos.pack(side=tk.LEFT)
+        tk.Label(frame_perfil, text="s", font=('Arial', 9)).pack(side=tk.LEFT)
+        
+        btn_perfilar = tk.Button(frame_control, text="Perfilar", command=self.perfilar,
+                                 font=('Arial', 10), padx=20)
+        btn_perfilar.grid(row=4, column=2, padx=10, pady=5)
+        
+        # Variantes: otros modelos evaluados sobre los mismos escenarios (archivos separados por coma)
+        tk.Label(frame_control, text="Variantes:", font=('Arial', 10)).grid(
+            row=5, column=0, padx=10, pady=5, sticky=tk.W
+        )
+        self.entry_variantes = tk.Entry(frame_control, width=40)
+        self.entry_variantes.grid(row=5, column=1, columnspan=2, padx=10, pady=5, sticky=tk.W)
+        
+        # Grabar los escenarios de la ejecucion en una bitacora (para repetirla con 'Replay')
+        self.var_grabar = tk.BooleanVar(value=GRABAR_ESCENARIOS)
+        tk.Checkbutton(frame_control, text="Grabar", variable=self.var_grabar).grid(
+            row=5, column=3, padx=5, pady=5, sticky=tk.W
+        )
+        
+        # Ejes del barrido (modo barrido): "velocidad.mean=60:120:4; precio.std=5,10,30"
+        tk.Label(frame_control, text="Ejes (barrido):", font=('Arial', 10)).grid(
+            row=6, column=0, padx=10, pady=5, sticky=tk.W
+        )
+        self.entry_ejes = tk.Entry(frame_control, width=40)
+        self.entry_ejes.grid(row=6, column=1, columnspan=2, padx=10, pady=5, sticky=tk.W)
+        
         # FRAME MEDIO: Estadisticas Globales
-        frame_stats = tk.LabelFrame(self.root, text="Estadísticas Globales", 
+        frame_stats = tk.LabelFrame(self.root, text="Estadísticas de la Ejecución", 
                                     font=('Arial', 12, 'bold'))
         frame_stats.pack(fill=tk.X, padx=10, pady=10)
         
@@ -131,6 +246,72 @@ class DashboardGUI:
                                    font=('Arial', 10))
         self.lbl_tiempo.grid(row=0, column=2, padx=20, pady=5)
         
+        # Contabilidad por (run_id, seq): reentregas descartadas y escenarios sin resultado
+        self.lbl_duplicados = tk.Label(frame_stats, text="Duplicados: 0 | Faltantes: 0",
+                                       font=('Arial', 10))
+        self.lbl_duplicados.grid(row=2, column=0, columnspan=2, padx=20, pady=5, sticky=tk.W)
+        
+        # Muestreo por importancia / estratificado: estimaciones ponderadas y tamano efectivo
+        self.lbl_ponderado = tk.Label(frame_stats, text="", font=('Arial', 10))
+        self.lbl_ponderado.grid(row=3, column=0, columnspan=3, padx=20, pady=5, sticky=tk.W)
+        
+        # FRAME MEDIO: Indices de Sobol (solo ejecuciones en modo sensibilidad)
+        frame_sobol = tk.LabelFrame(self.root, text="Sensibilidad (Índices de Sobol)",
+                                    font=('Arial', 12, 'bold'))
+        frame_sobol.pack(fill=tk.X, padx=10, pady=10)
+        
+        self.tree_sobol = ttk.Treeview(
+            frame_sobol,
+            columns=('variable', 's1', 's1_ic', 'st', 'st_ic'),
+            show='headings',
+            height=4
+        )
+        self.tree_sobol.heading('variable', text='Variable')
+        self.tree_sobol.heading('s1', text='Primer Orden (S1)')
+        self.tree_sobol.heading('s1_ic', text=f'IC {int(SOBOL_CONFIANZA * 100)}% S1')
+        self.tree_sobol.heading('st', text='Total (ST)')
+        self.tree_sobol.heading('st_ic', text=f'IC {int(SOBOL_CONFIANZA * 100)}% ST')
+        for columna in ('variable', 's1', 's1_ic', 'st', 'st_ic'):
+            self.tree_sobol.column(columna, width=160, anchor=tk.CENTER)
+        self.tree_sobol.pack(fill=tk.X, padx=5, pady=5)
+        
+        # FRAME MEDIO: Salidas adicionales comparadas en pares contra la principal
+        frame_salidas = tk.LabelFrame(self.root, text="Salidas (mismos escenarios que la principal)",
+                                      font=('Arial', 12, 'bold'))
+        frame_salidas.pack(fill=tk.X, padx=10, pady=10)
+        
+        columnas_salidas = ('salida', 'media', 'desv', 'diferencia', 'diferencia_ic', 'prob_mayor', 'reduccion')
+        self.tree_salidas = ttk.Treeview(frame_salidas, columns=columnas_salidas, show='headings', height=3)
+        self.tree_salidas.heading('salida', text='Salida')
+        self.tree_salidas.heading('media', text='Media')
+        self.tree_salidas.heading('desv', text='Desv')
+        self.tree_salidas.heading('diferencia', text='Dif. vs principal')
+        self.tree_salidas.heading('diferencia_ic', text=f'IC {int(CONFIANZA_SALIDAS * 100)}% dif.')
+        self.tree_salidas.heading('prob_mayor', text='P(mayor)')
+        self.tree_salidas.heading('reduccion', text='Reducción var.')
+        for columna in columnas_salidas:
+            self.tree_salidas.column(columna, width=114, anchor=tk.CENTER)
+        self.tree_salidas.pack(fill=tk.X, padx=5, pady=5)
+        
+        # FRAME MEDIO: Puntos del barrido comparados en pares contra el primer punto
+        frame_barrido = tk.LabelFrame(self.root, text="Barrido (mismos escenarios base en cada punto)",
+                                      font=('Arial', 12, 'bold'))
+        frame_barrido.pack(fill=tk.X, padx=10, pady=10)
+        
+        columnas_barrido = ('punto', 'media', 'media_ic', 'diferencia', 'diferencia_ic', 'reduccion', 'total')
+        self.tree_barrido = ttk.Treeview(frame_barrido, columns=columnas_barrido, show='headings', height=4)
+        self.tree_barrido.heading('punto', text='Punto')
+        self.tree_barrido.heading('media', text='Media')
+        self.tree_barrido.heading('media_ic', text=f'IC {int(CONFIANZA_SALIDAS * 100)}% media')
+        self.tree_barrido.heading('diferencia', text='Dif. vs primer punto')
+        self.tree_barrido.heading('diferencia_ic', text=f'IC {int(CONFIANZA_SALIDAS * 100)}% dif.')
+        self.tree_barrido.heading('reduccion', text='Reducción var.')
+        self.tree_barrido.heading('total', text='Escenarios')
+        for columna in columnas_barrido:
+            self.tree_barrido.column(columna, width=110, anchor=tk.CENTER)
+        self.tree_barrido.column('punto', width=220, anchor=tk.W)
+        self.tree_barrido.pack(fill=tk.X, padx=5, pady=5)
+        
         # FRAME INFERIOR: Workers
         frame_workers = tk.LabelFrame(self.root, text="Estadísticas por Worker", 
                                      font=('Arial', 12, 'bold'))
@@ -139,7 +320,7 @@ class DashboardGUI:
         # Tabla de workers
         self.tree_workers = ttk.Treeview(
             frame_workers,
-            columns=('worker', 'procesados', 'porcentaje', 'ultimo'),
+            columns=('worker', 'procesados', 'porcentaje', 'tasa', 'estado', 'ultimo'),
             show='headings',
             height=6  # 6 workers visibles
         )
@@ -147,12 +328,16 @@ class DashboardGUI:
         self.tree_workers.heading('worker', text='Worker ID')
         self.tree_workers.heading('procesados', text='Procesados')
         self.tree_workers.heading('porcentaje', text='Porcentaje')
+        self.tree_workers.heading('tasa', text='Esc/s (EWMA)')
+        self.tree_workers.heading('estado', text='Estado')
         self.tree_workers.heading('ultimo', text='Último Resultado')
         
-        self.tree_workers.column('worker', width=100, anchor=tk.CENTER)
-        self.tree_workers.column('procesados', width=150, anchor=tk.CENTER)
-        self.tree_workers.column('porcentaje', width=400, anchor=tk.W)
-        self.tree_workers.column('ultimo', width=150, anchor=tk.CENTER)
+        self.tree_workers.column('worker', width=90, anchor=tk.CENTER)
+        self.tree_workers.column('procesados', width=100, anchor=tk.CENTER)
+        self.tree_workers.column('porcentaje', width=250, anchor=tk.W)
+        self.tree_workers.column('tasa', width=110, anchor=tk.CENTER)
+        self.tree_workers.column('estado', width=130, anchor=tk.CENTER)
+        self.tree_workers.column('ultimo', width=120, anchor=tk.CENTER)
         
         self.tree_workers.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
@@ -183,27 +368,45 @@ class DashboardGUI:
         
         # Mensaje inicial
         self.agregar_log("Dashboard iniciado")
-        self.agregar_log("Esperando resultados o cambia el modelo manualmente...")
+        self.agregar_log("Esperando resultados o inicia una ejecución...")
     
     # Conectar con RabbitMQ
     def conectar(self):
+        # La topologia se vuelve a declarar en cada (re)conexion
+        self.gestor.agregar_topologia(self.declarar_topologia)
         try:
-            creds = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
-            params = pika.ConnectionParameters(host=RABBIT_HOST, credentials=creds)
-            self.connection = pika.BlockingConnection(params)
-            self.channel = self.connection.channel()
-            
-            self.channel.queue_declare(queue=QUEUE_COMANDOS, durable=True) # Enviamos comandos del dashboard
-            self.channel.queue_declare(queue=QUEUE_RESULTADOS, durable=True) # Consumimos resultados
-            
+            # Un solo intento: si no hay broker se avisa en la interfaz
+            self.gestor.conexion(intentos=1)
             self.agregar_log("[EXITO] Conectado a RabbitMQ")
         except Exception as e:
             self.agregar_log(f"[ERROR] Error de conexión: {e}")
             messagebox.showerror("Error de Conexión", 
                                f"No se pudo conectar a RabbitMQ:\n{e}")
     
-    # Envia comando a la cola de comandos para cambiar de modelo
-    def cambiar_modelo(self):
+    # Declara las colas que usa el dashboard
+    def declarar_topologia(self, channel):
+        channel.queue_declare(queue=QUEUE_COMANDOS, durable=True) # Enviamos comandos del dashboard
+        for perfil in PERFILES: # Consumimos resultados de todos los perfiles y shards
+            for cola in colas_resultados(perfil):
+                declarar_cola(channel, cola, perfil)
+        # Latidos de los workers: solo interesan los recientes
+        channel.exchange_declare(exchange=EXCHANGE_LATIDOS, exchange_type='fanout')
+        channel.queue_declare(queue=self.cola_latidos, auto_delete=True,
+                              arguments={'x-message-ttl': LATIDO_INTERVALO * 1000})
+        channel.queue_bind(queue=self.cola_latidos, exchange=EXCHANGE_LATIDOS)
+    
+    # Publica un comando en la cola de comandos (pocos reintentos para no congelar la interfaz)
+    def enviar_comando(self, comando):
+        self.gestor.publicar(
+            routing_key=QUEUE_COMANDOS,
+            body=json.dumps(comando).encode('utf-8'),
+            properties=pika.BasicProperties(delivery_mode=2),
+            intentos=3
+        )
+    
+    # Envia comando a la cola de comandos para iniciar una ejecucion del modelo
+    # Las ejecuciones que ya estan corriendo no se detienen
+    def iniciar_ejecucion(self):
         # Si no hay modelos disponibles
         if not self.modelos_disponibles:
             messagebox.showwarning("Sin Modelos", 
@@ -217,15 +420,37 @@ class DashboardGUI:
                                  "Selecciona un modelo primero")
             return
         
+        try:
+            peso = float(self.spin_peso.get())
+            prioridad = int(self.spin_prioridad.get())
+        except ValueError:
+            messagebox.showwarning("Ejecución", "Peso o prioridad inválidos")
+            return
+        
         modelo_info = self.modelos_disponibles[seleccion] # Del modelo que elegimos
         archivo = modelo_info['archivo'] # Extraemos su nombre de archivo
-        #nombre = modelo_info['nombre']
+        perfil = self.combo_perfil.get() or PERFIL_DURABILIDAD # Perfil de durabilidad
+        modo = self.combo_modo.get() or 'montecarlo' # montecarlo o sensibilidad
+        variantes = [v.strip() for v in self.entry_variantes.get().split(',') if v.strip()]
+        run_id = uuid.uuid4().hex[:8] # Lo generamos aqui para seguir sus resultados
+        ejes = None
+        if modo == 'barrido':
+            try:
+                ejes = leer_ejes(self.entry_ejes.get())
+            except ValueError as e:
+                messagebox.showwarning("Barrido", str(e))
+                return
+            if not ejes:
+                messagebox.showwarning("Barrido", "Escribe los ejes del barrido (p. ej. velocidad.mean=60:120:4)")
+                return
         
         # Confirmar
         respuesta = messagebox.askyesno(
-            "Cambiar Modelo",
-            f"¿Cambiar al modelo:\n\n({archivo})?\n\n"
-            f"Esto detendrá la generación actual y purgará escenarios pendientes."
+            "Iniciar Ejecución",
+            f"¿Iniciar una ejecución del modelo:\n\n({archivo})?\n\nPerfil: {perfil}\n"
+            f"Peso: {peso}  Prioridad: {prioridad}  Modo: {modo}\n"
+            f"Variantes: {', '.join(variantes) or '-'}\n\n"
+            f"Las ejecuciones activas seguirán corriendo."
         )
         
         if not respuesta:
@@ -233,36 +458,119 @@ class DashboardGUI:
         
         # Enviar comando
         comando = {
-            'comando': 'cambiar_modelo',
+            'comando': 'iniciar_ejecucion',
             'modelo': archivo,
+            'hash': modelo_info['hash'],
+            'perfil': perfil,
+            'peso': peso,
+            'prioridad': prioridad,
+            'modo': modo,
+            'variantes': variantes,
+            'grabar': self.var_grabar.get(),
+            'run_id': run_id,
             'timestamp': time.time()
         }
+        if ejes is not None: # Barrido: toda la reticula es una sola ejecucion
+            comando.update(comando='barrido', ejes=ejes)
         # Se publica en la cola de comandos
         try:
-            body = json.dumps(comando)
-            self.channel.basic_publish(
-                exchange='',
-                routing_key=QUEUE_COMANDOS,
-                body=body.encode('utf-8'),
-                properties=pika.BasicProperties(delivery_mode=2)
-            )
+            self.enviar_comando(comando)
             
-            self.agregar_log(f"[INFORMACION] Comando enviado: Cambiar a '{archivo}'")
+            self.agregar_log(f"[INFORMACION] Comando enviado: Iniciar '{archivo}' (run {run_id})")
             self.agregar_log(f"  Esperando confirmación desde productor...")
             
-            # Actualizar UI inmediatamente
-            self.modelo_actual.set(f"{archivo} (cargando...)")
-            
-            # Reiniciar estadísticas
-            self.total_resultados = 0
-            self.resultados = []
-            self.workers_stats = {}
-            self.tiempo_inicio = None
+            # La ejecucion aparece en el selector antes de su primer resultado
+            with self.lock_ejecuciones:
+                self.ejecuciones[run_id] = EstadisticasEjecucion(run_id, archivo)
+            self.combo_ejecuciones.set(self.texto_ejecucion(self.ejecuciones[run_id]))
             
         except Exception as e:
             self.agregar_log(f"[ERROR] Error al enviar comando: {e}")
             messagebox.showerror("Error", f"Error al enviar comando:\n{e}")
     
+    # Envia comando 'replay': los escenarios grabados de la ejecucion seleccionada se evaluan
+    # otra vez (con el modelo seleccionado, que puede ser una version corregida)
+    def replay(self):
+        origen = self.run_id_seleccionado()
+        seleccion = self.combo_modelos.current()
+        if origen is None or seleccion < 0:
+            messagebox.showwarning("Selección", "Selecciona una ejecución grabada y un modelo")
+            return
+        
+        modelo_info = self.modelos_disponibles[seleccion]
+        archivo = modelo_info['archivo']
+        variantes = [v.strip() for v in self.entry_variantes.get().split(',') if v.strip()]
+        run_id = uuid.uuid4().hex[:8]
+        if not messagebox.askyesno("Replay",
+                                   f"¿Repetir los escenarios de la ejecución {origen}\n"
+                                   f"con el modelo ({archivo})?\n\n"
+                                   f"Variantes: {', '.join(variantes) or '-'}"):
+            return
+        
+        try:
+            self.enviar_comando({'comando': 'replay', 'origen': origen, 'modelo': archivo,
+                                 'hash': modelo_info['hash'], 'variantes': variantes,
+                                 'run_id': run_id, 'timestamp': time.time()})
+            self.agregar_log(f"[INFORMACION] Comando enviado: Replay de {origen} con '{archivo}' (run {run_id})")
+            with self.lock_ejecuciones:
+                self.ejecuciones[run_id] = EstadisticasEjecucion(run_id, f"{archivo} (replay {origen})")
+            self.combo_ejecuciones.set(self.texto_ejecucion(self.ejecuciones[run_id]))
+        except Exception as e:
+            self.agregar_log(f"[ERROR] Error al enviar comando: {e}")
+    
+    # Envia comando para detener la ejecucion seleccionada
+    def detener_ejecucion(self):
+        run_id = self.run_id_seleccionado()
+        if run_id is None:
+            messagebox.showwarning("Selección", "Selecciona una ejecución primero")
+            return
+        
+        if not messagebox.askyesno("Detener Ejecución",
+                                   f"¿Detener la ejecución {run_id}?\n\n"
+                                   f"Sus escenarios pendientes se descartarán."):
+            return
+        
+        try:
+            self.enviar_comando({'comando': 'detener_ejecucion', 'run_id': run_id,
+                                 'timestamp': time.time()})
+            self.agregar_log(f"[INFORMACION] Comando enviado: Detener ejecución {run_id}")
+        except Exception as e:
+            self.agregar_log(f"[ERROR] Error al enviar comando: {e}")
+    
+    # Texto de una ejecucion en el selector
+    def texto_ejecucion(self, stats):
+        return f"{stats.run_id} - {stats.modelo}"
+    
+    # run_id de la ejecucion seleccionada (o None)
+    def run_id_seleccionado(self):
+        texto = self.combo_ejecuciones.get()
+        return texto.split(' - ')[0] if texto else None
+    
+    # Envia comando 'perfilar' al productor (que lo reenvia a workers si aplica)
+    def perfilar(self):
+        try:
+            segundos = float(self.spin_perfil_segundos.get())
+        except ValueError:
+            messagebox.showwarning("Perfilado", "Duración inválida")
+            return
+        
+        comando = {
+            'comando': 'perfilar',
+            'destino': self.combo_perfil_destino.get(),
+            'worker_id': self.entry_perfil_worker.get().strip() or 'todos',
+            'modo': self.combo_perfil_modo.get(),
+            'segundos': segundos,
+            'timestamp': time.time()
+        }
+        try:
+            self.enviar_comando(comando)
+            destino = comando['destino']
+            if destino == 'worker':
+                destino = f"worker {comando['worker_id']}"
+            self.agregar_log(f"[INFORMACION] Perfilado '{comando['modo']}' solicitado en {destino} ({segundos}s)")
+        except Exception as e:
+            self.agregar_log(f"[ERROR] Error al enviar comando: {e}")
+    
     # Iniciamos hilo para escuchar resultados
     def iniciar_escucha(self):
         self.escuchando = True
@@ -272,15 +580,7 @@ class DashboardGUI:
     # Escucha cola de resultados
     def escuchar_resultados(self):
         try:
-            # Crear conexión separada para este hilo
-            creds = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
-            params = pika.ConnectionParameters(host=RABBIT_HOST, credentials=creds)
-            connection = pika.BlockingConnection(params)
-            channel = connection.channel()
-            
-            channel.queue_declare(queue=QUEUE_RESULTADOS, durable=True) # RESULTADOS vamos a escuchar
-            channel.basic_qos(prefetch_count=50) # Si podemos consumir varios
-            
+            # El gestor crea una conexión separada para este hilo
             def callback(ch, method, props, body):
                 try:
                     data = json.loads(body.decode('utf-8')) # Cargamos resultado
@@ -290,115 +590,223 @@ class DashboardGUI:
                     print(f"Error procesando resultado: {e}")
                     ch.basic_ack(delivery_tag=method.delivery_tag)
             
-            channel.basic_consume(
-                queue=QUEUE_RESULTADOS,
-                on_message_callback=callback,
-                auto_ack=False
-            )
+            # RESULTADOS vamos a escuchar (todos los perfiles y shards). Si podemos consumir varios
+            # Los shards se mezclan aqui: todos llegan al mismo callback
+            for perfil in PERFILES:
+                for cola in colas_resultados(perfil):
+                    self.gestor.consumir(cola, callback, prefetch=50)
+            
+            # Latidos de los workers (sin ack: si se pierde uno llega otro)
+            def callback_latido(ch, method, props, body):
+                try:
+                    latido = json.loads(body.decode('utf-8'))
+                    with self.lock_ejecuciones:
+                        self.monitor.registrar_latido(latido)
+                except Exception as e:
+                    print(f"Error procesando latido: {e}")
+            self.gestor.consumir(self.cola_latidos, callback_latido, prefetch=0, auto_ack=True)
             
-            channel.start_consuming()
+            # Reconecta y vuelve a registrar los consumidores si se cae la conexion
+            self.gestor.iniciar_consumo()
             
         except Exception as e:
             print(f"Error en escucha de resultados: {e}")
     
     # Procesa un resultado recibido
+    # Cada resultado se acumula en las estadisticas de su ejecucion (run_id)
     def procesar_resultado(self, data):
-        # DETECTAR CAMBIO DE MODELO y reiniciar estadísticas
-        modelo_nombre = data.get('modelo', 'Desconocido') # Vemos el modelo del resultado recibido
-        
-        # Si es diferente el modelo seleccionado que el modelo del resultado de la cola
-        if self.modelo_actual.get() != modelo_nombre and modelo_nombre != 'Desconocido':
-            # Cambio de modelo detectado
-            print(f"\n[ADVERTENCIA] Cambio de modelo detectado: {self.modelo_actual.get()} -> {modelo_nombre}")
-            self.modelo_actual.set(modelo_nombre) # Actualizamos el modelo actual
-            
-            # REINICIAR todas las estadisticas
-            self.total_resultados = 0
-            self.resultados = []
-            self.workers_stats = {}
-            self.tiempo_inicio = None
-            self.ultimo_resultado_tiempo = None
-            
-            self.agregar_log(f"[EXITO] Modelo cambiado: {modelo_nombre}")
-            self.agregar_log(f"  Estadísticas reiniciadas")
-            print(f"[EXITO] Estadísticas reiniciadas para nuevo modelo\n")
-        
-        # Procesar resultado normalmente
-        self.total_resultados += 1
-        self.resultados.append(data['resultado']) # Agregamos el resultado a la lista de resultados (local)
-        self.ultimo_resultado_tiempo = time.time() # Registramos tiempo del ultimo resultado
-        
-        # Actualizar stats por worker
+        run_id = data.get('run_id', 'sin_run')
         worker_id = data.get('worker_id', 'desconocido') # Obtener id del worker
-        if worker_id not in self.workers_stats: # Si es nuevo, se registra en el diccionario de workers
-            self.workers_stats[worker_id] = {
-                'procesados': 0,
-                'ultimo_resultado': 0
-            }
-        
-        self.workers_stats[worker_id]['procesados'] += 1 # Aumentamos contador de resultado procesado de cierto worker
-        self.workers_stats[worker_id]['ultimo_resultado'] = data['resultado'] # Guardamos ultimo resultado
-        
-        # Iniciar tiempo si es el primer resultado
-        if self.tiempo_inicio is None:
-            self.tiempo_inicio = time.time()
+        
+        with self.lock_ejecuciones:
+            stats = self.ejecuciones.get(run_id)
+            if stats is None: # Ejecucion iniciada desde otro dashboard o antes de abrir este
+                stats = EstadisticasEjecucion(run_id, data.get('modelo', 'Desconocido'))
+                self.ejecuciones[run_id] = stats
+            elif stats.modelo != data.get('modelo', stats.modelo):
+                stats.modelo = data['modelo'] # Nombre real del modelo (el dashboard solo conoce el archivo)
+            if 'sobol' in data: # Lote de sensibilidad
+                stats.agregar_sobol(data['sobol'], worker_id, data.get('seq'))
+            elif 'barrido' in data: # Escenarios base evaluados en los puntos del barrido
+                stats.agregar_barrido(data['barrido'], worker_id, data.get('seq'))
+            else:
+                # Un mensaje puede traer los resultados de varios escenarios
+                for r in expandir_resultado(data):
+                    stats.agregar(r['resultado'], worker_id, r.get('seq'), r.get('salidas'),
+                                  r.get('peso'), r.get('estrato'), r.get('evento'))
+                for seq in seqs_fallidos(data):
+                    stats.registrar_fallido(seq)
     
     # Actualiza la interfaz cada cierto tiempo
     def actualizar_ui(self):
-        # Actualizar estadisticas globales
-        if self.resultados:
-            import numpy as np
-            media = np.mean(self.resultados) # Media de los resultados
-            desv = np.std(self.resultados) # Desviacion de los resultados
-            minimo = np.min(self.resultados) # Minimo de los resultados
-            maximo = np.max(self.resultados) # Maximo de los resultados
-            # Lo colocamos en la interfaz
-            self.lbl_media.config(text=f"Media: {media:.4f}")
-            self.lbl_desv.config(text=f"Desv: {desv:.4f}")
-            self.lbl_min.config(text=f"Min: {minimo:.4f}")
-            self.lbl_max.config(text=f"Max: {maximo:.4f}")
-        
-        self.lbl_total.config(text=f"Total Resultados: {self.total_resultados}") # Se muestra el total de resultados
+        with self.lock_ejecuciones:
+            ejecuciones = list(self.ejecuciones.values())
+        
+        # Selector de ejecuciones (si no hay ninguna seleccionada se muestra la mas reciente)
+        textos = [self.texto_ejecucion(e) for e in ejecuciones]
+        self.combo_ejecuciones['values'] = textos
+        run_id = self.run_id_seleccionado()
+        if ejecuciones and run_id not in self.ejecuciones:
+            self.combo_ejecuciones.set(textos[-1])
+            run_id = ejecuciones[-1].run_id
+        elif run_id is not None:
+            # El nombre del modelo pudo cambiar con el primer resultado
+            self.combo_ejecuciones.set(self.texto_ejecucion(self.ejecuciones[run_id]))
+        stats = self.ejecuciones.get(run_id) if run_id else None
+        
+        # Actualizar estadisticas de la ejecucion seleccionada
+        if stats is not None and stats.total > 0:
+            self.lbl_media.config(text=f"Media: {stats.media:.4f}")
+            self.lbl_desv.config(text=f"Desv: {stats.desviacion:.4f}")
+            self.lbl_min.config(text=f"Min: {stats.minimo:.4f}")
+            self.lbl_max.config(text=f"Max: {stats.maximo:.4f}")
+        else:
+            for lbl, nombre in ((self.lbl_media, "Media"), (self.lbl_desv, "Desv"),
+                                (self.lbl_min, "Min"), (self.lbl_max, "Max")):
+                lbl.config(text=f"{nombre}: -")
+        
+        total = stats.total if stats is not None else 0
+        self.lbl_total.config(text=f"Total Resultados: {total}") # Se muestra el total de resultados (sin duplicados)
+        if stats is not None:
+            self.lbl_duplicados.config(text=f"Duplicados: {stats.duplicados} | Faltantes: {stats.faltantes} | "
+                                            f"Fallidos: {stats.fallidos}")
+        
+        # Estimaciones ponderadas (media y probabilidad del evento con su intervalo)
+        texto_ponderado = ""
+        if stats is not None and stats.ponderado is not None:
+            with self.lock_ejecuciones:
+                resumen = stats.ponderado.resumen()
+            texto_ponderado = (f"Ponderado: media {resumen['media']:.4f} ± {resumen['media_ic']:.4f} | "
+                               f"ESS {resumen['ess']:,.0f} de {resumen['total']:,} | "
+                               f"Estratos: {resumen['estratos']}")
+            if 'prob_evento' in resumen:
+                texto_ponderado += f" | P(evento) {resumen['prob_evento']:.3e} ± {resumen['prob_ic']:.1e}"
+                if resumen['n_equivalente']:
+                    texto_ponderado += f" (≈ {resumen['n_equivalente']:,.0f} esc. sin ponderar)"
+        self.lbl_ponderado.config(text=texto_ponderado)
         
         # Actualizar tiempo
-        if self.tiempo_inicio:
-            transcurrido = int(time.time() - self.tiempo_inicio)
+        if stats is not None and stats.tiempo_inicio:
+            transcurrido = int(time.time() - stats.tiempo_inicio)
             minutos = transcurrido // 60
             segundos = transcurrido % 60
             self.lbl_tiempo.config(text=f"Tiempo: {minutos:02d}:{segundos:02d}")
-        
-        # Detectar si modelo expiro (no hay resultados en 10 segundos)
-        if self.ultimo_resultado_tiempo:
-            tiempo_sin_resultados = time.time() - self.ultimo_resultado_tiempo
-            if tiempo_sin_resultados > 10 and self.modelo_actual.get() != "Sin modelo cargado":
-                # Posible expiracion
-                self.agregar_log(" No se reciben resultados (modelo expirado)")
-                self.ultimo_resultado_tiempo = None
+        else:
+            self.lbl_tiempo.config(text="Tiempo: 00:00")
+        
+        # Detectar ejecuciones expiradas o detenidas (no hay resultados en 10 segundos)
+        for ejecucion in ejecuciones:
+            if ejecucion.ultimo_resultado_tiempo is None:
+                continue
+            sin_resultados = time.time() - ejecucion.ultimo_resultado_tiempo > 10
+            if sin_resultados and ejecucion.run_id not in self.ejecuciones_sin_resultados:
+                self.agregar_log(f" No se reciben resultados de {ejecucion.run_id} (expirada o detenida)")
+                self.ejecuciones_sin_resultados.add(ejecucion.run_id)
+            elif not sin_resultados:
+                self.ejecuciones_sin_resultados.discard(ejecucion.run_id)
+        
+        # Indices de Sobol de la ejecucion seleccionada (con sus intervalos bootstrap)
+        self.tree_sobol.delete(*self.tree_sobol.get_children())
+        if stats is not None and stats.sobol is not None:
+            with self.lock_ejecuciones:
+                indices = stats.sobol.indices()
+            for variable, valores in indices.items():
+                self.tree_sobol.insert('', tk.END, values=(
+                    variable,
+                    f"{valores['S1']:.4f}",
+                    f"[{valores['S1_ic'][0]:.3f}, {valores['S1_ic'][1]:.3f}]",
+                    f"{valores['ST']:.4f}",
+                    f"[{valores['ST_ic'][0]:.3f}, {valores['ST_ic'][1]:.3f}]"
+                ))
+        
+        # Salidas adicionales de la ejecucion seleccionada y su diferencia contra la principal
+        self.tree_salidas.delete(*self.tree_salidas.get_children())
+        if stats is not None and stats.salidas:
+            with self.lock_ejecuciones:
+                comparacion = stats.comparacion()
+            for nombre, valores in comparacion.items():
+                self.tree_salidas.insert('', tk.END, values=(
+                    nombre,
+                    f"{valores['media']:.4f}",
+                    f"{valores['desviacion']:.4f}",
+                    f"{valores['diferencia']:+.4f}",
+                    f"± {valores['diferencia_ic']:.4f}",
+                    f"{valores['prob_mayor']:.1%}",
+                    f"{valores['reduccion_varianza']:.1%}"
+                ))
+        
+        # Puntos del barrido de la ejecucion seleccionada
+        self.tree_barrido.delete(*self.tree_barrido.get_children())
+        if stats is not None and stats.barrido is not None:
+            with self.lock_ejecuciones:
+                puntos = stats.barrido.resumen()
+            for valores in puntos:
+                self.tree_barrido.insert('', tk.END, values=(
+                    etiqueta_punto(valores['punto']),
+                    f"{valores['media']:.4f}",
+                    f"± {valores['media_ic']:.4f}",
+                    f"{valores['diferencia']:+.4f}",
+                    f"± {valores['diferencia_ic']:.4f}",
+                    f"{valores['reduccion_varianza']:.1%}",
+                    valores['total']
+                ))
+        
+        # Estado de los workers segun sus latidos (los cambios se avisan en el log)
+        with self.lock_ejecuciones:
+            cambios = self.monitor.revisar()
+            latidos = {w: dict(d) for w, d in self.monitor.workers.items()}
+        for worker_id, anterior, estado in cambios:
+            if estado == 'caido':
+                self.agregar_log(f"[ERROR] Worker {worker_id} caído: sin latidos en "
+                                 f"{LATIDO_INTERVALO * LATIDOS_PERDIDOS_CAIDO}s")
+            elif estado == 'rezagado':
+                self.agregar_log(f"[ADVERTENCIA] Worker {worker_id} rezagado: "
+                                 f"{latidos[worker_id]['tasa']:.1f} esc/s")
+            else:
+                self.agregar_log(f"[INFORMACION] Worker {worker_id} activo de nuevo")
         
         # Actualizar tabla de workers (por si se sale alguno)
         self.tree_workers.delete(*self.tree_workers.get_children())
         
-        # Mostrar estadisticas de los workers
-        for worker_id in sorted(self.workers_stats.keys()):
-            stats = self.workers_stats[worker_id]
-            procesados = stats['procesados']
+        # Workers con resultados en la ejecucion seleccionada o con latidos
+        workers = dict(stats.workers) if stats is not None else {}
+        for worker_id in sorted(set(workers) | set(latidos)):
+            datos = workers.get(worker_id, {'procesados': 0, 'ultimo_resultado': None})
+            procesados = datos['procesados']
             # Porcentaje de procesados del worker respecto al total
-            porcentaje = (procesados / self.total_resultados * 100) if self.total_resultados > 0 else 0
-            ultimo = stats['ultimo_resultado']
+            porcentaje = (procesados / total * 100) if total > 0 else 0
+            ultimo = datos['ultimo_resultado']
             
             # Barra de progreso visual
-            barra_longitud = int(porcentaje / 2)  # 50 caracteres máximo
-            barra = "█" * barra_longitud + "░" * (50 - barra_longitud)
+            barra_longitud = int(porcentaje / 4)  # 25 caracteres máximo
+            barra = "█" * barra_longitud + "░" * (25 - barra_longitud)
             texto_porcentaje = f"{porcentaje:5.1f}% {barra}"
             
+            # Tasa y estado de los latidos (sin latidos: worker de una version anterior)
+            latido = latidos.get(worker_id)
+            tasa = f"{latido['tasa']:.1f}" if latido and latido['tasa'] is not None else "-"
+            if latido is None:
+                estado = "-"
+            elif latido['estado'] == 'caido':
+                estado = f"CAÍDO ({self.monitor.silencio(worker_id):.0f}s)"
+            elif latido['estado'] == 'rezagado':
+                estado = "REZAGADO"
+            else:
+                estado = f"activo (prefetch {latido['prefetch']})"
+            
             # Insertamos al worker visualmente
             self.tree_workers.insert('', tk.END, values=(
                 f"Worker {worker_id}",
                 procesados,
                 texto_porcentaje,
-                f"{ultimo:.4f}"
+                tasa,
+                estado,
+                f"{ultimo:.4f}" if ultimo is not None else "-"
             ))
         
+        # Atender heartbeats de la conexion de este hilo (publica comandos)
+        self.gestor.procesar_eventos()
+        
         # Programar siguiente actualizacion (cada segundo se actualiza)
         self.root.after(1000, self.actualizar_ui)
     
@@ -418,11 +826,7 @@ class DashboardGUI:
     # Cerrar conexion
     def cerrar(self):
         self.escuchando = False
-        if self.connection:
-            try:
-                self.connection.close()
-            except:
-                pass
+        self.gestor.cerrar()
 
 def main():
     # Para interfaz
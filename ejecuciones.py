@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# EJECUCIONES
+# Descripcion: Ejecuciones (runs) concurrentes del productor
+# Cada ejecucion tiene su propio run_id, modelo, perfil y flujo de escenarios
+# El planificador decide de que ejecucion sale el siguiente escenario:
+#   - Primero las de mayor prioridad
+#   - Entre las de igual prioridad, reparto proporcional al peso (stride scheduling), contado
+#     en escenarios (un mensaje puede llevar varios)
+# Modos de ejecucion:
+#   - montecarlo: escenarios unicos; varios por mensaje segun el costo de evaluacion que reportan
+#     los workers (cada mensaje debe tomar unos LOTE_ESCENARIOS_OBJETIVO segundos) o el 'lote' fijo
+#   - sensibilidad: lotes de Saltelli (A, B, AB_i) para los indices de Sobol
+#   - barrido: escenarios base evaluados en todos los puntos de una reticula de parametros
+#     (PlanBarrido); cada mensaje lleva los que quepan en el tamano de lote
+# Si el plan tiene propuestas o estratos (bloque 'muestreo'), los escenarios montecarlo se
+# muestrean con PlanPonderado y llevan su peso y estrato
+
+import threading
+import time
+import uuid
+from config import SOBOL_BLOQUE, LOTE_ESCENARIOS_OBJETIVO, LOTE_ESCENARIOS_MAXIMO
+from muestreo import PlanPonderado, es_ponderado
+from agregador import ewma
+
+MODOS_EJECUCION = ('montecarlo', 'sensibilidad', 'barrido')
+
+class Ejecucion:
+    def __init__(self, modelo, perfil, peso=1.0, prioridad=0, run_id=None,
+                 modo='montecarlo', bloque=SOBOL_BLOQUE, plan=None, hash=None, lote=None, barrido=None):
+        if modo not in MODOS_EJECUCION:
+            raise ValueError(f"Modo de ejecucion desconocido: {modo}")
+        self.run_id = run_id or uuid.uuid4().hex[:8] # Identificador de la ejecucion
+        self.modelo = modelo # Modelo que se simula
+        self.hash = hash # Hash del modelo en el catalogo
+        self.perfil = perfil # Perfil de durabilidad
+        self.peso = max(float(peso), 0.001) # Peso relativo frente a otras ejecuciones
+        self.prioridad = int(prioridad) # Mayor prioridad se atiende primero
+        self.escenarios_generados = set() # Para que no se repitan escenarios (por ejecucion)
+        self.lock = threading.Lock() # Varios hilos de muestreo pueden generar para la misma ejecucion
+        self.total_generados = 0 # Contador de escenarios de esta ejecucion
+        self.inicio = time.time() # Momento en que se inicio
+        self.pase = 0.0 # Avance virtual del stride scheduling
+        self.modo = modo # montecarlo, sensibilidad o barrido
+        self.bloque = max(int(bloque), 1) # Filas base por lote (modo sensibilidad)
+        self.lote = max(int(lote), 1) if lote is not None else None # Escenarios por mensaje fijos (None = automatico)
+        self.costo = None # Segundos de evaluacion por escenario (EWMA de lo que reportan los workers)
+        # Pasadas vectorizadas por escenario: un modelo de trayectoria avanza todo el lote paso a paso
+        self.pasos = modelo.get('pasos', 1) if modelo.get('tipo') == 'trayectoria' else 1
+        # Plan de muestreo [(variable, configuracion)] (el del catalogo ya viene normalizado)
+        self.plan = plan if plan is not None else list(modelo['variables'].items())
+        self.bitacora = None # EscritorBitacora si la ejecucion se graba
+        self.fuente = None # LectorBitacora si la ejecucion es un replay (no se muestrea)
+        # Muestreo por importancia / estratificado (los lotes de Saltelli usan la distribucion nominal)
+        self.ponderado = PlanPonderado(self.plan) if modo == 'montecarlo' and es_ponderado(self.plan) else None
+        self.barrido = barrido # PlanBarrido (modo barrido; None en un replay, que no muestrea)
+
+    # Costo por escenario que un worker reporta en su latido
+    def registrar_costo(self, costo):
+        if costo and costo > 0:
+            self.costo = ewma(self.costo, costo)
+
+    # Escenarios por mensaje (modos montecarlo y barrido): el fijo o los que tardan LOTE_ESCENARIOS_OBJETIVO
+    # segundos en evaluarse (por paso en los modelos de trayectoria: cada paso es una pasada sobre
+    # todo el lote). Sin mediciones todavia, uno por mensaje
+    def tamano_lote(self):
+        if self.lote is not None:
+            return min(self.lote, LOTE_ESCENARIOS_MAXIMO)
+        if self.costo is None:
+            return 1
+        return max(min(int(LOTE_ESCENARIOS_OBJETIVO * self.pasos / self.costo), LOTE_ESCENARIOS_MAXIMO), 1)
+
+    def __repr__(self):
+        return (f"Ejecucion({self.run_id}, {self.modelo.get('nombre', 'N/A')}, "
+                f"peso={self.peso}, prioridad={self.prioridad}, modo={self.modo})")
+
+class PlanificadorEjecuciones:
+    def __init__(self):
+        self.activas = {} # run_id -> Ejecucion
+        self.lock = threading.Lock() # Comandos y generacion corren en hilos distintos
+
+    # Agrega una ejecucion. Empieza en el pase minimo actual para no acaparar
+    # la generacion por llegar tarde
+    def agregar(self, ejecucion):
+        with self.lock:
+            if self.activas:
+                ejecucion.pase = min(e.pase for e in self.activas.values())
+            self.activas[ejecucion.run_id] = ejecucion
+
+    # Quita una ejecucion. Regresa la ejecucion quitada o None
+    def quitar(self, run_id):
+        with self.lock:
+            return self.activas.pop(run_id, None)
+
+    # Quita todas las ejecuciones
+    def limpiar(self):
+        with self.lock:
+            quitadas = list(self.activas.values())
+            self.activas.clear()
+            return quitadas
+
+    # Ejecucion por run_id (o None)
+    def obtener(self, run_id):
+        with self.lock:
+            return self.activas.get(run_id)
+
+    # Copia de las ejecuciones activas
+    def listar(self):
+        with self.lock:
+            return list(self.activas.values())
+
+    # Siguiente ejecucion a la que le toca generar un escenario (None si no hay)
+    def siguiente(self):
+        with self.lock:
+            if not self.activas:
+                return None
+            prioridad = max(e.prioridad for e in self.activas.values())
+            candidatas = [e for e in self.activas.values() if e.prioridad == prioridad]
+            ejecucion = min(candidatas, key=lambda e: e.pase)
+            ejecucion.pase += 1.0 / ejecucion.peso
+            return ejecucion
+
+    # Cobra a la ejecucion los escenarios de un mensaje que llevo mas de uno
+    # (siguiente() ya cobro el primero)
+    def cobrar(self, ejecucion, escenarios):
+        with self.lock:
+            ejecucion.pase += (escenarios - 1) / ejecucion.peso
+
+    def __len__(self):
+        with self.lock:
+            return len(self.activas)
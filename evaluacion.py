@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# EVALUACION DE FORMULAS
+# Descripcion: Backends para evaluar la formula de un modelo sobre lotes de escenarios
+#   - escalar: eval de la formula compilada fila por fila
+#   - numpy: la formula se traduce a operaciones sobre columnas (una pasada por operador)
+#   - numba: la formula se traduce a un ciclo fusionado compilado con Numba (sin arreglos
+#     temporales); la funcion se guarda en DIRECTORIO_CACHE_MODELOS por hash del modelo
+# Los tres parten del AST ya validado por el catalogo (solo aritmetica, comparaciones y
+# condicionales sobre las variables declaradas) y dan el mismo resultado que eval
+# Un modelo con varias salidas (principal + 'salidas') las evalua todas en la misma pasada:
+# cada escenario da un valor por salida
+# Si Numba no esta instalado (o no compila la formula) se usa numpy
+# Los modelos de trayectoria se simulan siempre con numpy (EvaluadorTrayectoria): todas las
+# trayectorias del lote avanzan juntas, paso por paso, y solo se guardan sus estadisticas
+
+import ast
+import importlib.util
+import sys
+import numpy as np
+from pathlib import Path
+from config import BACKEND_EVALUACION, DIRECTORIO_CACHE_MODELOS, TRAYECTORIA_BLOQUE
+from catalogo import (analizar_formula, hash_modelo, salidas_modelo, normalizar_variable,
+                      texto_formula, VARIABLE_SEMILLA)
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKENDS = ('escalar', 'numpy', 'numba')
+
+OPERADORES = {
+    ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.FloorDiv: '//',
+    ast.Mod: '%', ast.Pow: '**', ast.UAdd: '+', ast.USub: '-',
+    ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!=',
+}
+
+# Funciones auxiliares del modo vectorial (mismas reglas de verdad que Python: 0 es falso)
+AUXILIARES = {
+    '_si': lambda condicion, si, no: np.where(condicion, si, no),
+    '_y': lambda a, b: np.where(a, b, a),
+    '_o': lambda a, b: np.where(a, a, b),
+    '_no': np.logical_not,
+}
+
+advertencias_emitidas = set() # Avisos de respaldo ya impresos (uno por proceso)
+
+# Traduce un nodo del AST validado a codigo fuente
+# nombres: variable del modelo -> nombre en el codigo generado
+# vectorial: True usa funciones de numpy para condicionales y operadores logicos
+def traducir(nodo, nombres, vectorial):
+    def t(n):
+        return traducir(n, nombres, vectorial)
+
+    if isinstance(nodo, ast.Expression):
+        return t(nodo.body)
+    if isinstance(nodo, ast.Constant):
+        return repr(nodo.value)
+    if isinstance(nodo, ast.Name):
+        return nombres[nodo.id]
+    if isinstance(nodo, ast.BinOp):
+        return f"({t(nodo.left)} {OPERADORES[type(nodo.op)]} {t(nodo.right)})"
+    if isinstance(nodo, ast.UnaryOp):
+        if isinstance(nodo.op, ast.Not):
+            return f"_no({t(nodo.operand)})" if vectorial else f"(not {t(nodo.operand)})"
+        return f"({OPERADORES[type(nodo.op)]}{t(nodo.operand)})"
+    if isinstance(nodo, ast.Compare):
+        operandos = [t(nodo.left)] + [t(n) for n in nodo.comparators]
+        partes = [f"({operandos[i]} {OPERADORES[type(op)]} {operandos[i + 1]})"
+                  for i, op in enumerate(nodo.ops)]
+        if vectorial:
+            resultado = partes[0]
+            for parte in partes[1:]:
+                resultado = f"_y({resultado}, {parte})"
+            return resultado
+        return '(' + ' and '.join(partes) + ')'
+    if isinstance(nodo, ast.BoolOp):
+        valores = [t(n) for n in nodo.values]
+        if vectorial:
+            funcion = '_y' if isinstance(nodo.op, ast.And) else '_o'
+            resultado = valores[0]
+            for valor in valores[1:]:
+                resultado = f"{funcion}({resultado}, {valor})"
+            return resultado
+        union = ' and ' if isinstance(nodo.op, ast.And) else ' or '
+        return '(' + union.join(valores) + ')'
+    if isinstance(nodo, ast.IfExp):
+        if vectorial:
+            return f"_si({t(nodo.test)}, {t(nodo.body)}, {t(nodo.orelse)})"
+        return f"({t(nodo.body)} if {t(nodo.test)} else {t(nodo.orelse)})"
+    raise ValueError(f"Nodo no soportado: {type(nodo).__name__}")
+
+# Evalua fila por fila con eval (referencia para los demas backends)
+class EvaluadorEscalar:
+    backend = 'escalar'
+
+    def __init__(self, modelo):
+        self.variables = list(modelo['variables']) # Orden de las columnas
+        self.salidas = [nombre for nombre, _ in salidas_modelo(modelo)] # La principal primero
+        self.arboles = [analizar_formula(formula, modelo['variables'])[0]
+                        for _, formula in salidas_modelo(modelo)]
+        self.codigos = [compile(arbol, '<formula>', 'eval') for arbol in self.arboles]
+
+    # Evalua un solo escenario {variable: valor}. Regresa un valor por salida
+    def evaluar(self, escenario):
+        contexto = dict(escenario)
+        return [eval(codigo, {"__builtins__": {}}, contexto) for codigo in self.codigos]
+
+    # Evalua un lote: filas con los valores en el orden de 'nombres'
+    # Regresa arreglo float64 (filas x salidas). Los errores (division entre cero, etc.)
+    # se propagan como en eval
+    def evaluar_lote(self, nombres, filas):
+        return np.array([self.evaluar(zip(nombres, fila)) for fila in filas],
+                        dtype=np.float64).reshape(len(filas), len(self.salidas))
+
+    # Matriz (filas x variables) con las columnas en el orden del modelo
+    def matriz(self, nombres, filas):
+        matriz = np.asarray(filas, dtype=np.float64).reshape(len(filas), len(nombres))
+        if list(nombres) != self.variables:
+            matriz = matriz[:, [list(nombres).index(v) for v in self.variables]]
+        return matriz
+
+    # Los backends vectoriales no lanzan errores: si hay inf/nan se repite el lote con eval
+    # para obtener el mismo resultado (o el mismo error) que el backend escalar
+    def verificar(self, salida, nombres, filas):
+        if np.all(np.isfinite(salida)):
+            return salida
+        return EvaluadorEscalar.evaluar_lote(self, nombres, filas)
+
+# Evalua el lote por columnas con numpy (un arreglo temporal por operador)
+class EvaluadorNumpy(EvaluadorEscalar):
+    backend = 'numpy'
+
+    def __init__(self, modelo):
+        super().__init__(modelo)
+        nombres = {v: f"_c[{i}]" for i, v in enumerate(self.variables)}
+        self.codigos_vectoriales = [
+            compile(traducir(arbol, nombres, vectorial=True), '<formula numpy>', 'eval')
+            for arbol in self.arboles
+        ]
+
+    def evaluar_lote(self, nombres, filas):
+        matriz = self.matriz(nombres, filas)
+        salida = np.empty((len(matriz), len(self.salidas)), dtype=np.float64)
+        with np.errstate(all='ignore'):
+            for j, codigo in enumerate(self.codigos_vectoriales):
+                salida[:, j] = eval(codigo, {"__builtins__": {}, **AUXILIARES}, {'_c': matriz.T})
+        return self.verificar(salida, nombres, filas)
+
+# Evalua el lote en un solo ciclo compilado con Numba (sin temporales por operador)
+class EvaluadorNumba(EvaluadorNumpy):
+    backend = 'numba'
+
+    def __init__(self, modelo, cache=DIRECTORIO_CACHE_MODELOS):
+        super().__init__(modelo)
+        # Hash de lo que define el codigo generado (una ejecucion puede agregar variantes al modelo)
+        hash = hash_modelo({'variables': self.variables, 'salidas': salidas_modelo(modelo)})
+        self.funcion = self.cargar(Path(cache), hash)
+
+    # Genera el modulo de la funcion en la cache y lo importa. Numba guarda el codigo maquina
+    # junto al archivo (cache=True): otro proceso con el mismo modelo no vuelve a compilar
+    def cargar(self, cache, hash):
+        nombres = {v: f"_v{i}" for i, v in enumerate(self.variables)}
+        lineas = [
+            "# Generado por evaluacion.py, no editar",
+            "from numba import njit",
+            "",
+            "@njit(cache=True, error_model='numpy')",
+            "def evaluar(_x, _salida):",
+            "    for _i in range(_x.shape[0]):",
+        ]
+        lineas += [f"        {nombres[v]} = _x[_i, {i}]" for i, v in enumerate(self.variables)]
+        lineas += [f"        _salida[_i, {j}] = {traducir(arbol, nombres, vectorial=False)}"
+                   for j, arbol in enumerate(self.arboles)]
+        fuente = '\n'.join(lineas) + '\n'
+
+        cache.mkdir(parents=True, exist_ok=True)
+        ruta = cache / f"numba_{hash}.py"
+        if not ruta.exists() or ruta.read_text(encoding='utf-8') != fuente:
+            temporal = ruta.with_suffix('.tmp')
+            temporal.write_text(fuente, encoding='utf-8')
+            temporal.replace(ruta)
+
+        nombre_modulo = f"modelo_numba_{hash}"
+        spec = importlib.util.spec_from_file_location(nombre_modulo, ruta)
+        modulo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modulo)
+        sys.modules[nombre_modulo] = modulo
+        # Compila (o lee de la cache) ahora y no con el primer lote
+        modulo.evaluar(np.zeros((1, len(self.variables))), np.zeros((1, len(self.salidas))))
+        return modulo.evaluar
+
+    def evaluar_lote(self, nombres, filas):
+        matriz = np.ascontiguousarray(self.matriz(nombres, filas))
+        salida = np.empty((len(matriz), len(self.salidas)), dtype=np.float64)
+        self.funcion(matriz, salida)
+        return self.verificar(salida, nombres, filas)
+
+# Generador por contador (splitmix64): el valor k de la semilla s es mezclar(s + k * DORADO)
+# No guarda estado: cualquier aleatorio de cualquier trayectoria se calcula directo, para todas
+# las trayectorias del bloque a la vez (la aritmetica uint64 de numpy da la vuelta en 2^64)
+DORADO = 0x9E3779B97F4A7C15
+MASCARA_64 = 2 ** 64 - 1
+
+def mezclar(x):
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+# Uniformes en (0, 1) del contador k para cada clave (una por trayectoria)
+def uniformes(claves, k):
+    x = mezclar(claves + np.uint64(k * DORADO & MASCARA_64))
+    return ((x >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53
+
+# Aleatorio de un paso con la distribucion dada (usa los contadores k y k + 1)
+# A diferencia de las variables del escenario, no se reflejan los negativos
+def sortear_paso(config, claves, k):
+    params = config['parametros']
+    u = uniformes(claves, k)
+    if config['distribucion'] == 'normal': # Box-Muller
+        z = np.sqrt(-2.0 * np.log(u)) * np.cos(2.0 * np.pi * uniformes(claves, k + 1))
+        return params['mean'] + params['std'] * z
+    if config['distribucion'] == 'exponential':
+        return -params['scale'] * np.log(u)
+    return params['min'] + (params['max'] - params['min']) * u
+
+# Estadistica de un estado acumulada paso a paso (sin guardar la trayectoria)
+class EstadisticaTrayectoria:
+    def __init__(self, tipo, umbral, inicial, dt):
+        self.tipo = tipo
+        self.umbral = umbral
+        self.dt = dt
+        self.valor = inicial.copy() # final, maximo, minimo o caida
+        self.pico = inicial.copy() # Maximo hasta el paso (caidas)
+        self.acumulado = np.zeros(len(inicial)) # Suma (media) o pasos que cumplen (tiempo)
+        if tipo.startswith('caida'):
+            self.valor[:] = 0.0
+
+    def agregar(self, x):
+        tipo = self.tipo
+        if tipo == 'final':
+            self.valor = x
+        elif tipo == 'maximo':
+            np.maximum(self.valor, x, out=self.valor)
+        elif tipo == 'minimo':
+            np.minimum(self.valor, x, out=self.valor)
+        elif tipo == 'media':
+            self.acumulado += x
+        elif tipo == 'tiempo_sobre':
+            self.acumulado += x > self.umbral
+        elif tipo == 'tiempo_bajo':
+            self.acumulado += x < self.umbral
+        else:
+            np.maximum(self.pico, x, out=self.pico)
+            caida = self.pico - x
+            if tipo == 'caida_maxima_relativa':
+                caida = np.where(self.pico > 0, caida / self.pico, 0.0)
+            np.maximum(self.valor, caida, out=self.valor)
+
+    def resultado(self, pasos):
+        if self.tipo == 'media':
+            return self.acumulado / pasos
+        if self.tipo.startswith('tiempo_'):
+            return self.acumulado * self.dt
+        return self.valor
+
+# Simula las trayectorias de un modelo de tipo 'trayectoria'
+# Cada fila del lote (variables + semilla) es una trayectoria; las del bloque avanzan juntas con
+# las expresiones traducidas a numpy (mismas reglas que el backend numpy) y al final regresa una
+# columna por estadistica. Los aleatorios de cada paso salen de la semilla del escenario: el mismo
+# escenario da la misma trayectoria en cualquier worker, lote o replay
+class EvaluadorTrayectoria:
+    backend = 'trayectoria'
+
+    def __init__(self, modelo):
+        self.variables = list(modelo['variables']) + [VARIABLE_SEMILLA] # Orden de las columnas
+        self.salidas = list(modelo['estadisticas']) # La principal primero
+        self.pasos = modelo['pasos']
+        self.dt = modelo.get('dt', 1)
+        self.estados = list(modelo['estado'])
+        self.aleatorios = [normalizar_variable(nombre, config)
+                           for nombre, config in modelo.get('aleatorios', {}).items()]
+        # Nombres en el codigo generado: _v (variables), _e (estados), _a (aleatorios)
+        nombres = {nombre: f"_v{i}" for i, nombre in enumerate(modelo['variables'])}
+        nombres.update({nombre: f"_e{i}" for i, nombre in enumerate(self.estados)})
+        nombres.update({nombre: f"_a{i}" for i, nombre in enumerate(modelo.get('aleatorios', {}))})
+        nombres.update(dt='_dt', paso='_paso')
+
+        def compilar(expresion):
+            arbol = analizar_formula(str(expresion), nombres)[0]
+            return compile(traducir(arbol, nombres, vectorial=True), '<trayectoria>', 'eval')
+        self.iniciales = [compilar(modelo['estado'][estado]) for estado in self.estados]
+        self.actualizaciones = [(i, compilar(modelo['actualizacion'][estado]))
+                                for i, estado in enumerate(self.estados) if estado in modelo['actualizacion']]
+        self.estadisticas = [(self.estados.index(e['estado']), e['tipo'], e.get('umbral'))
+                             for e in modelo['estadisticas'].values()]
+        self.globales = {"__builtins__": {}, **AUXILIARES}
+
+    # Simula un bloque (matriz trayectorias x variables, semilla al final)
+    def simular(self, matriz):
+        ceros = np.zeros(len(matriz))
+        contexto = {'_dt': self.dt, '_paso': 0}
+        for i in range(len(self.variables) - 1):
+            contexto[f"_v{i}"] = matriz[:, i]
+        claves = mezclar(matriz[:, -1].astype(np.uint64) + np.uint64(DORADO))
+        estados = [ceros + eval(codigo, self.globales, contexto) for codigo in self.iniciales]
+        estadisticas = [EstadisticaTrayectoria(tipo, umbral, estados[i], self.dt)
+                        for i, tipo, umbral in self.estadisticas]
+        for paso in range(1, self.pasos + 1):
+            contexto['_paso'] = paso
+            for j, config in enumerate(self.aleatorios):
+                contexto[f"_a{j}"] = sortear_paso(config, claves, 2 * (paso * len(self.aleatorios) + j))
+            for i, estado in enumerate(estados):
+                contexto[f"_e{i}"] = estado
+            # Todos los estados se actualizan con los valores del paso anterior
+            for i, codigo in self.actualizaciones:
+                estados[i] = ceros + eval(codigo, self.globales, contexto)
+            for (i, _, _), estadistica in zip(self.estadisticas, estadisticas):
+                estadistica.agregar(estados[i])
+        return np.column_stack([estadistica.resultado(self.pasos) for estadistica in estadisticas])
+
+    # Un solo escenario {variable: valor} (incluida la semilla). Regresa un valor por estadistica
+    def evaluar(self, escenario):
+        return self.evaluar_lote(self.variables, [[escenario[v] for v in self.variables]])[0].tolist()
+
+    # Simula el lote por bloques de TRAYECTORIA_BLOQUE trayectorias (memoria acotada)
+    # Una trayectoria con valores no finitos (division entre cero, desbordamiento) es un error,
+    # como en eval: el worker vuelve a evaluar fila por fila y descarta solo esa
+    def evaluar_lote(self, nombres, filas):
+        matriz = np.asarray(filas, dtype=np.float64).reshape(len(filas), len(nombres))
+        if list(nombres) != self.variables:
+            matriz = matriz[:, [list(nombres).index(v) for v in self.variables]]
+        salida = np.empty((len(matriz), len(self.salidas)), dtype=np.float64)
+        with np.errstate(all='ignore'):
+            for inicio in range(0, len(matriz), TRAYECTORIA_BLOQUE):
+                salida[inicio:inicio + TRAYECTORIA_BLOQUE] = self.simular(matriz[inicio:inicio + TRAYECTORIA_BLOQUE])
+        if not np.all(np.isfinite(salida)):
+            raise ArithmeticError("Trayectoria con valores no finitos (division entre cero o desbordamiento)")
+        return salida
+
+def advertir(mensaje):
+    if mensaje not in advertencias_emitidas:
+        advertencias_emitidas.add(mensaje)
+        print(f"[ADVERTENCIA] {mensaje}")
+
+# Evaluador del backend pedido (los modelos de trayectoria usan EvaluadorTrayectoria)
+# Numba no disponible o formula que no compila -> numpy
+# Las formulas invalidas lanzan ModeloInvalido (como en el catalogo)
+def crear_evaluador(modelo, backend=BACKEND_EVALUACION):
+    if modelo.get('tipo') == 'trayectoria':
+        return EvaluadorTrayectoria(modelo)
+    if backend not in BACKENDS:
+        advertir(f"Backend de evaluacion desconocido '{backend}', se usa numpy")
+        backend = 'numpy'
+    if backend == 'escalar':
+        return EvaluadorEscalar(modelo)
+    if backend == 'numba':
+        if numba is None:
+            advertir("Numba no esta instalado, se evalua con numpy")
+        else:
+            try:
+                return EvaluadorNumba(modelo)
+            except Exception as e:
+                advertir(f"Numba no pudo compilar '{modelo.get('nombre', texto_formula(modelo))}' ({e}), "
+                         f"se evalua con numpy")
+    return EvaluadorNumpy(modelo)
@@ -1,33 +1,73 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-# Limpia todas las colas generadas en RabbitMQ por si tenemos algun problema de compatibilidad
+# LIMPIEZA Y OPERACION DE COLAS
+# Descripcion: Limpia todas las colas generadas en RabbitMQ por si tenemos algun problema de compatibilidad
+# y revisa el estado de las colas mientras el sistema corre
+#   - limpiar: elimina las colas y exchanges del sistema (lo que hace el script sin argumentos)
+#   - stats: profundidad (listos / sin ack), consumidores y contadores de cada grupo de colas
+#     (modelo, escenarios, resultados, comandos, control, latidos)
+#   - watch: stats cada N ms con tasas de publicacion, entrega y ack calculadas por diferencia
+#   - purge: vacia colas (por grupo o por nombre) sin borrarlas
+#   - drain-to-file: pasa los mensajes de una cola a un archivo JSON por linea (ack despues de escribir)
+#   - inspect-model: muestra el modelo de una ejecucion sin consumirlo (nack con requeue, como los workers)
+# De donde salen los datos (una sola consulta por muestra, se puede dejar corriendo con el broker cargado):
+#   - Broker local (BROKER_LOCAL): sus estadisticas
+#   - RabbitMQ: API HTTP del plugin de administracion (RABBIT_GESTION_PUERTO), solo las columnas necesarias
+#   - Sin API HTTP: queue_declare pasivo de las colas conocidas (sin contadores: solo la tasa neta)
+#
+# Uso: python limpiar_colas.py [limpiar [shards] | stats | watch | purge | drain-to-file | inspect-model] -h
 
-import pika
+import argparse
+import base64
+import json
+import os
 import sys
-from config import RABBIT_HOST, RABBIT_USER, RABBIT_PASS
-from config import (QUEUE_MODELO, QUEUE_ESCENARIOS, QUEUE_RESULTADOS,
-                   QUEUE_COMANDOS)
+import time
+import urllib.request
+import pika
+from config import RABBIT_HOST, RABBIT_USER, RABBIT_PASS, RABBIT_GESTION_PUERTO
+from config import (QUEUE_MODELO, QUEUE_ESCENARIOS, QUEUE_RESULTADOS, QUEUE_COMANDOS, QUEUE_CONTROL_WORKER,
+                   EXCHANGE_LATIDOS, PERFILES, NUM_SHARDS, SHARD_EXCHANGE_TIPO)
+from colas import colas_escenarios, colas_resultados, exchange_escenarios, cola_modelo
+from conexion import GestorConexion
+from catalogo import texto_formula
 
-def limpiar_colas():
+# Grupos de colas por prefijo (en este orden)
+GRUPOS = [
+    ('modelo', QUEUE_MODELO + '.'),
+    ('escenarios', QUEUE_ESCENARIOS),
+    ('resultados', QUEUE_RESULTADOS),
+    ('comandos', QUEUE_COMANDOS),
+    ('control', QUEUE_CONTROL_WORKER + '.'),
+    ('latidos', EXCHANGE_LATIDOS + '.'),
+]
+ORDEN_GRUPOS = [grupo for grupo, _ in GRUPOS] + ['otras']
+CONTADORES = ('publicados', 'entregados', 'confirmados') # Acumulados desde que existe la cola
+LOTE_ACK = 100 # Mensajes que drain-to-file escribe a disco antes de confirmarlos
+
+# shards: cuantos shards borrar (por si se aumento K con 'ajustar_shards')
+def limpiar_colas(shards=NUM_SHARDS):
     try:
         print("=" * 60)
         print(" LIMPIEZA DE COLAS - RabbitMQ")
         print("=" * 60)
         print()
-        
+
         # Conectar a RabbitMQ
-        creds = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
-        params = pika.ConnectionParameters(host=RABBIT_HOST, credentials=creds)
-        connection = pika.BlockingConnection(params)
-        channel = connection.channel()
-        
+        gestor = GestorConexion('Limpieza')
+        gestor.conexion(intentos=1)
+        channel = gestor.canal()
+
         print("[*] Conectado a RabbitMQ")
         print()
-        
+
         # Lista de colas a eliminar
         colas = [QUEUE_MODELO, QUEUE_ESCENARIOS, QUEUE_RESULTADOS,
                 QUEUE_COMANDOS]
-        
+        # Shards de escenarios y resultados de cada perfil de durabilidad
+        for perfil in PERFILES:
+            colas += colas_escenarios(perfil, shards) + colas_resultados(perfil, max(shards, NUM_SHARDS))
+
         for cola in colas:
             try:
                 channel.queue_delete(queue=cola)
@@ -37,17 +77,26 @@ def limpiar_colas():
                     print(f"[INFORMACION] Cola '{cola}' no existe (ok)")
                 else:
                     print(f"[ERROR] Error al eliminar cola '{cola}': {e}")
-        
-        connection.close()
-        
+
+        # Exchanges de reparto de escenarios
+        if SHARD_EXCHANGE_TIPO:
+            for perfil in PERFILES:
+                try:
+                    channel.exchange_delete(exchange=exchange_escenarios(perfil))
+                    print(f"[EXITO] Exchange '{exchange_escenarios(perfil)}' eliminado")
+                except Exception as e:
+                    print(f"[ERROR] Error al eliminar exchange '{exchange_escenarios(perfil)}': {e}")
+
+        gestor.cerrar()
+
         print()
         print("=" * 60)
         print(" Limpieza completada")
         print("=" * 60)
         print()
-        
+
         return 0
-        
+
     except Exception as e:
         print()
         print("[ERROR]", e)
@@ -56,5 +105,328 @@ def limpiar_colas():
         print("sean correctas en config.py")
         return 1
 
+# Grupo al que pertenece una cola (por prefijo)
+def grupo_cola(nombre):
+    for grupo, prefijo in GRUPOS:
+        if nombre.startswith(prefijo):
+            return grupo
+    return 'otras'
+
+# Estadisticas del broker local: todas las colas con sus contadores
+class FuenteLocal:
+    descripcion = "broker local"
+
+    def __init__(self, gestor):
+        self.gestor = gestor
+
+    def muestra(self):
+        estadisticas = self.gestor.conexion().llamar('estadisticas')
+        return {nombre: {'listos': datos['listos'], 'sin_ack': datos['sin_confirmar'], 'consumidores': None,
+                         'publicados': datos['publicados'], 'entregados': datos['entregados'],
+                         'confirmados': datos['confirmados']}
+                for nombre, datos in estadisticas['colas'].items()}
+
+# API HTTP del plugin de administracion de RabbitMQ: todas las colas en una sola peticion
+class FuenteGestion:
+    descripcion = "API de administracion de RabbitMQ"
+    COLUMNAS = ('name,messages_ready,messages_unacknowledged,consumers,'
+                'message_stats.publish,message_stats.deliver_get,message_stats.ack')
+
+    def __init__(self):
+        self.url = f"http://{RABBIT_HOST}:{RABBIT_GESTION_PUERTO}/api/queues?columns={self.COLUMNAS}"
+        credenciales = base64.b64encode(f"{RABBIT_USER}:{RABBIT_PASS}".encode('utf-8')).decode('ascii')
+        self.cabeceras = {'Authorization': f"Basic {credenciales}"}
+
+    def muestra(self):
+        peticion = urllib.request.Request(self.url, headers=self.cabeceras)
+        with urllib.request.urlopen(peticion, timeout=5) as respuesta:
+            colas = json.loads(respuesta.read().decode('utf-8'))
+        muestra = {}
+        for cola in colas:
+            contadores = cola.get('message_stats', {}) # No aparece hasta que pasa el primer mensaje
+            muestra[cola['name']] = {
+                'listos': cola.get('messages_ready', 0), 'sin_ack': cola.get('messages_unacknowledged', 0),
+                'consumidores': cola.get('consumers', 0), 'publicados': contadores.get('publish', 0),
+                'entregados': contadores.get('deliver_get', 0), 'confirmados': contadores.get('ack', 0),
+            }
+        return muestra
+
+# queue_declare pasivo de las colas conocidas: solo listos y consumidores
+# (las colas de modelo de cada ejecucion no se pueden listar: solo las de 'run_ids')
+class FuenteAMQP:
+    descripcion = "queue_declare pasivo (sin contadores)"
+
+    def __init__(self, gestor, shards=NUM_SHARDS, run_ids=()):
+        self.gestor = gestor
+        self.colas = [QUEUE_COMANDOS] + [cola_modelo(run_id) for run_id in run_ids]
+        for perfil in PERFILES:
+            self.colas += colas_escenarios(perfil, shards) + colas_resultados(perfil, shards)
+
+    def muestra(self):
+        muestra = {}
+        for cola in self.colas:
+            try:
+                method = self.gestor.canal('consultas').queue_declare(queue=cola, passive=True).method
+            except pika.exceptions.ChannelClosedByBroker:
+                continue # Cola que no existe: el canal se recrea en la siguiente consulta
+            muestra[cola] = {'listos': method.message_count, 'sin_ack': None,
+                             'consumidores': method.consumer_count,
+                             'publicados': None, 'entregados': None, 'confirmados': None}
+        return muestra
+
+# Fuente de estadisticas: broker local, API HTTP o, si no responde, queue_declare pasivo
+def elegir_fuente(gestor, shards=NUM_SHARDS, run_ids=()):
+    if gestor.broker_local:
+        return FuenteLocal(gestor)
+    fuente = FuenteGestion()
+    try:
+        fuente.muestra()
+        return fuente
+    except Exception as e:
+        print(f"[ADVERTENCIA] API de administracion no disponible en {RABBIT_HOST}:{RABBIT_GESTION_PUERTO} "
+              f"({e}), se usa queue_declare pasivo")
+        return FuenteAMQP(gestor, shards, run_ids)
+
+# Suma de valores que pueden ser None (None si ninguno se conoce)
+def sumar(valores):
+    conocidos = [v for v in valores if v is not None]
+    return sum(conocidos) if conocidos else None
+
+# Tasas por segundo entre dos muestras de la misma cola (None si no se pueden calcular)
+def tasas(anterior, actual, segundos):
+    resultado = {}
+    for campo in CONTADORES:
+        cambio = None
+        if anterior is not None and anterior[campo] is not None and actual[campo] is not None:
+            cambio = actual[campo] - anterior[campo]
+        # Un contador que baja es una cola que se borro y se volvio a crear
+        resultado[campo] = cambio / segundos if cambio is not None and cambio >= 0 else None
+    profundidad = lambda datos: (datos['listos'] or 0) + (datos['sin_ack'] or 0)
+    resultado['neto'] = (profundidad(actual) - profundidad(anterior)) / segundos if anterior is not None else None
+    return resultado
+
+# Agrupa las filas por grupo de colas (o deja una fila por cola)
+def agrupar(filas, por_cola=False):
+    if por_cola:
+        return dict(sorted(filas.items(), key=lambda fila: (ORDEN_GRUPOS.index(grupo_cola(fila[0])), fila[0])))
+    grupos = {}
+    for nombre, datos in filas.items():
+        grupos.setdefault(grupo_cola(nombre), []).append(datos)
+    return {grupo: {campo: sumar(d[campo] for d in grupos[grupo]) for campo in grupos[grupo][0]}
+            for grupo in ORDEN_GRUPOS if grupo in grupos}
+
+def formato(valor, decimales=0):
+    return '-' if valor is None else f"{valor:,.{decimales}f}"
+
+# Tabla de profundidad y contadores (stats) o tasas (watch)
+def imprimir_tabla(filas, con_tasas):
+    campos = ('publicados', 'entregados', 'confirmados', 'neto') if con_tasas else CONTADORES
+    titulos = ('Pub/s', 'Entr/s', 'Ack/s', 'Neto/s') if con_tasas else ('Publicados', 'Entregados', 'Ack')
+    ancho = max([len(nombre) for nombre in filas] + [10])
+    print(f"{'Cola':<{ancho}} {'Listos':>10} {'Sin ack':>9} {'Consum.':>8} " +
+          ' '.join(f"{t:>11}" for t in titulos))
+    for nombre, datos in filas.items():
+        print(f"{nombre:<{ancho}} {formato(datos['listos']):>10} {formato(datos['sin_ack']):>9} "
+              f"{formato(datos['consumidores']):>8} " +
+              ' '.join(f"{formato(datos[c], 1 if con_tasas else 0):>11}" for c in campos))
+
+def comando_stats(gestor, args):
+    fuente = elegir_fuente(gestor, args.shards, args.run_id)
+    filas = agrupar(fuente.muestra(), args.colas)
+    if args.json:
+        print(json.dumps(filas, indent=2))
+        return 0
+    print(f"[INFORMACION] Fuente: {fuente.descripcion}")
+    imprimir_tabla(filas, con_tasas=False)
+    return 0
+
+# Muestras cada 'intervalo' ms; las tasas son la diferencia de contadores entre muestras
+def comando_watch(gestor, args):
+    fuente = elegir_fuente(gestor, args.shards, args.run_id)
+    limpiar_pantalla = sys.stdout.isatty()
+    anterior, momento_anterior = None, None
+    muestras = 0
+    try:
+        while args.muestras <= 0 or muestras < args.muestras:
+            muestra = fuente.muestra()
+            momento = time.monotonic()
+            if anterior is not None:
+                segundos = momento - momento_anterior
+                filas = {nombre: dict(datos, **tasas(anterior.get(nombre), datos, segundos))
+                         for nombre, datos in muestra.items()}
+                if limpiar_pantalla:
+                    print("\033[H\033[J", end='')
+                print(f"[INFORMACION] {time.strftime('%H:%M:%S')} | Fuente: {fuente.descripcion} | "
+                      f"Intervalo: {segundos * 1000:.0f} ms")
+                imprimir_tabla(agrupar(filas, args.colas), con_tasas=True)
+                print()
+                muestras += 1
+            anterior, momento_anterior = muestra, momento
+            # Espera atendiendo los heartbeats de la conexion AMQP
+            gestor.dormir(max(args.intervalo / 1000 - (time.monotonic() - momento), 0))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+# Vacia las colas indicadas (nombres de grupo o de cola)
+def comando_purge(gestor, args):
+    existentes = elegir_fuente(gestor, args.shards, args.run_id).muestra()
+    colas = [nombre for nombre in existentes
+             if nombre in args.objetivos or grupo_cola(nombre) in args.objetivos]
+    if not colas:
+        print(f"[ADVERTENCIA] Ninguna cola coincide con: {', '.join(args.objetivos)}")
+        return 1
+    total = 0
+    for cola in colas:
+        try:
+            eliminados = gestor.canal().queue_purge(queue=cola).method.message_count
+            total += eliminados
+            print(f"[EXITO] Cola '{cola}' vaciada ({eliminados} mensajes)")
+        except pika.exceptions.ChannelClosedByBroker as e:
+            print(f"[ERROR] Error al vaciar cola '{cola}': {e}")
+    print(f"[INFORMACION] {total} mensajes eliminados de {len(colas)} colas")
+    return 0
+
+# Pasa los mensajes de una cola a un archivo (una linea JSON por mensaje)
+# Cada LOTE_ACK mensajes el archivo se baja a disco y solo entonces se confirman
+# Con --copiar los mensajes se devuelven a la cola al terminar (nack con requeue)
+def comando_drain(gestor, args):
+    channel = gestor.canal()
+    escritos = 0
+    ultimo_tag = None
+    with open(args.archivo, 'a', encoding='utf-8') as archivo:
+        def confirmar():
+            archivo.flush()
+            os.fsync(archivo.fileno())
+            if ultimo_tag is not None and not args.copiar:
+                channel.basic_ack(delivery_tag=ultimo_tag, multiple=True)
+
+        while args.max <= 0 or escritos < args.max:
+            method, props, body = channel.basic_get(queue=args.cola, auto_ack=False)
+            if method is None:
+                break
+            try:
+                cuerpo, codificacion = body.decode('utf-8'), 'utf-8'
+            except UnicodeDecodeError:
+                cuerpo, codificacion = base64.b64encode(body).decode('ascii'), 'base64'
+            propiedades = {campo: getattr(props, campo) for campo in
+                           ('content_type', 'delivery_mode', 'priority', 'correlation_id', 'message_id',
+                            'expiration', 'timestamp', 'headers')
+                           if getattr(props, campo, None) is not None}
+            archivo.write(json.dumps({'cola': args.cola, 'exchange': getattr(method, 'exchange', ''),
+                                      'routing_key': method.routing_key, 'propiedades': propiedades,
+                                      'codificacion': codificacion, 'cuerpo': cuerpo}) + '\n')
+            escritos += 1
+            ultimo_tag = method.delivery_tag
+            if escritos % LOTE_ACK == 0:
+                confirmar()
+        confirmar()
+    if args.copiar and ultimo_tag is not None:
+        channel.basic_nack(delivery_tag=ultimo_tag, multiple=True, requeue=True)
+    accion = "copiados" if args.copiar else "movidos"
+    print(f"[EXITO] {escritos} mensajes de '{args.cola}' {accion} a {args.archivo}")
+    return 0
+
+# Muestra el modelo de una ejecucion sin consumirlo (sin run_id: lista las colas de modelo)
+def comando_inspect(gestor, args):
+    if not args.ejecucion:
+        muestra = elegir_fuente(gestor).muestra()
+        modelos = [nombre for nombre in muestra if grupo_cola(nombre) == 'modelo']
+        if not modelos:
+            print("[INFORMACION] No hay colas de modelo (o la fuente no puede listarlas: indicar run_id)")
+        for nombre in sorted(modelos):
+            print(f"    {nombre[len(QUEUE_MODELO) + 1:]} ({formato(muestra[nombre]['listos'])} mensajes)")
+        return 0
+
+    cola = cola_modelo(args.ejecucion)
+    channel = gestor.canal()
+    try:
+        method, props, body = channel.basic_get(queue=cola, auto_ack=False)
+    except pika.exceptions.ChannelClosedByBroker:
+        print(f"[ERROR] La cola '{cola}' no existe (la ejecucion termino o su modelo expiro)")
+        return 1
+    if method is None:
+        print(f"[ADVERTENCIA] La cola '{cola}' esta vacia (el modelo expiro o un worker lo esta leyendo)")
+        return 1
+    # Se devuelve a la cola como hacen los workers (conserva el TTL)
+    channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+
+    modelo = json.loads(body.decode('utf-8'))
+    if args.json:
+        print(json.dumps(modelo, indent=2, ensure_ascii=False))
+        return 0
+    print(f"[INFORMACION] Ejecucion {modelo.get('run_id')} | Modo: {modelo.get('modo', 'montecarlo')} | "
+          f"Perfil: {modelo.get('perfil')} | Shards: {modelo.get('shards')}")
+    print(f"    Modelo: {modelo.get('nombre', 'N/A')} ({modelo.get('hash')})")
+    print(f"    Formula: {texto_formula(modelo)}")
+    for nombre, config in modelo['variables'].items():
+        print(f"    {nombre}: {config['distribucion']} {config['parametros']}")
+    for nombre, formula in modelo.get('salidas', {}).items():
+        print(f"    Salida {nombre}: {formula}")
+    if modelo.get('muestreo'):
+        print(f"    Muestreo: {json.dumps(modelo['muestreo'])}")
+    if props.expiration:
+        print(f"    TTL del mensaje: {int(props.expiration) / 1000:.0f}s (desde que se publico)")
+    print(f"    Tamaño: {len(body):,} bytes")
+    return 0
+
+def argumentos():
+    parser = argparse.ArgumentParser(description="Limpieza y operacion de las colas del sistema")
+    subparsers = parser.add_subparsers(dest='comando')
+
+    limpiar = subparsers.add_parser('limpiar', help="Elimina las colas y exchanges del sistema")
+    limpiar.add_argument('shards', nargs='?', type=int, default=NUM_SHARDS, help="Shards a eliminar")
+
+    # Opciones de las fuentes (shards y ejecuciones solo cuentan sin API HTTP)
+    for nombre, ayuda in (('stats', "Profundidad, consumidores y contadores de las colas"),
+                          ('watch', "Stats cada N ms con tasas por diferencia")):
+        sub = subparsers.add_parser(nombre, help=ayuda)
+        sub.add_argument('--colas', action='store_true', help="Una fila por cola en lugar de por grupo")
+        sub.add_argument('--shards', type=int, default=NUM_SHARDS, help="Shards a consultar (sin API HTTP)")
+        sub.add_argument('--run-id', action='append', default=[], help="Ejecucion cuya cola de modelo se consulta (sin API HTTP)")
+        if nombre == 'stats':
+            sub.add_argument('--json', action='store_true', help="Salida en JSON")
+        else:
+            sub.add_argument('--intervalo', type=int, default=1000, help="Milisegundos entre muestras")
+            sub.add_argument('--muestras', type=int, default=0, help="Muestras a mostrar (0 = hasta Ctrl+C)")
+
+    purge = subparsers.add_parser('purge', help="Vacia colas sin borrarlas")
+    purge.add_argument('objetivos', nargs='+', help="Grupos (escenarios, resultados, comandos...) o nombres de cola")
+    purge.add_argument('--shards', type=int, default=NUM_SHARDS, help="Shards a considerar (sin API HTTP)")
+    purge.add_argument('--run-id', action='append', default=[], help="Ejecucion cuya cola de modelo se considera (sin API HTTP)")
+
+    drain = subparsers.add_parser('drain-to-file', help="Pasa los mensajes de una cola a un archivo JSON por linea")
+    drain.add_argument('cola', help="Nombre de la cola")
+    drain.add_argument('archivo', help="Archivo de salida (se agrega al final)")
+    drain.add_argument('--max', type=int, default=0, help="Mensajes maximos (0 = hasta vaciarla)")
+    drain.add_argument('--copiar', action='store_true', help="No consumir: devolver los mensajes a la cola")
+
+    inspect = subparsers.add_parser('inspect-model', help="Muestra el modelo de una ejecucion sin consumirlo")
+    inspect.add_argument('ejecucion', nargs='?', help="run_id (sin el: lista las colas de modelo)")
+    inspect.add_argument('--json', action='store_true', help="Modelo completo en JSON")
+
+    # Compatibilidad: 'python limpiar_colas.py [shards]' sigue limpiando
+    argv = sys.argv[1:]
+    if not argv or argv[0].isdigit():
+        argv = ['limpiar'] + argv
+    return parser.parse_args(argv)
+
+def main():
+    args = argumentos()
+    if args.comando == 'limpiar':
+        return limpiar_colas(args.shards)
+
+    comandos = {'stats': comando_stats, 'watch': comando_watch, 'purge': comando_purge,
+                'drain-to-file': comando_drain, 'inspect-model': comando_inspect}
+    gestor = GestorConexion('Operacion')
+    try:
+        gestor.conexion(intentos=1)
+        return comandos[args.comando](gestor, args)
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+    finally:
+        gestor.cerrar()
+
 if __name__ == "__main__":
-    sys.exit(limpiar_colas())
+    sys.exit(main())
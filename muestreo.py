@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# MUESTREO PONDERADO
+# Descripcion: Muestreo por importancia y estratificado (ejecuciones montecarlo) para estimar
+# probabilidades de eventos raros (colas) sin millones de escenarios
+#   - Propuesta por variable: se muestrea de q en lugar de la distribucion nominal p
+#       normal: 'desplazamiento' (suma a mean) y 'escala' (multiplica std)
+#       exponential / uniform: 'inclinacion' theta (inclinacion exponencial, q(x) ~ e^(theta x) p(x))
+#   - Estratos por variable: su rango se parte en K estratos equiprobables (cuantiles de la
+#     distribucion con la que se muestrea). Los escenarios recorren los estratos en orden
+#     (asignacion proporcional): el estrato del escenario k es k mod (K1 * K2 * ...)
+# Cada escenario lleva su peso (cociente de verosimilitud p/q de todas sus variables) y su estrato
+# Los valores negativos se reflejan (abs) como en el muestreo normal: p y q son las densidades
+# de la variable reflejada
+
+import math
+import random
+import threading
+from statistics import NormalDist
+
+LIMITE_CUANTIL = 1e-12 # u se mantiene en (0, 1) para los cuantiles de colas infinitas
+
+# Distribucion (nombre, parametros) con la que se muestrea una variable del plan
+def distribucion_propuesta(config_variable):
+    distribucion, params = config_variable['distribucion'], config_variable['parametros']
+    propuesta = config_variable.get('propuesta')
+    if not propuesta:
+        return distribucion, params
+    if distribucion == 'normal':
+        return 'normal', {'mean': params['mean'] + propuesta['desplazamiento'],
+                          'std': params['std'] * propuesta['escala']}
+    if distribucion == 'exponential':
+        return 'exponential', {'scale': 1 / (1 / params['scale'] - propuesta['inclinacion'])}
+    return 'uniform_inclinada', dict(params, inclinacion=propuesta['inclinacion'])
+
+# Logaritmo de la densidad en x (-inf fuera del soporte)
+def log_densidad(distribucion, params, x):
+    if distribucion == 'normal':
+        if params['std'] == 0:
+            return 0.0 if x == params['mean'] else -math.inf
+        z = (x - params['mean']) / params['std']
+        return -0.5 * z * z - math.log(params['std'] * math.sqrt(2 * math.pi))
+    if distribucion == 'exponential':
+        return -math.log(params['scale']) - x / params['scale'] if x >= 0 else -math.inf
+    a, b = params['min'], params['max']
+    if not a <= x <= b:
+        return -math.inf
+    theta = params.get('inclinacion', 0)
+    if b == a:
+        return 0.0
+    if theta == 0:
+        return -math.log(b - a)
+    # theta e^(theta x) / (e^(theta b) - e^(theta a)), sin desbordar
+    extremo = b if theta > 0 else a
+    return (math.log(abs(theta)) + theta * (x - extremo) -
+            math.log(-math.expm1(-abs(theta) * (b - a))))
+
+# Densidad de |X| en v >= 0: f(v) + f(-v)
+def log_densidad_reflejada(distribucion, params, v):
+    positivo = log_densidad(distribucion, params, v)
+    if v == 0:
+        return positivo
+    negativo = log_densidad(distribucion, params, -v)
+    mayor = max(positivo, negativo)
+    if mayor == -math.inf:
+        return mayor
+    return mayor + math.log(math.exp(positivo - mayor) + math.exp(negativo - mayor))
+
+# Cuantil (inversa de la CDF) en u
+def cuantil(distribucion, params, u):
+    u = min(max(u, LIMITE_CUANTIL), 1 - LIMITE_CUANTIL)
+    if distribucion == 'normal':
+        if params['std'] == 0:
+            return params['mean']
+        return NormalDist(params['mean'], params['std']).inv_cdf(u)
+    if distribucion == 'exponential':
+        return -params['scale'] * math.log1p(-u)
+    a, b = params['min'], params['max']
+    theta = params.get('inclinacion', 0)
+    if theta == 0 or b == a:
+        return a + u * (b - a)
+    if theta > 0:
+        return b + math.log(u + (1 - u) * math.exp(-theta * (b - a))) / theta
+    return a + math.log1p(u * math.expm1(theta * (b - a))) / theta
+
+# True si el plan usa alguna propuesta o estratos
+def es_ponderado(plan):
+    return any(config.get('propuesta') or config.get('estratos', 1) > 1 for _, config in plan)
+
+# Muestreo de los escenarios de una ejecucion con su peso y estrato
+class PlanPonderado:
+    def __init__(self, plan):
+        self.variables = [] # (nombre, p, q, estratos, con propuesta)
+        for nombre, config in plan:
+            nominal = (config['distribucion'], config['parametros'])
+            self.variables.append((nombre, nominal, distribucion_propuesta(config),
+                                   config.get('estratos', 1), bool(config.get('propuesta'))))
+        self.total_estratos = math.prod(estratos for *_, estratos, _ in self.variables)
+        self.siguiente = 0 # Escenarios asignados (el estrato sale de aqui)
+        self.lock = threading.Lock()
+
+    # Estrato del siguiente escenario (asignacion proporcional, en orden)
+    def siguiente_estrato(self):
+        with self.lock:
+            estrato = self.siguiente % self.total_estratos
+            self.siguiente += 1
+            return estrato
+
+    # Un escenario del estrato dado. Regresa (escenario, peso)
+    def muestrear(self, estrato):
+        escenario = {}
+        log_peso = 0.0
+        resto = estrato
+        for nombre, (p, params_p), (q, params_q), estratos, con_propuesta in self.variables:
+            indice, resto = resto % estratos, resto // estratos
+            valor = abs(cuantil(q, params_q, (indice + random.random()) / estratos))
+            if con_propuesta:
+                log_peso += (log_densidad_reflejada(p, params_p, valor) -
+                             log_densidad_reflejada(q, params_q, valor))
+            escenario[nombre] = round(valor, 4)
+        return escenario, math.exp(log_peso)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# PERFILADO
+# Descripcion: Perfilado bajo demanda del productor y de los workers
+# Se activa con el comando 'perfilar' (cola COMANDOS) sin detener generacion ni consumo
+# Dos modos:
+#   - cprofile: perfil determinista de los hilos objetivo. Lo activa cada hilo objetivo
+#     en su siguiente iteracion (cProfile solo perfila el hilo que lo habilita); en el
+#     productor son el primer hilo de cada etapa del pipeline
+#   - muestreo: un hilo aparte toma la pila del hilo objetivo cada cierto tiempo
+#     (no toca al hilo objetivo)
+# Al terminar escribe el perfil y un resumen con las N funciones mas costosas
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from config import DIRECTORIO_PERFILES, PERFIL_INTERVALO_MUESTREO
+
+MODOS_PERFIL = ('cprofile', 'muestreo')
+
+class Perfilador:
+    def __init__(self, nombre):
+        self.nombre = nombre # Nombre del proceso (productor, worker_1, ...)
+        # Bandera que revisa el hilo objetivo. Mientras sea False no hay ningun costo extra
+        self.pendiente = False
+        self.activo = False # Hay un perfil en curso (cualquier modo)
+        self.modo = None
+        self.segundos = 0
+        self.top = 25
+        self.fin = 0 # Momento en el que termina el perfil actual
+        self.perfiles = {} # Nombre del hilo -> cProfile.Profile en curso
+        self.terminados = [] # [(hilo, cProfile.Profile)] ya detenidos, por escribir
+        self.lock = threading.Lock()
+
+    # Registra una solicitud de perfilado. Regresa False si ya hay uno en curso
+    # hilo: ident del hilo a muestrear (solo modo muestreo). None = todos los hilos
+    def solicitar(self, modo='cprofile', segundos=10, top=25, hilo=None):
+        if modo not in MODOS_PERFIL:
+            print(f"[ERROR] Modo de perfilado desconocido: {modo}")
+            return False
+
+        with self.lock:
+            if self.activo:
+                print(f"[ADVERTENCIA] Ya hay un perfilado en curso en {self.nombre}")
+                return False
+            self.activo = True
+            self.modo = modo
+            self.segundos = max(float(segundos), 0.1)
+            self.top = int(top)
+
+        print(f"[INFORMACION] Perfilado '{modo}' solicitado en {self.nombre} por {self.segundos}s")
+
+        if modo == 'muestreo':
+            threading.Thread(target=self.muestrear, args=(hilo,), daemon=True).start()
+        else:
+            # El hilo objetivo lo activa en su siguiente llamada a punto_control()
+            self.pendiente = True
+        return True
+
+    # Se llama desde un hilo objetivo solo cuando self.pendiente es True
+    # Activa cProfile la primera vez en ese hilo y lo detiene cuando se cumple el tiempo
+    # (el primer hilo que lo activa marca el inicio; los demas perfilan hasta el mismo fin)
+    def punto_control(self):
+        hilo = threading.current_thread().name
+        with self.lock:
+            profile = self.perfiles.get(hilo)
+            if profile is None:
+                if not self.pendiente: # Otro hilo ya escribio los resultados
+                    return
+                if not self.perfiles and not self.terminados:
+                    self.fin = time.time() + self.segundos
+                elif time.time() >= self.fin or any(hilo == otro for otro, _ in self.terminados):
+                    return
+                profile = self.perfiles[hilo] = cProfile.Profile()
+                profile.enable()
+                print(f"[INFORMACION] cProfile activado en {self.nombre} ({hilo})")
+                return
+        if time.time() >= self.fin:
+            self.finalizar()
+
+    # Detiene el cProfile del hilo actual (si hay uno en curso). Cuando ya no queda ninguno en
+    # curso escribe los resultados; si ningun hilo llego a activarlo (p. ej. el pipeline se detuvo
+    # antes) se cancela la solicitud. Debe llamarse desde el hilo objetivo
+    def finalizar(self):
+        hilo = threading.current_thread().name
+        with self.lock:
+            profile = self.perfiles.pop(hilo, None)
+            if profile is not None:
+                profile.disable()
+                self.terminados.append((hilo, profile))
+            if self.modo != 'cprofile' or not self.pendiente or self.perfiles:
+                return
+            terminados, self.terminados = self.terminados, []
+            self.pendiente = False
+
+        if not terminados:
+            print(f"[ADVERTENCIA] Perfilado cancelado en {self.nombre}: ningun hilo llego a activarlo")
+            self.activo = False
+            return
+
+        base = self.ruta_base('cprofile')
+        try:
+            salida = io.StringIO()
+            archivos = []
+            for hilo, profile in terminados:
+                archivo = f"{base}_{hilo}.prof" if len(terminados) > 1 else f"{base}.prof"
+                profile.dump_stats(archivo)
+                archivos.append(archivo)
+                salida.write(f"=== Hilo {hilo} ===\n")
+                stats = pstats.Stats(profile, stream=salida)
+                stats.sort_stats('cumulative').print_stats(self.top)
+            with open(base + '_resumen.txt', 'w', encoding='utf-8') as f:
+                f.write(f"Perfil cProfile de {self.nombre} ({self.segundos}s)\n\n")
+                f.write(salida.getvalue())
+            print(f"[EXITO] Perfil escrito en {', '.join(archivos)} y {base}_resumen.txt")
+        except Exception as e:
+            print(f"[ERROR] No se pudo escribir el perfil: {e}")
+        finally:
+            self.activo = False
+
+    # Hilo de muestreo: toma la pila del hilo objetivo cada PERFIL_INTERVALO_MUESTREO segundos
+    def muestrear(self, hilo):
+        propio = Counter() # Veces que la funcion estaba en la cima de la pila
+        acumulado = Counter() # Veces que la funcion estaba en cualquier parte de la pila
+        pilas = Counter() # Pilas completas (formato collapsed para flamegraph)
+        muestras = 0
+        mi_hilo = threading.get_ident()
+        fin = time.time() + self.segundos
+
+        while time.time() < fin:
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == mi_hilo or (hilo is not None and ident != hilo):
+                    continue
+                pila = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    pila.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno}({codigo.co_name})")
+                    frame = frame.f_back
+                if not pila:
+                    continue
+                muestras += 1
+                propio[pila[0]] += 1
+                for funcion in set(pila):
+                    acumulado[funcion] += 1
+                pilas[';'.join(reversed(pila))] += 1
+            time.sleep(PERFIL_INTERVALO_MUESTREO)
+
+        base = self.ruta_base('muestreo')
+        try:
+            with open(base + '.folded', 'w', encoding='utf-8') as f:
+                for pila, cuenta in pilas.most_common():
+                    f.write(f"{pila} {cuenta}\n")
+            with open(base + '_resumen.txt', 'w', encoding='utf-8') as f:
+                f.write(f"Perfil por muestreo de {self.nombre} ({self.segundos}s, "
+                        f"{muestras} muestras cada {PERFIL_INTERVALO_MUESTREO}s)\n\n")
+                f.write(f"{'propio':>8} {'acumulado':>10}  funcion\n")
+                for funcion, cuenta in acumulado.most_common(self.top):
+                    f.write(f"{propio[funcion] / max(muestras, 1):8.1%} "
+                            f"{cuenta / max(muestras, 1):10.1%}  {funcion}\n")
+            print(f"[EXITO] Perfil escrito en {base}.folded y {base}_resumen.txt")
+        except Exception as e:
+            print(f"[ERROR] No se pudo escribir el perfil: {e}")
+        finally:
+            self.activo = False
+
+    # Ruta base (sin extension) para los archivos de salida
+    def ruta_base(self, modo):
+        os.makedirs(DIRECTORIO_PERFILES, exist_ok=True)
+        marca = time.strftime("%Y%m%d_%H%M%S")
+        return os.path.join(DIRECTORIO_PERFILES, f"{self.nombre}_{modo}_{marca}")
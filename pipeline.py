@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# PIPELINE
+# Descripcion: Etapas del productor conectadas por colas acotadas
+# Cada etapa corre en sus propios hilos y se dimensiona por separado
+# Entre etapas viajan lotes (listas) para que el costo de las colas no domine
+# Las colas acotadas dan contrapresion: si la publicacion es lenta, el muestreo espera
+# Cuando la ultima hebra de una etapa termina, avisa (FIN) a todas las hebras de la siguiente
+# Si una hebra falla, se marca la bandera de detencion (compartida por todas las etapas) y las
+# demas salen de sus put/get en cuanto la ven, para que nadie quede bloqueado en una cola llena
+
+import queue
+import threading
+import time
+
+FIN = object() # Marca de fin de flujo entre etapas
+ESPERA_DETENCION = 0.5 # Segundos entre revisiones de la bandera de detencion en put/get
+
+class Etapa:
+    # procesar(lote) -> lote de salida. En la etapa inicial (sin entrada) procesar()
+    # no recibe argumentos y regresa None cuando ya no hay nada que generar
+    # al_terminar: fn() que corre en cada hilo al terminar (cerrar conexiones, etc)
+    # detenido: Event compartido por las etapas del pipeline (se marca si una hebra falla)
+    def __init__(self, nombre, procesar, hilos=1, entrada=None, capacidad=8, al_terminar=None, detenido=None):
+        self.nombre = nombre
+        self.procesar = procesar
+        self.hilos = max(int(hilos), 1)
+        self.entrada = entrada # Cola de la etapa anterior (None = etapa inicial)
+        self.salida = queue.Queue(maxsize=capacidad) # Cola hacia la etapa siguiente
+        self.siguiente = None # Etapa que consume self.salida
+        self.al_terminar = al_terminar
+        self.procesados = 0 # Elementos procesados (para medir rendimiento)
+        self.activos = 0
+        self.detenido = detenido or threading.Event()
+        self.error = None # Primera excepcion de una hebra de esta etapa
+        self.lock = threading.Lock()
+        self.threads = []
+
+    # Conecta la salida de esta etapa con una etapa nueva
+    def conectar(self, nombre, procesar, hilos=1, capacidad=8, al_terminar=None):
+        self.siguiente = Etapa(nombre, procesar, hilos, self.salida, capacidad, al_terminar, self.detenido)
+        return self.siguiente
+
+    # put a la cola de salida. Regresa False si el pipeline se detuvo antes de que hubiera lugar
+    def poner(self, elemento):
+        while not self.detenido.is_set():
+            try:
+                self.salida.put(elemento, timeout=ESPERA_DETENCION)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    # get de la cola de entrada. Regresa FIN si el pipeline se detuvo
+    def tomar(self):
+        while not self.detenido.is_set():
+            try:
+                return self.entrada.get(timeout=ESPERA_DETENCION)
+            except queue.Empty:
+                pass
+        return FIN
+
+    # Arranca los hilos de la etapa
+    def iniciar(self):
+        self.activos = self.hilos
+        for i in range(self.hilos):
+            thread = threading.Thread(target=self.ejecutar, name=f"{self.nombre}-{i}", daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    # Loop de cada hilo de la etapa
+    def ejecutar(self):
+        try:
+            while not self.detenido.is_set():
+                if self.entrada is None:
+                    lote = self.procesar()
+                    if lote is None:
+                        break
+                else:
+                    lote = self.tomar()
+                    if lote is FIN:
+                        break
+                    lote = self.procesar(lote)
+                if not lote:
+                    continue
+                with self.lock:
+                    self.procesados += len(lote)
+                if self.siguiente is not None and not self.poner(lote):
+                    break
+        except Exception as e:
+            print(f"[ERROR] Etapa '{self.nombre}' detenida por error: {e}")
+            with self.lock:
+                if self.error is None:
+                    self.error = e
+            self.detenido.set() # Las demas etapas dejan de producir y consumir
+        finally:
+            if self.al_terminar:
+                try:
+                    self.al_terminar()
+                except Exception as e:
+                    print(f"[ERROR] Etapa '{self.nombre}' al terminar: {e}")
+            with self.lock:
+                self.activos -= 1
+                ultimo = self.activos == 0
+            # La ultima hebra avisa el fin a cada hebra de la etapa siguiente
+            if ultimo and self.siguiente is not None:
+                for _ in range(self.siguiente.hilos):
+                    if not self.poner(FIN):
+                        break
+
+    # Espera a que terminen los hilos de la etapa
+    def esperar(self):
+        for thread in self.threads:
+            thread.join()
+
+class Pipeline:
+    def __init__(self, inicial):
+        self.etapas = [] # Etapas en orden
+        etapa = inicial
+        while etapa is not None:
+            self.etapas.append(etapa)
+            etapa = etapa.siguiente
+        self.ultimo_reporte = time.time()
+        self.ultimos_procesados = [0] * len(self.etapas)
+
+    def iniciar(self):
+        for etapa in self.etapas:
+            etapa.iniciar()
+
+    # Primer error de una hebra: (nombre de la etapa, excepcion) o None
+    def error(self):
+        for etapa in self.etapas:
+            if etapa.error is not None:
+                return etapa.nombre, etapa.error
+        return None
+
+    # Espera a que todas las etapas vacien sus colas y terminen
+    def esperar(self):
+        for etapa in self.etapas:
+            etapa.esperar()
+
+    # Rendimiento de cada etapa desde el reporte anterior: [(nombre, elementos/s, en cola)]
+    def tasas(self):
+        ahora = time.time()
+        transcurrido = max(ahora - self.ultimo_reporte, 1e-9)
+        tasas = []
+        for i, etapa in enumerate(self.etapas):
+            procesados = etapa.procesados
+            tasas.append((etapa.nombre, (procesados - self.ultimos_procesados[i]) / transcurrido,
+                          etapa.entrada.qsize() if etapa.entrada is not None else 0))
+            self.ultimos_procesados[i] = procesados
+        self.ultimo_reporte = ahora
+        return tasas
@@ -3,11 +3,17 @@
 # PRODUCTOR
 # Descripcion: El productor lee en la cola COMANDOS
 # En dicha cola, el dashboard envia solicitudes en la cual carga los diferentes modelos
-# El productor lee cual modelo y lo publica en la cola MODELO
+# Cada modelo cargado es una ejecucion (run) con su propio run_id
+# El productor publica el modelo de cada ejecucion en su cola MODELO.<run_id>
 # Extrae las caracteristicas del modelo (variables) y genera escenarios aleatorios unicos
-# Publica los escenarios en la cola ESCENARIO
-# Los workers consumen el modelo de la cola de MODELOS una sola vez
+# Varias ejecuciones pueden estar activas: un planificador intercala sus escenarios
+# por prioridad y peso. Publica los escenarios (con su run_id) en las colas de ESCENARIOS
+# Los workers leen el modelo de cada ejecucion una sola vez (cuando ven su run_id)
 # Los workers van consumiendo escenarios de la cola de ESCENARIOS
+# Una ejecucion se puede grabar en una bitacora y repetir despues (comando 'replay')
+# con los mismos escenarios, sin volver a muestrear
+# Un barrido (comando 'barrido') evalua una reticula de parametros de las distribuciones como
+# una sola ejecucion, con los mismos escenarios base en todos los puntos
 
 import pika
 import json
@@ -17,155 +23,139 @@ import signal
 import sys
 import os
 import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import numpy as np
 from config import (RABBIT_HOST, RABBIT_USER, RABBIT_PASS,
                    QUEUE_MODELO, QUEUE_ESCENARIOS, QUEUE_RESULTADOS,
-                   QUEUE_COMANDOS, MODELO_TTL, ESCENARIO_INTERVAL)
+                   QUEUE_COMANDOS, QUEUE_MODELOS_EXPIRADOS, MODELO_TTL, ESCENARIO_INTERVAL,
+                   EXCHANGE_CONTROL_WORKERS, CONTROL_TODOS, EXCHANGE_LATIDOS,
+                   PERFILES, PERFIL_DURABILIDAD, LOTE_CONFIRMACION, INTERVALO_CONFIRMACION,
+                   NUM_SHARDS, SOBOL_BLOQUE, HILOS_MUESTREO, HILOS_SERIALIZACION,
+                   HILOS_PUBLICACION, SERIALIZACION_PROCESOS, PIPELINE_LOTE, PIPELINE_ESPERA_MAX,
+                   PIPELINE_CAPACIDAD, PIPELINE_REPORTE,
+                   DIRECTORIO_MODELOS, GRABAR_ESCENARIOS)
+from colas import (obtener_perfil, destino_escenario, declarar_colas_perfil, cola_modelo,
+                   declarar_cola_modelo, declarar_shard_escenarios, desenlazar_shard_escenarios,
+                   propiedades_mensaje)
+from perfilado import Perfilador
+from conexion import GestorConexion
+from ejecuciones import Ejecucion, PlanificadorEjecuciones
+from pipeline import Etapa, Pipeline
+from catalogo import (Catalogo, ModeloInvalido, combinar_variantes, normalizar_muestreo, aplicar_muestreo,
+                      texto_formula)
+from muestreo import es_ponderado
+from bitacora import EscritorBitacora, LectorBitacora, BitacoraInvalida, ruta_bitacora
+from sensibilidad import construir_filas
+from barrido import PlanBarrido, etiqueta_punto
+
+# Campos del mensaje que van en el contenido grabado en la bitacora (el resto es cabecera)
+CAMPOS_CONTENIDO = ('escenario', 'escenarios', 'sobol', 'barrido', 'peso', 'pesos', 'estrato', 'estratos')
 
 class ProductorServicio:
     def __init__(self):
-        self.connection = None # Establecer conexion
-        self.channel = None # Canal de comunicacion
-        self.modelo_actual = None # Modelo actual
+        # Conexiones (una por hilo) con reconexion automatica
+        self.gestor = GestorConexion('Productor')
+        self.planificador = PlanificadorEjecuciones() # Ejecuciones activas y su turno
         self.generando = False # Bandera para generar escenarios
-        self.thread_generacion = None # Hilo que genera escenarios
-        self.escenarios_generados = set()  # Para que no se repitan escenarios
-        self.total_generados = 0 # Contador de escenarios
-        # Conexión separada para el thread de generacion
-        self.connection_generacion = None # Conexion del hilo para generar escenarios
-        self.channel_generacion = None # Canal del hilo para generar escenarios
+        self.thread_generacion = None # Hilo que arma y supervisa el pipeline de generacion
+        self.pool_serializacion = None # Pool de procesos de la etapa de serializacion
+        self.lock_generacion = threading.Lock() # Arranque/fin del hilo de generacion
+        self.total_generados = 0 # Contador de escenarios (todas las ejecuciones)
+        self.shards = NUM_SHARDS # Numero de shards (K) de escenarios
+        self.catalogo = Catalogo() # Modelos validados y compilados
+        self.perfilador = Perfilador('productor') # Perfilado bajo demanda (comando 'perfilar')
+        self.bitacoras_finalizadas = [] # (momento, ejecucion) que terminaron con bitacora (o replay) abierta
     
     # Establece conexion con RabbitMQ
     def conectar(self):
-        creds = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS) # Credenciales
-        params = pika.ConnectionParameters(host=RABBIT_HOST, credentials=creds) # Parametros de conexion
-        self.connection = pika.BlockingConnection(params) # Conexion bloqueante
-        self.channel = self.connection.channel() # Canal de comunicacion
-        
-        # Declarar colas necesarias
-        try:
-            # Crear cola donde se deposita el modelo
-            self.channel.queue_declare(
-                queue=QUEUE_MODELO,
-                durable=True, # Persistente
-                arguments={'x-message-ttl': MODELO_TTL} # Modelo con TTL
-            )
-        except Exception as e:
-            # Si ya existe, no la crea
-            print(f"[ADVERTENCIA] Cola modelo ya existe: {e}")
-            self.channel.queue_declare(queue=QUEUE_MODELO, durable=True)
-        
-        self.channel.queue_declare(queue=QUEUE_ESCENARIOS, durable=True) # Declara cola escenarios
-        self.channel.queue_declare(queue=QUEUE_RESULTADOS, durable=True) # Declara cola resultados
-        self.channel.queue_declare(queue=QUEUE_COMANDOS, durable=True) # Declara cola comandos
-        
+        # La topologia se vuelve a declarar en cada (re)conexion
+        self.gestor.agregar_topologia(self.declarar_topologia)
+        self.gestor.conexion()
         print("[EXITO] Conexion establecida con RabbitMQ")
     
-    # Carga un modelo desde un archivo JSON
-    def cargar_modelo(self, ruta_archivo):
+    # Declara las colas y exchanges que usa el productor
+    # (las colas de modelo son por ejecucion y se declaran al publicar cada modelo)
+    def declarar_topologia(self, channel):
+        # Declara colas de escenarios y resultados de cada perfil de durabilidad
+        for perfil in PERFILES:
+            declarar_colas_perfil(channel, perfil, self.shards)
+        channel.queue_declare(queue=QUEUE_COMANDOS, durable=True) # Declara cola comandos
+        # Modelos expirados (dead-letter de las colas de modelo)
+        channel.queue_declare(queue=QUEUE_MODELOS_EXPIRADOS, durable=True)
+        # Exchange para reenviar comandos de control a los workers
+        channel.exchange_declare(exchange=EXCHANGE_CONTROL_WORKERS, exchange_type='direct')
+        # Latidos de los workers (costo por escenario de cada ejecucion)
+        channel.exchange_declare(exchange=EXCHANGE_LATIDOS, exchange_type='fanout')
+        channel.queue_declare(queue=f"{EXCHANGE_LATIDOS}.productor", auto_delete=True)
+        channel.queue_bind(queue=f"{EXCHANGE_LATIDOS}.productor", exchange=EXCHANGE_LATIDOS)
+    
+    # Busca un modelo en el catalogo (por hash o por nombre de archivo)
+    # Los modelos ya usados salen de memoria o de la cache en disco sin revalidar
+    def cargar_modelo(self, clave):
         try:
-            # Cargar archivo JSON
-            with open(ruta_archivo, 'r', encoding='utf-8') as f:
-                modelo = json.load(f)
-            
-            # Validar estructura basica
-            campos_requeridos = ['nombre', 'descripcion', 'formula', 'variables']
-            for campo in campos_requeridos:
-                if campo not in modelo:
-                    raise ValueError(f"Modelo invalido: falta campo '{campo}'")
-            
-            print(f"[EXITO] Modelo cargado: {modelo['nombre']}")
-            print(f"    Descripción: {modelo['descripcion']}")
-            print(f"    Fórmula: {modelo['formula']}")
-            return modelo
-        
-        except FileNotFoundError:
-            print(f"[ERROR] Archivo no encontrado: {ruta_archivo}")
+            entrada = self.catalogo.obtener(clave)
+        except ModeloInvalido as e:
+            print(f"[ERROR] Modelo invalido: {e}")
             return None
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] Error al parsear JSON: {e}")
-            return None
-        except Exception as e:
-            print(f"[ERROR] Error al cargar modelo: {e}")
+        if entrada is None:
+            print(f"[ERROR] Modelo no encontrado en '{DIRECTORIO_MODELOS}': {clave}")
             return None
-    
-    # Publica el modelo en la cola de modelos
-    def publicar_modelo(self):
-        # Si no hay modelo actual
-        if not self.modelo_actual:
-            print("[ERROR] No hay modelo cargado")
-            return False
         
-        # Purgar colas anteriores para limpiar escenarios y modelo anterior
-        try:
-            self.channel.queue_purge(queue=QUEUE_MODELO)
-            print(f"[ADVERTENCIA] Cola de modelo purgada")
-        except:
-            pass
-        
-        try:
-            self.channel.queue_purge(queue=QUEUE_ESCENARIOS)
-            print(f"[ADVERTENCIA] Cola de escenarios purgada (nuevo modelo)")
-        except:
-            pass
-        
-        # Publicar nuevo modelo
-        body = json.dumps(self.modelo_actual) # Serializa a cadena con formato JSON
-        self.channel.basic_publish(
-            exchange='',
-            routing_key=QUEUE_MODELO,
+        print(f"[EXITO] Modelo cargado: {entrada.nombre} ({entrada.archivo}, hash {entrada.hash})")
+        print(f"    Descripción: {entrada.modelo['descripcion']}")
+        print(f"    Fórmula: {texto_formula(entrada.modelo)}")
+        for advertencia in entrada.advertencias:
+            print(f"[ADVERTENCIA] {advertencia}")
+        return entrada
+    
+    # Publica el modelo de una ejecucion en su propia cola (no toca otras ejecuciones)
+    def publicar_modelo(self, ejecucion):
+        # Modelo con run_id, perfil y shards para que los workers los conozcan
+        modelo = dict(ejecucion.modelo, run_id=ejecucion.run_id, perfil=ejecucion.perfil,
+                      shards=self.shards, modo=ejecucion.modo, hash=ejecucion.hash)
+        body = json.dumps(modelo) # Serializa a cadena con formato JSON
+        
+        declarar_cola_modelo(self.gestor.canal(), ejecucion.run_id)
+        self.gestor.publicar(
+            routing_key=cola_modelo(ejecucion.run_id),
             body=body.encode('utf-8'),
             properties=pika.BasicProperties(
                 delivery_mode=2, # Persistente
                 expiration=str(MODELO_TTL) # Con TTL individual por mensaje
             )
         )
-        print(f"[EXITO] Modelo publicado en cola '{QUEUE_MODELO}' (TTL: {MODELO_TTL/1000}s)")
+        print(f"[EXITO] Modelo publicado en cola '{cola_modelo(ejecucion.run_id)}' (TTL: {MODELO_TTL/1000}s)")
         return True
     
-    # # Verifica si el modelo sigue en la cola (no ha expirado TTL)
-    # def modelo_existe_en_cola(self):
-    #     try:
-    #         # Intentar obtener informacion de la cola
-    #         # passive=True: Solo verifica sin crear la cola
-    #         method = self.channel.queue_declare(queue=QUEUE_MODELO, passive=True)
-    #         # Si la cola existe y tiene mensajes, el modelo esta disponible
-    #         return method.method.message_count > 0
-    #     except pika.exceptions.ChannelClosedByBroker as e:
-    #         # Si RabbitMQ cierra el canal (ej: cola no existe)
-    #         # Recrear el canal para poder seguir operando
-    #         print(f"[INFORMACION] Canal cerrado por RabbitMQ (cola expiro), recreando...")
-    #         try:
-    #             self.channel = self.connection.channel()
-    #             # Re-declarar colas necesarias
-    #             self.channel.queue_declare(queue=QUEUE_ESCENARIOS, durable=True)
-    #             self.channel.queue_declare(queue=QUEUE_RESULTADOS, durable=True)
-    #             self.channel.queue_declare(queue=QUEUE_COMANDOS, durable=True)
-    #         except Exception as recreate_error:
-    #             print(f"[ERROR] No se pudo recrear canal: {recreate_error}")
-    #         return False
-    #     except Exception as e:
-    #         # Cualquier otro error: asumir que el modelo no esta disponible
-    #         return False
-    
-    # Verifica si hay modelo. Solo como pasivo para obtener informacion de la cola
-    # Usamos otro canal para no interferir con el principal
-    def modelo_existe_en_cola_generacion(self):
+    # Modelo expirado (dead-letter de su cola): se finaliza su ejecucion si sigue activa
+    # Las expiraciones de ejecuciones que ya terminaron (o de otro productor) solo se confirman
+    def procesar_expiracion(self, ch, method, props, body):
         try:
-            method = self.channel_generacion.queue_declare(queue=QUEUE_MODELO, passive=True)
-            return method.method.message_count > 0
-        except pika.exceptions.ChannelClosedByBroker:
-            # Canal cerrado, recrear
-            try:
-                self.channel_generacion = self.connection_generacion.channel()
-                # Solo declarar cola de escenarios (modelo ya existe o no importa)
-                self.channel_generacion.queue_declare(queue=QUEUE_ESCENARIOS, durable=True)
-            except:
-                pass
-            return False
-        except Exception:
-            return False
+            modelo = json.loads(body.decode('utf-8'))
+            muertes = (props.headers or {}).get('x-death') or [{}]
+            razon = muertes[0].get('reason', 'expired')
+            if isinstance(razon, bytes):
+                razon = razon.decode('utf-8')
+            ejecucion = self.planificador.obtener(modelo.get('run_id'))
+            if razon == 'expired' and ejecucion is not None and ejecucion.hash == modelo.get('hash'):
+                print(f"\n[ADVERTENCIA] Modelo de ejecucion {ejecucion.run_id} expirado (TTL cumplido)")
+                print(f"[*] RabbitMQ eliminó el modelo de la cola")
+                self.finalizar_ejecucion(ejecucion.run_id)
+        except Exception as e:
+            print(f"[ERROR] Error procesando expiracion de modelo: {e}")
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+    
+    # Registra el costo por escenario que reporta un worker para cada ejecucion que evalua
+    def procesar_latido(self, ch, method, props, body):
+        try:
+            latido = json.loads(body.decode('utf-8'))
+            for run_id, costo in (latido.get('costos') or {}).items():
+                ejecucion = self.planificador.obtener(run_id)
+                if ejecucion is not None:
+                    ejecucion.registrar_costo(costo)
+        except Exception as e:
+            print(f"[ADVERTENCIA] Latido invalido: {e}")
     
     # Genera un valor segun la distribucion especificada
     def generar_valor(self, config_variable):
@@ -187,143 +177,637 @@ class ProductorServicio:
         
         return round(valor, 4)
     
-    # Generar escenario unico
-    def generar_escenario_unico(self):
+    # Generar escenario unico (unico dentro de su ejecucion)
+    def generar_escenario_unico(self, ejecucion):
         max_intentos = 1000 # Maximo de intentos para generar un escenario unico
         for _ in range(max_intentos):
             escenario = {}
-            for var_nombre, var_config in self.modelo_actual['variables'].items():
+            for var_nombre, var_config in ejecucion.plan:
                 escenario[var_nombre] = self.generar_valor(var_config)
             
             # Crear hash del escenario para verificar unicidad
             escenario_hash = json.dumps(escenario, sort_keys=True)
             
-            if escenario_hash not in self.escenarios_generados:
-                self.escenarios_generados.add(escenario_hash)
-                return escenario
+            with ejecucion.lock:
+                if escenario_hash not in ejecucion.escenarios_generados:
+                    ejecucion.escenarios_generados.add(escenario_hash)
+                    return escenario
         
         # Si después de 1000 intentos no encuentra unico, se puede repetir
         return escenario
     
-    # Funcion en hilo que genera escenarios continuamente hasta TTL o cambio de modelo
+    # Genera un escenario con muestreo por importancia / estratificado
+    # Regresa (escenario, peso, estrato); el estrato se conserva si hay que repetir el escenario
+    def generar_escenario_ponderado(self, ejecucion):
+        estrato = ejecucion.ponderado.siguiente_estrato()
+        for _ in range(1000):
+            escenario, peso = ejecucion.ponderado.muestrear(estrato)
+            escenario_hash = json.dumps(escenario, sort_keys=True)
+            with ejecucion.lock:
+                if escenario_hash not in ejecucion.escenarios_generados:
+                    ejecucion.escenarios_generados.add(escenario_hash)
+                    break
+        return escenario, peso, estrato
+    
+    # Genera un lote de Saltelli (modo sensibilidad): matrices A y B independientes
+    # y las AB_i derivadas. No se verifica unicidad: A y B deben ser muestras independientes
+    def generar_lote_sensibilidad(self, ejecucion):
+        variables = [nombre for nombre, _ in ejecucion.plan]
+        configs = [config for _, config in ejecucion.plan]
+        A = [[self.generar_valor(c) for c in configs] for _ in range(ejecucion.bloque)]
+        B = [[self.generar_valor(c) for c in configs] for _ in range(ejecucion.bloque)]
+        return {'variables': variables, 'n': ejecucion.bloque, 'filas': construir_filas(A, B)}
+    
+    # Lote de un barrido: n escenarios base, cada uno transformado a todos los puntos de la reticula
+    # Sigue el ritmo de generacion fila por fila (cada fila es una evaluacion en el worker) y
+    # corta al cumplirse PIPELINE_ESPERA_MAX. Regresa (contenido, filas)
+    def generar_lote_barrido(self, ejecucion, n, inicio, pautados):
+        filas = []
+        for _ in range(n):
+            filas.extend(ejecucion.barrido.filas())
+            self.pausar(inicio, pautados + len(filas))
+            if not self.generando or time.time() - inicio >= PIPELINE_ESPERA_MAX:
+                break
+        return {'variables': ejecucion.barrido.variables, 'filas': filas}, len(filas)
+    
+    # Junta hasta n escenarios de una ejecucion montecarlo en un solo mensaje (filas en el orden
+    # de las variables del plan). Sigue el ritmo de generacion escenario por escenario y corta
+    # al cumplirse PIPELINE_ESPERA_MAX. Regresa (mensaje, escenarios)
+    def generar_lote_escenarios(self, ejecucion, n, inicio, pautados):
+        variables = [nombre for nombre, _ in ejecucion.plan]
+        filas, pesos, estratos = [], [], []
+        while len(filas) < n:
+            if ejecucion.ponderado is not None:
+                escenario, peso, estrato = self.generar_escenario_ponderado(ejecucion)
+                pesos.append(peso)
+                estratos.append(estrato)
+            else:
+                escenario = self.generar_escenario_unico(ejecucion)
+            filas.append([escenario[nombre] for nombre in variables])
+            self.pausar(inicio, pautados + len(filas))
+            if not self.generando or time.time() - inicio >= PIPELINE_ESPERA_MAX:
+                break
+        mensaje = {'run_id': ejecucion.run_id, 'escenarios': {'variables': variables, 'filas': filas}}
+        if ejecucion.ponderado is not None:
+            mensaje['pesos'] = pesos
+            mensaje['estratos'] = estratos
+        return mensaje, len(filas)
+    
+    # Ritmo de generacion (0 = sin pausa). Se duerme solo lo que se va adelantado
+    # respecto al ritmo pedido (time.sleep de intervalos muy cortos se pasa de largo)
+    def pausar(self, inicio, pautados):
+        if ESCENARIO_INTERVAL:
+            adelanto = inicio + pautados * ESCENARIO_INTERVAL - time.time()
+            if adelanto > 0:
+                time.sleep(adelanto)
+    
+    # Etapa de muestreo: junta un lote de mensajes de escenarios (o lotes de Saltelli)
+    # El planificador decide a que ejecucion le toca cada mensaje; en modo montecarlo un mensaje
+    # lleva los escenarios que indique tamano_lote() y se le cobran todos a la ejecucion
+    # Las ejecuciones de replay leen el contenido de su bitacora (sin muestrear ni pausas)
+    # Regresa None cuando ya no quedan ejecuciones activas
+    def muestrear_lote(self):
+        self.punto_perfilado()
+        lote = []
+        pautados = 0 # Escenarios muestreados (los de replay no siguen el ritmo de generacion)
+        inicio = time.time()
+        while self.generando and len(lote) < PIPELINE_LOTE:
+            ejecucion = self.planificador.siguiente()
+            if ejecucion is None:
+                with self.lock_generacion:
+                    # Revisar de nuevo con el lock: pudo llegar una ejecucion nueva
+                    if len(self.planificador) == 0:
+                        self.generando = False
+                break
+            
+            registro = None
+            escenarios = 1 # Escenarios que lleva el mensaje (seqs que reserva)
+            muestreados = 0 # Filas que ya siguieron el ritmo de generacion dentro del mensaje
+            n = ejecucion.tamano_lote() if ejecucion.modo != 'sensibilidad' else 1
+            if ejecucion.fuente is not None:
+                registro = ejecucion.fuente.siguiente()
+                if registro is None:
+                    self.terminar_replay(ejecucion)
+                    continue
+                # Se conserva la seq original: el resultado k del replay es el del escenario k
+                mensaje = {'run_id': ejecucion.run_id, 'contenido': registro[1]}
+            elif ejecucion.modo == 'sensibilidad':
+                mensaje = {'run_id': ejecucion.run_id, 'sobol': self.generar_lote_sensibilidad(ejecucion)}
+            elif ejecucion.modo == 'barrido':
+                # El costo medido es por fila: caben n // puntos escenarios base. El mensaje
+                # reserva una sola seq pero se cobran todas sus filas
+                contenido, muestreados = self.generar_lote_barrido(
+                    ejecucion, max(n // len(ejecucion.barrido), 1), inicio, pautados)
+                mensaje = {'run_id': ejecucion.run_id, 'barrido': contenido}
+                self.planificador.cobrar(ejecucion, muestreados)
+            elif n > 1:
+                mensaje, escenarios = self.generar_lote_escenarios(ejecucion, n, inicio, pautados)
+                muestreados = escenarios
+                self.planificador.cobrar(ejecucion, escenarios)
+            elif ejecucion.ponderado is not None:
+                escenario, peso, estrato = self.generar_escenario_ponderado(ejecucion)
+                mensaje = {'run_id': ejecucion.run_id, 'escenario': escenario,
+                           'peso': peso, 'estrato': estrato}
+            else:
+                mensaje = {'run_id': ejecucion.run_id, 'escenario': self.generar_escenario_unico(ejecucion)}
+            
+            with self.lock_generacion:
+                clave = self.total_generados # Decide el shard en el exchange de hash consistente
+                self.total_generados += escenarios
+                # Secuencia dentro de la ejecucion (la grabada si es replay); un mensaje con
+                # varios escenarios lleva la del primero y reserva las siguientes
+                mensaje['seq'] = ejecucion.total_generados if registro is None else registro[0]
+                ejecucion.total_generados += escenarios
+            mensaje['enviado'] = time.time() # Para medir la latencia de punta a punta
+            lote.append((ejecucion, clave, mensaje))
+            if registro is not None:
+                continue
+            if not muestreados: # Los lotes ya siguieron el ritmo fila por fila
+                self.pausar(inicio, pautados + 1)
+                muestreados = 1
+            pautados += muestreados
+            if time.time() - inicio >= PIPELINE_ESPERA_MAX:
+                break
+        
+        if not lote and not self.generando:
+            return None
+        return lote
+    
+    # Etapa de serializacion: JSON de cada mensaje (en el pool de procesos si hay)
+    # Los mensajes de ejecuciones grabadas o de replay se arman aqui con el contenido ya en bytes
+    def serializar_lote(self, lote):
+        self.punto_perfilado()
+        cuerpos = [None] * len(lote)
+        pendientes = [] # Posiciones que se serializan completas
+        for i, (ejecucion, _, mensaje) in enumerate(lote):
+            if ejecucion.fuente is not None or ejecucion.bitacora is not None:
+                cuerpos[i] = self.serializar_con_bitacora(ejecucion, mensaje)
+            else:
+                pendientes.append(i)
+        
+        mensajes = [lote[i][2] for i in pendientes]
+        if self.pool_serializacion is not None and mensajes:
+            serializados = self.pool_serializacion.map(json.dumps, mensajes,
+                                                       chunksize=max(len(mensajes) // 4, 1))
+        else:
+            serializados = [json.dumps(mensaje) for mensaje in mensajes]
+        for i, cuerpo in zip(pendientes, serializados):
+            cuerpos[i] = cuerpo.encode('utf-8')
+        return [(ejecucion.perfil, clave, cuerpo)
+                for (ejecucion, clave, _), cuerpo in zip(lote, cuerpos)]
+    
+    # Cuerpo de un mensaje con el contenido como bytes JSON: un objeto con el escenario (o los
+    # escenarios, o el lote de Saltelli) y su peso y estrato. Se graba en la bitacora tal cual y el replay lo reenvia sin
+    # volver a serializarlo
+    def serializar_con_bitacora(self, ejecucion, mensaje):
+        contenido = mensaje.pop('contenido', None)
+        if contenido is None:
+            contenido = json.dumps({campo: mensaje.pop(campo) for campo in
+                                    CAMPOS_CONTENIDO if campo in mensaje}).encode('utf-8')
+            ejecucion.bitacora.agregar(mensaje['seq'], contenido)
+        cabecera = json.dumps(mensaje).encode('utf-8')
+        return b''.join((cabecera[:-1], b', ', contenido[1:]))
+    
+    # Perfilado bajo demanda: cProfile en el primer hilo de cada etapa del pipeline
+    # (muestreo-0, serializacion-0 y publicacion-0)
+    def punto_perfilado(self):
+        if self.perfilador.pendiente and threading.current_thread().name.endswith('-0'):
+            self.perfilador.punto_control()
+    
+    # Al terminar el primer hilo de una etapa: cerrar su cProfile (si habia uno en curso)
+    def terminar_etapa(self):
+        if threading.current_thread().name.endswith('-0'):
+            self.perfilador.finalizar()
+    
+    # Etapa de publicacion: cada hilo publica por su propia conexion
+    # confirmed-batch: los escenarios se confirman por lotes con transacciones
+    def publicar_lote(self, lote):
+        self.punto_perfilado()
+        
+        estado = self.gestor.estado()
+        if not hasattr(estado, 'ultima_confirmacion'):
+            estado.ultima_confirmacion = time.time()
+        
+        for perfil, clave, body in lote:
+            confirmado = obtener_perfil(perfil)['confirmado']
+            exchange, routing_key = destino_escenario(perfil, clave, self.shards)
+            self.gestor.publicar(
+                exchange=exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=propiedades_mensaje(perfil),
+                canal='generacion_tx' if confirmado else 'generacion',
+                transaccional=confirmado
+            )
+            
+            # Confirmar lote cuando se llena o cuando pasa el intervalo maximo
+            if self.gestor.pendientes('generacion_tx'):
+                if (self.gestor.pendientes('generacion_tx') >= LOTE_CONFIRMACION or
+                        time.time() - estado.ultima_confirmacion >= INTERVALO_CONFIRMACION):
+                    self.gestor.confirmar('generacion_tx')
+                    estado.ultima_confirmacion = time.time()
+        return lote
+    
+    # Al terminar cada hilo de publicacion: confirmar lo pendiente y cerrar su conexion
+    def terminar_publicacion(self):
+        self.terminar_etapa()
+        try:
+            self.gestor.confirmar('generacion_tx')
+        except Exception as e:
+            print(f"[ERROR] No se pudo confirmar el ultimo lote: {e}")
+        self.gestor.cerrar_hilo()
+    
+    # Funcion en hilo que arma el pipeline de generacion y reporta su rendimiento
+    # Corre mientras haya ejecuciones activas (terminan por TTL de su modelo o por comando)
     def generacion_continua(self):
         print(f"\n[*] Iniciando generación continua de escenarios...")
-        print(f"    Modelo: {self.modelo_actual['nombre']}")
         print(f"    Intervalo: {ESCENARIO_INTERVAL}s por escenario")
-        print(f"    El modelo expirará automáticamente después de {MODELO_TTL/1000}s (TTL)")
-        print(f"    La generación se detendrá cuando el modelo expire\n")
-        
-        # Crear conexion separada para este thread (evita conflictos con canal principal)
-        try:
-            creds = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
-            params = pika.ConnectionParameters(host=RABBIT_HOST, credentials=creds)
-            self.connection_generacion = pika.BlockingConnection(params)
-            self.channel_generacion = self.connection_generacion.channel()
-            
-            # Solo declarar cola de escenarios (la cola modelo ya existe)
-            self.channel_generacion.queue_declare(queue=QUEUE_ESCENARIOS, durable=True)
-        except Exception as e:
-            print(f"[ERROR] No se pudo crear conexión para generación: {e}")
-            return
-        
-        # Loop simple: genera hasta que se detenga o el modelo expire
-        while self.generando:
-            try:
-                # Verificar cada 100 escenarios si el modelo sigue en la cola
-                if self.total_generados > 0 and self.total_generados % 100 == 0:
-                    if not self.modelo_existe_en_cola_generacion(): # Si ya no esta el modelo
-                        print(f"\n[ADVERTENCIA] Modelo expirado (TTL cumplido)")
-                        print(f"[*] RabbitMQ eliminó el modelo de la cola")
-                        print(f"[*] Deteniendo generación de escenarios...")
-                        self.generando = False
-                        break
-                
-                # Generar escenario unico
-                escenario = self.generar_escenario_unico()
-                
-                # Publicar escenario
-                body = json.dumps(escenario)
-                self.channel_generacion.basic_publish(
-                    exchange='',
-                    routing_key=QUEUE_ESCENARIOS,
-                    body=body.encode('utf-8'),
-                    properties=pika.BasicProperties(delivery_mode=2)
-                )
-                
-                self.total_generados += 1
-                
-                # Mostrar progreso cada 100 escenarios
-                if self.total_generados % 100 == 0:
-                    print(f"[INFORMACION] Generados: {self.total_generados} escenarios | "
-                          f"Unicos: {len(self.escenarios_generados)}")
-                
-                # Esperar intervalo
-                time.sleep(ESCENARIO_INTERVAL)
-                
-            except Exception as e:
-                print(f"[ERROR] Error al generar escenario: {e}")
-                time.sleep(1)
-        
-        # Cerrar conexion del thread (no la principal)
-        try:
-            if self.connection_generacion and self.connection_generacion.is_open:
-                self.connection_generacion.close()
-        except:
-            pass
+        print(f"    Shards: {self.shards}")
+        print(f"    Hilos: muestreo {HILOS_MUESTREO} | serialización {HILOS_SERIALIZACION} "
+              f"(procesos: {SERIALIZACION_PROCESOS}) | publicación {HILOS_PUBLICACION}")
+        print(f"    Cada modelo expirará automáticamente después de {MODELO_TTL/1000}s (TTL)")
+        print(f"    La generación se detendrá cuando no queden ejecuciones activas\n")
+        
+        # Pool de procesos para serializar (solo si el JSON es el cuello de botella)
+        self.pool_serializacion = None
+        if SERIALIZACION_PROCESOS > 0:
+            self.pool_serializacion = ProcessPoolExecutor(max_workers=SERIALIZACION_PROCESOS)
+        
+        # muestreo -> serializacion -> publicacion (colas acotadas entre etapas)
+        muestreo = Etapa('muestreo', self.muestrear_lote, HILOS_MUESTREO, capacidad=PIPELINE_CAPACIDAD,
+                         al_terminar=self.terminar_etapa)
+        muestreo.conectar('serializacion', self.serializar_lote, HILOS_SERIALIZACION,
+                          capacidad=PIPELINE_CAPACIDAD, al_terminar=self.terminar_etapa).conectar(
+            'publicacion', self.publicar_lote, HILOS_PUBLICACION,
+            al_terminar=self.terminar_publicacion)
+        pipeline = Pipeline(muestreo)
+        pipeline.iniciar()
+        
+        # Reporte de rendimiento por etapa hasta que termine la publicacion
+        publicacion = pipeline.etapas[-1]
+        while any(thread.is_alive() for thread in publicacion.threads):
+            inicio = time.time()
+            fin = inicio + PIPELINE_REPORTE
+            for thread in publicacion.threads:
+                thread.join(timeout=max(fin - time.time(), 0))
+            self.cerrar_bitacoras(antes_de=inicio)
+            tasas = ' | '.join(f"{nombre}: {tasa:,.0f} msg/s (cola {en_cola})"
+                               for nombre, tasa, en_cola in pipeline.tasas())
+            resumen = ', '.join(f"{e.run_id}: {e.total_generados}" +
+                                (f" ({e.tamano_lote()}/msg)" if e.modo == 'montecarlo' else '')
+                                for e in self.planificador.listar())
+            print(f"[INFORMACION] Generados: {self.total_generados} | {tasas}")
+            if resumen:
+                print(f"    Ejecuciones: {resumen}")
+        pipeline.esperar()
+        self.cerrar_bitacoras()
+        
+        if self.pool_serializacion is not None:
+            self.pool_serializacion.shutdown()
+            self.pool_serializacion = None
+        
+        # Si una etapa fallo, las demas se detuvieron: se libera la bandera para que un
+        # comando posterior pueda arrancar la generacion de nuevo
+        error = pipeline.error()
+        if error is not None:
+            with self.lock_generacion:
+                self.generando = False
+            print(f"[ERROR] Generación interrumpida por un error en la etapa '{error[0]}': {error[1]}")
         
         print(f"\n[EXITO] Generación detenida")
         print(f"    Total generados: {self.total_generados}")
-        print(f"    Escenarios únicos: {len(self.escenarios_generados)}")
-        print(f"\n[*] Esperando nuevos comandos...")
         print(f"\n[*] Esperando nuevos comandos...")
     
-    # Cambiar modelo
-    def cambiar_modelo(self, comando):
+    # Arranca el hilo de generacion si no esta corriendo
+    def asegurar_generacion(self):
+        with self.lock_generacion:
+            if self.generando:
+                return
+            self.generando = True
+            self.thread_generacion = threading.Thread(target=self.generacion_continua, daemon=True)
+            self.thread_generacion.start()
+    
+    # Inicia una ejecucion nueva sin detener ni purgar las demas
+    def iniciar_ejecucion(self, comando):
         nombre_archivo = comando.get('modelo') # Obtener modelo nuevo
         
-        if not nombre_archivo:
+        if not nombre_archivo and not comando.get('hash'):
             print("[ERROR] Comando sin especificar modelo")
-            return False
+            return None
         
         print(f"\n{'=' * 60}")
-        print(f" CAMBIO DE MODELO")
+        print(f" NUEVA EJECUCION")
         print(f"{'=' * 60}")
         
-        # Detener generacion actual si existe
-        if self.generando: # Si se estan generando escenarios
-            print(f"[ADVERTENCIA] Deteniendo generacion actual...")
-            self.generando = False  # Indicar que ya no se estan generando escenarios
-            if self.thread_generacion:
-                self.thread_generacion.join(timeout=5)
-        
-        # Cargar nuevo modelo
-        modelo = self.cargar_modelo(nombre_archivo)
-        if not modelo:
-            print(f"[ERROR] No se pudo cargar {nombre_archivo}")
-            return False
+        # Perfil de durabilidad de esta ejecucion (por comando o el de config.py)
+        perfil = comando.get('perfil') or PERFIL_DURABILIDAD
+        try:
+            obtener_perfil(perfil)
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            return None
         
-        self.modelo_actual = modelo
+        # Cargar nuevo modelo del catalogo (el hash manda si el archivo cambio de nombre)
+        entrada = None
+        if comando.get('hash'):
+            entrada = self.cargar_modelo(comando['hash'])
+        if entrada is None and nombre_archivo:
+            entrada = self.cargar_modelo(nombre_archivo)
+        if entrada is None:
+            print(f"[ERROR] No se pudo cargar {nombre_archivo or comando.get('hash')}")
+            return None
+        
+        modelo = self.aplicar_variantes(entrada.modelo, comando)
+        if modelo is None:
+            return None
         
-        # Reiniciar conjunto de escenarios únicos
-        self.escenarios_generados.clear()
-        self.total_generados = 0
+        # Muestreo por importancia / estratificado del comando (reemplaza el del modelo)
+        plan = entrada.plan
+        if comando.get('muestreo') is not None:
+            try:
+                muestreo = normalizar_muestreo(comando['muestreo'], entrada.plan)
+            except ModeloInvalido as e:
+                print(f"[ERROR] {e}")
+                return None
+            plan = aplicar_muestreo(entrada.plan, muestreo)
+            modelo = dict(modelo, muestreo=muestreo)
+        
+        # Barrido de parametros: los ejes viajan con el modelo para que los resultados los lleven
+        barrido = None
+        if comando.get('modo') == 'barrido':
+            try:
+                barrido = PlanBarrido(plan, comando.get('ejes'))
+            except ModeloInvalido as e:
+                print(f"[ERROR] {e}")
+                return None
+            modelo = dict(modelo, barrido={'ejes': barrido.ejes})
+        
+        try:
+            ejecucion = Ejecucion(modelo, perfil,
+                                  peso=comando.get('peso', 1),
+                                  prioridad=comando.get('prioridad', 0),
+                                  run_id=comando.get('run_id'),
+                                  modo=comando.get('modo', 'montecarlo'),
+                                  bloque=comando.get('bloque', SOBOL_BLOQUE),
+                                  plan=plan,
+                                  hash=entrada.hash,
+                                  lote=comando.get('lote'),
+                                  barrido=barrido)
+        except (TypeError, ValueError) as e:
+            print(f"[ERROR] Parametros de ejecucion invalidos: {e}")
+            return None
+        if self.planificador.obtener(ejecucion.run_id):
+            print(f"[ERROR] Ya existe una ejecucion activa con run_id '{ejecucion.run_id}'")
+            return None
+        
+        print(f"[INFORMACION] Ejecucion: {ejecucion.run_id} | Perfil: {perfil} | "
+              f"Peso: {ejecucion.peso} | Prioridad: {ejecucion.prioridad} | Modo: {ejecucion.modo}")
+        if ejecucion.ponderado is not None:
+            propuestas = [nombre for nombre, config in plan if config.get('propuesta')]
+            print(f"[INFORMACION] Muestreo ponderado: {ejecucion.ponderado.total_estratos} estratos | "
+                  f"Propuestas: {', '.join(propuestas) or '-'}")
+        elif es_ponderado(plan):
+            print(f"[ADVERTENCIA] Modo {ejecucion.modo}: se ignoran propuestas y estratos (distribucion nominal)")
+        if barrido is not None:
+            print(f"[INFORMACION] Barrido: {len(barrido)} puntos | " +
+                  ' | '.join(f"{clave}: {len(valores)} valores" for clave, valores in barrido.ejes))
+            print(f"    Primer punto: {etiqueta_punto(barrido.puntos[0])} | "
+                  f"Ultimo: {etiqueta_punto(barrido.puntos[-1])}")
         
         # Publicar modelo
-        if not self.publicar_modelo():
-            return False
+        if not self.publicar_modelo(ejecucion):
+            return None
         
-        # Esperar a que workers lean el modelo
-        print(f"[*] Esperando 2 segundos para que workers lean el modelo...")
-        time.sleep(2)
+        # Bitacora para repetir la ejecucion con los mismos escenarios (comando 'replay')
+        if comando.get('grabar', GRABAR_ESCENARIOS):
+            ruta = ruta_bitacora(ejecucion.run_id)
+            try:
+                ejecucion.bitacora = EscritorBitacora(ruta, {
+                    'run_id': ejecucion.run_id, 'modo': ejecucion.modo, 'perfil': perfil,
+                    'bloque': ejecucion.bloque, 'modelo': modelo, 'hash': ejecucion.hash,
+                })
+                print(f"[INFORMACION] Grabando escenarios en '{ruta}'")
+            except OSError as e:
+                print(f"[ADVERTENCIA] No se pudo crear la bitacora '{ruta}': {e}")
+        
+        # Los workers leen el modelo en cuanto ven el primer escenario con este run_id
+        self.planificador.agregar(ejecucion)
+        self.asegurar_generacion()
+        
+        print(f"[EXITO] Ejecucion {ejecucion.run_id} iniciada ({len(self.planificador)} activas)")
+        print(f"{'=' * 60}\n")
         
-        # Iniciar generacion continua en thread
-        self.generando = True
-        self.thread_generacion = threading.Thread(target=self.generacion_continua, daemon=True)
-        self.thread_generacion.start()
+        return ejecucion
+    
+    # Variantes: otros modelos del catalogo que se evaluan sobre los mismos escenarios
+    # Regresa el modelo combinado (o el mismo si no hay variantes), None si hay error
+    def aplicar_variantes(self, modelo, comando):
+        if not comando.get('variantes'):
+            return modelo
+        variantes = [self.cargar_modelo(clave) for clave in comando['variantes']]
+        if None in variantes:
+            return None
+        try:
+            modelo = combinar_variantes(modelo, variantes)
+        except ModeloInvalido as e:
+            print(f"[ERROR] {e}")
+            return None
+        print(f"[INFORMACION] Salidas adicionales: {', '.join(modelo['salidas'])}")
+        return modelo
+    
+    # Repite una ejecucion grabada: reenvia los escenarios de su bitacora tal cual (misma seq)
+    # a toda velocidad, sin muestrear. Por defecto con el modelo grabado; con 'modelo'/'hash'
+    # se usa otro del catalogo (p. ej. la formula corregida) siempre que sus variables esten
+    # en la bitacora. Acepta 'variantes', 'perfil', 'peso', 'prioridad' y 'run_id'
+    def replay(self, comando):
+        origen = comando.get('origen')
+        if not origen:
+            print("[ERROR] Comando replay sin 'origen' (run_id grabado)")
+            return None
+        
+        print(f"\n{'=' * 60}")
+        print(f" REPLAY DE {origen}")
+        print(f"{'=' * 60}")
         
-        print(f"[EXITO] Modelo cambiado exitosamente")
+        try:
+            lector = LectorBitacora(ruta_bitacora(origen))
+        except (OSError, BitacoraInvalida) as e:
+            print(f"[ERROR] No se pudo abrir la bitacora de {origen}: {e}")
+            return None
+        cabecera = lector.cabecera
+        
+        modelo, hash = cabecera['modelo'], cabecera.get('hash')
+        if comando.get('modelo') or comando.get('hash'):
+            entrada = self.cargar_modelo(comando['hash']) if comando.get('hash') else None
+            if entrada is None and comando.get('modelo'):
+                entrada = self.cargar_modelo(comando['modelo'])
+            if entrada is None:
+                lector.cerrar()
+                return None
+            faltantes = set(entrada.modelo['variables']) - set(cabecera['modelo']['variables'])
+            if faltantes:
+                print(f"[ERROR] Variables que no estan en la bitacora: {', '.join(sorted(faltantes))}")
+                lector.cerrar()
+                return None
+            modelo, hash = entrada.modelo, entrada.hash
+            if 'barrido' in cabecera['modelo']: # Los escenarios grabados son los de la reticula
+                modelo = dict(modelo, barrido=cabecera['modelo']['barrido'])
+        
+        modelo = self.aplicar_variantes(modelo, comando)
+        if modelo is None:
+            lector.cerrar()
+            return None
+        
+        perfil = comando.get('perfil') or cabecera['perfil']
+        try:
+            obtener_perfil(perfil)
+            ejecucion = Ejecucion(modelo, perfil,
+                                  peso=comando.get('peso', 1),
+                                  prioridad=comando.get('prioridad', 0),
+                                  run_id=comando.get('run_id'),
+                                  modo=cabecera['modo'],
+                                  bloque=cabecera['bloque'],
+                                  hash=hash)
+        except (TypeError, ValueError) as e:
+            print(f"[ERROR] Parametros de replay invalidos: {e}")
+            lector.cerrar()
+            return None
+        if self.planificador.obtener(ejecucion.run_id):
+            print(f"[ERROR] Ya existe una ejecucion activa con run_id '{ejecucion.run_id}'")
+            lector.cerrar()
+            return None
+        ejecucion.fuente = lector
+        
+        print(f"[INFORMACION] Ejecucion: {ejecucion.run_id} | Modelo: {modelo.get('nombre', 'N/A')} "
+              f"({hash}) | Perfil: {perfil} | Modo: {ejecucion.modo}")
+        if not self.publicar_modelo(ejecucion):
+            lector.cerrar()
+            return None
+        
+        self.planificador.agregar(ejecucion)
+        self.asegurar_generacion()
+        print(f"[EXITO] Replay {ejecucion.run_id} iniciado ({len(self.planificador)} activas)")
         print(f"{'=' * 60}\n")
+        return ejecucion
+    
+    # Fin de la bitacora de un replay: la ejecucion deja el planificador sin avisar a los
+    # workers (sus escenarios ya publicados se siguen procesando hasta que expire el modelo)
+    def terminar_replay(self, ejecucion):
+        if self.planificador.quitar(ejecucion.run_id) is ejecucion:
+            ejecucion.fuente.cerrar()
+            print(f"[EXITO] Replay {ejecucion.run_id} terminado "
+                  f"({ejecucion.total_generados} escenarios reenviados)")
+    
+    # Cierra la bitacora que graba una ejecucion o la que lee un replay
+    def cerrar_bitacora(self, ejecucion):
+        if ejecucion.bitacora is not None:
+            ejecucion.bitacora.cerrar()
+            print(f"[INFORMACION] Bitacora '{ejecucion.bitacora.ruta}' cerrada "
+                  f"({ejecucion.bitacora.registros} registros)")
+        if ejecucion.fuente is not None:
+            ejecucion.fuente.cerrar()
+    
+    # Cierra las bitacoras de ejecuciones finalizadas antes de 'antes_de' (todas si es None)
+    # Se espera a un reporte del pipeline para que se graben los lotes que iban en camino
+    def cerrar_bitacoras(self, antes_de=None):
+        with self.lock_generacion:
+            cerrar = [e for momento, e in self.bitacoras_finalizadas
+                      if antes_de is None or momento < antes_de]
+            self.bitacoras_finalizadas = [(momento, e) for momento, e in self.bitacoras_finalizadas
+                                          if e not in cerrar]
+        for ejecucion in cerrar:
+            self.cerrar_bitacora(ejecucion)
+    
+    # Quita una ejecucion del planificador y avisa a los workers
+    # Los escenarios que queden en las colas de esa ejecucion se descartan en los workers
+    def finalizar_ejecucion(self, run_id):
+        ejecucion = self.planificador.quitar(run_id)
+        if ejecucion is None:
+            return False
+        # La bitacora que graba (o la que lee un replay) se cierra despues del siguiente reporte:
+        # un hilo de muestreo o de serializacion puede estar usandola todavia
+        if ejecucion.bitacora is not None or ejecucion.fuente is not None:
+            with self.lock_generacion:
+                self.bitacoras_finalizadas.append((time.time(), ejecucion))
+        print(f"[EXITO] Ejecucion {run_id} finalizada ({ejecucion.total_generados} escenarios, "
+              f"{len(ejecucion.escenarios_generados)} unicos)")
+        self.gestor.publicar(
+            exchange=EXCHANGE_CONTROL_WORKERS,
+            routing_key=CONTROL_TODOS,
+            body=json.dumps({'comando': 'ejecucion_detenida', 'run_id': run_id}).encode('utf-8')
+        )
+        return True
+    
+    # Detiene una ejecucion por comando (borra su modelo para que nadie lo vuelva a leer)
+    def detener_ejecucion(self, run_id):
+        if not self.planificador.obtener(run_id):
+            print(f"[ADVERTENCIA] No hay ejecucion activa con run_id '{run_id}'")
+            return False
+        try:
+            self.gestor.canal().queue_delete(queue=cola_modelo(run_id))
+        except pika.exceptions.ChannelClosedByBroker:
+            pass
+        return self.finalizar_ejecucion(run_id)
+    
+    # Cambiar modelo (compatibilidad): inicia una ejecucion nueva
+    # Con 'reemplazar' se detiene antes la ejecucion indicada; las demas siguen
+    def cambiar_modelo(self, comando):
+        if comando.get('reemplazar'):
+            self.detener_ejecucion(comando['reemplazar'])
+        return self.iniciar_ejecucion(comando) is not None
+    
+    # Perfilar productor o reenviar la solicitud a los workers
+    def perfilar(self, comando):
+        destino = comando.get('destino', 'productor')
+        modo = comando.get('modo', 'cprofile')
+        segundos = comando.get('segundos', 10)
+        top = comando.get('top', 25)
+        
+        if destino == 'worker':
+            # Reenviar al worker indicado (o a todos) por el exchange de control
+            worker_id = str(comando.get('worker_id', CONTROL_TODOS))
+            self.gestor.publicar(
+                exchange=EXCHANGE_CONTROL_WORKERS,
+                routing_key=worker_id,
+                body=json.dumps(comando).encode('utf-8')
+            )
+            print(f"[EXITO] Solicitud de perfilado reenviada a worker '{worker_id}'")
+            return True
+        
+        if modo == 'cprofile' and not self.generando:
+            print(f"[ADVERTENCIA] No hay generacion en curso, no hay nada que perfilar con cProfile")
+            return False
         
+        # En modo muestreo se observan todos los hilos (todas las etapas del pipeline)
+        return self.perfilador.solicitar(modo, segundos, top)
+    
+    # Cambia el numero de shards en caliente sin purgar nada
+    # Los shards nuevos se enlazan al exchange; los que sobran se desenlazan
+    # y los workers los siguen drenando hasta vaciarlos
+    def ajustar_shards(self, comando):
+        try:
+            k = int(comando.get('k', 0))
+        except (TypeError, ValueError):
+            k = 0
+        if k < 1:
+            print(f"[ERROR] Numero de shards invalido: {comando.get('k')}")
+            return False
+        
+        channel = self.gestor.canal()
+        for perfil in PERFILES:
+            for shard in range(self.shards, k):
+                declarar_shard_escenarios(channel, perfil, shard)
+            for shard in range(k, self.shards):
+                desenlazar_shard_escenarios(channel, perfil, shard)
+        print(f"[EXITO] Shards de escenarios: {self.shards} -> {k}")
+        self.shards = k
+        
+        # Avisar a todos los workers para que consuman sus shards nuevos
+        self.gestor.publicar(
+            exchange=EXCHANGE_CONTROL_WORKERS,
+            routing_key=CONTROL_TODOS,
+            body=json.dumps({'comando': 'ajustar_shards', 'k': k}).encode('utf-8')
+        )
         return True
     
     # Escuchar comandos de la cola de comandos (del dashboard)
@@ -338,11 +822,24 @@ class ProductorServicio:
                 
                 print(f"\n[INFORMACION] Comando recibido: {tipo}")
                 
-                if tipo == 'cambiar_modelo': # Comando camiar modelo
+                if tipo == 'iniciar_ejecucion': # Comando iniciar ejecucion (run)
+                    self.iniciar_ejecucion(comando)
+                elif tipo == 'barrido': # Comando barrido de parametros (una ejecucion)
+                    self.iniciar_ejecucion(dict(comando, modo='barrido'))
+                elif tipo == 'replay': # Comando repetir una ejecucion grabada
+                    self.replay(comando)
+                elif tipo == 'cambiar_modelo': # Comando camiar modelo
                     self.cambiar_modelo(comando)
-                elif tipo == 'detener': # Comando detener
+                elif tipo == 'detener_ejecucion': # Comando detener una ejecucion
+                    self.detener_ejecucion(comando.get('run_id'))
+                elif tipo == 'detener': # Comando detener (todas las ejecuciones)
                     print(f"[ADVERTENCIA] Comando de detención recibido")
-                    self.generando = False
+                    for ejecucion in self.planificador.listar():
+                        self.detener_ejecucion(ejecucion.run_id)
+                elif tipo == 'perfilar': # Comando perfilar productor o worker
+                    self.perfilar(comando)
+                elif tipo == 'ajustar_shards': # Comando cambiar numero de shards
+                    self.ajustar_shards(comando)
                 else:
                     print(f"[ADVERTENCIA] Comando desconocido: {tipo}")
                 
@@ -352,31 +849,25 @@ class ProductorServicio:
                 print(f"[ERROR] Error procesando comando: {e}")
                 ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
         
-        self.channel.basic_qos(prefetch_count=1) # Solo puede consumir un comando
-        self.channel.basic_consume(
-            queue=QUEUE_COMANDOS,
-            on_message_callback=callback,
-            auto_ack=False
-        )
+        # Solo puede consumir un comando. Se vuelve a registrar si se reconecta
+        self.gestor.consumir(QUEUE_COMANDOS, callback, prefetch=1)
+        # Expiraciones de modelos en la misma conexion (llegan en cuanto el broker las expira)
+        self.gestor.consumir(QUEUE_MODELOS_EXPIRADOS, self.procesar_expiracion, prefetch=10)
+        # Latidos de los workers: costo por escenario para el tamano de lote (sin ack)
+        self.gestor.consumir(f"{EXCHANGE_LATIDOS}.productor", self.procesar_latido, prefetch=0, auto_ack=True)
         
         try:
-            self.channel.start_consuming()
+            self.gestor.iniciar_consumo()
         except KeyboardInterrupt:
-            self.channel.stop_consuming()
+            self.gestor.detener_consumo()
     
     # Cierra conexiones principal y de hilo
     def cerrar(self):
         self.generando = False
-        if self.connection_generacion and self.connection_generacion.is_open:
-            try:
-                self.connection_generacion.close()
-            except:
-                pass
-        if self.connection:
-            try:
-                self.connection.close()
-            except:
-                pass
+        for ejecucion in self.planificador.limpiar():
+            self.cerrar_bitacora(ejecucion)
+        self.cerrar_bitacoras()
+        self.gestor.cerrar()
 
 def main():
     productor = ProductorServicio() # Creamos al productor
@@ -401,16 +892,13 @@ def main():
         # Conectar
         productor.conectar() # Conectamos a RabbitMQ y creamos colas
         
-        # Verificar que existan archivos de modelos
-        modelos_disponibles = []
-        for archivo in ['modelo_tiempo.json', 'modelo_area.json', 'modelo_beneficio.json']:
-            if Path(archivo).exists():
-                modelos_disponibles.append(archivo)
+        # Modelos validos del catalogo
+        modelos_disponibles = productor.catalogo.escanear()
         
         if modelos_disponibles:
-            print(f"\n[INFORMACION] Modelos disponibles:")
-            for modelo in modelos_disponibles:
-                print(f"    - {modelo}")
+            print(f"\n[INFORMACION] Modelos disponibles en '{DIRECTORIO_MODELOS}':")
+            for entrada in modelos_disponibles:
+                print(f"    - {entrada.archivo}: {entrada.nombre} ({entrada.hash})")
             print()
         
         print("[INFORMACION] Esperando comandos desde Dashboard para cargar modelo...")
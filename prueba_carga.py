@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# PRUEBA DE CARGA
+# Descripcion: Prueba de punta a punta (productor -> workers -> resultados) con carga sostenida
+# Arranca el broker local (broker_local.py) en este proceso, el productor y N workers como
+# procesos aparte, y un consumidor de resultados sin interfaz. Durante la prueba registra:
+#   - Latencia de punta a punta (generacion del escenario -> resultado recibido)
+#   - Rendimiento (resultados por segundo) frente a la tasa pedida
+#   - Memoria (RSS) de cada proceso en el tiempo y mensajes en cola
+#   - Mensajes perdidos o duplicados (contadores del broker + (run_id, seq) de cada resultado)
+#   - Tasa (EWMA), prefetch y estado de cada worker segun sus latidos
+# Opcionalmente cambia de modelo a la mitad (inicia otra ejecucion y detiene la primera)
+# Con --supervisor los workers los administra supervisor.py (escala de 1 a --workers)
+# Termina con codigo 1 si se supera algun umbral
+#
+# Uso: python prueba_carga.py --workers 4 --tasa 500 --duracion 120 --cambio modelo_area.json
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+from config import (PERFILES, PERFIL_DURABILIDAD, QUEUE_COMANDOS, HILOS_MUESTREO, BROKER_LOCAL_PUERTO,
+                    EXCHANGE_LATIDOS)
+from broker_local import iniciar_servidor
+from colas import colas_resultados, declarar_cola
+from conexion import GestorConexion
+from bitmap import BitmapRoaring
+from agregador import MonitorWorkers, expandir_resultado, seqs_fallidos
+from supervisor import comando_script
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_CARGA = os.path.join(DIRECTORIO, 'carga') # Logs y reportes de cada prueba
+
+def argumentos():
+    parser = argparse.ArgumentParser(description="Prueba de carga de punta a punta")
+    parser.add_argument('--workers', type=int, default=4, help="Numero de workers")
+    parser.add_argument('--supervisor', action='store_true',
+                        help="Los workers los arranca y escala supervisor.py (de 1 a --workers)")
+    parser.add_argument('--tasa', type=float, default=200, help="Escenarios por segundo")
+    parser.add_argument('--duracion', type=float, default=60, help="Segundos de generacion")
+    parser.add_argument('--modelo', default='modelo_beneficio.json', help="Modelo de la prueba")
+    parser.add_argument('--cambio', default=None, help="Modelo al que se cambia a la mitad de la prueba")
+    parser.add_argument('--perfil', default=PERFIL_DURABILIDAD, choices=list(PERFILES))
+    parser.add_argument('--drenado', type=float, default=30, help="Segundos maximos para vaciar colas al final")
+    parser.add_argument('--puerto', type=int, default=BROKER_LOCAL_PUERTO, help="Puerto del broker local")
+    # Umbrales
+    parser.add_argument('--max-p99', type=float, default=2.0, help="Latencia p99 maxima (s)")
+    parser.add_argument('--max-perdidos', type=int, default=0, help="Mensajes perdidos maximos")
+    parser.add_argument('--max-duplicados', type=int, default=0, help="Resultados duplicados maximos")
+    parser.add_argument('--min-rendimiento', type=float, default=0.9,
+                        help="Fraccion minima de la tasa pedida que debe llegar como resultados")
+    parser.add_argument('--max-crecimiento-rss', type=float, default=200,
+                        help="Crecimiento maximo de RSS por proceso (MB) despues del calentamiento")
+    return parser.parse_args()
+
+# RSS actual de un proceso en MB (None si no se puede leer)
+def leer_rss(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith('VmRSS:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+# Arranca un script del proyecto en otro proceso con valores de config.py sustituidos
+def lanzar(script, args, sustituciones, log):
+    return subprocess.Popen(comando_script(script, args, sustituciones), cwd=DIRECTORIO,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+# Detiene un proceso con SIGINT (como Ctrl+C) y lo mata si no termina
+def detener(proceso, espera=10):
+    if proceso.poll() is not None:
+        return
+    proceso.send_signal(signal.SIGINT)
+    try:
+        proceso.wait(timeout=espera)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+        proceso.wait()
+
+class ConsumidorResultados:
+    def __init__(self, direccion):
+        self.gestor = GestorConexion('Carga', broker_local=direccion)
+        self.gestor.agregar_topologia(self.declarar_topologia)
+        self.lock = threading.Lock()
+        self.vistos = defaultdict(BitmapRoaring) # run_id -> seqs recibidos
+        self.recibidos = 0 # Resultados de escenarios (un mensaje puede traer varios)
+        self.duplicados = 0
+        self.fallidos = 0 # Escenarios que el worker no pudo evaluar (no son huecos)
+        self.mensajes = 0 # Mensajes de resultados (para cuadrar con los contadores del broker)
+        self.mensajes_duplicados = 0
+        self.latencias = [] # Segundos entre la generacion del escenario y el resultado
+        self.por_segundo = defaultdict(int) # segundo -> resultados
+        self.monitor = MonitorWorkers() # Latidos de los workers
+        self.cola_latidos = f"{EXCHANGE_LATIDOS}.carga"
+
+    def declarar_topologia(self, channel):
+        channel.queue_declare(queue=QUEUE_COMANDOS, durable=True)
+        for perfil in PERFILES:
+            for cola in colas_resultados(perfil):
+                declarar_cola(channel, cola, perfil)
+        channel.exchange_declare(exchange=EXCHANGE_LATIDOS, exchange_type='fanout')
+        channel.queue_declare(queue=self.cola_latidos, auto_delete=True)
+        channel.queue_bind(queue=self.cola_latidos, exchange=EXCHANGE_LATIDOS)
+
+    def iniciar(self):
+        threading.Thread(target=self.escuchar, daemon=True).start()
+
+    def escuchar(self):
+        for perfil in PERFILES:
+            for cola in colas_resultados(perfil):
+                self.gestor.consumir(cola, self.callback, prefetch=500)
+        self.gestor.consumir(self.cola_latidos, self.callback_latido, prefetch=0, auto_ack=True)
+        self.gestor.iniciar_consumo()
+
+    def callback(self, ch, method, props, body):
+        ahora = time.time()
+        data = json.loads(body.decode('utf-8'))
+        with self.lock:
+            self.mensajes += 1
+            duplicado = False
+            for resultado in expandir_resultado(data):
+                self.recibidos += 1
+                self.por_segundo[int(ahora)] += 1
+                seq = resultado.get('seq')
+                if seq is not None:
+                    if not self.vistos[resultado.get('run_id')].agregar(seq):
+                        self.duplicados += 1
+                        duplicado = True
+            for seq in seqs_fallidos(data):
+                if self.vistos[data.get('run_id')].agregar(seq):
+                    self.fallidos += 1
+            if duplicado:
+                self.mensajes_duplicados += 1
+            if data.get('enviado'):
+                self.latencias.append(ahora - data['enviado'])
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    def callback_latido(self, ch, method, props, body):
+        with self.lock:
+            self.monitor.registrar_latido(json.loads(body.decode('utf-8')))
+
+    # Tasa, prefetch y estado de cada worker
+    def workers(self):
+        with self.lock:
+            self.monitor.revisar()
+            return {worker_id: {'tasa': datos['tasa'], 'prefetch': datos['prefetch'],
+                                'estado': datos['estado']}
+                    for worker_id, datos in sorted(self.monitor.workers.items())}
+
+    def enviar_comando(self, comando):
+        self.gestor.publicar(routing_key=QUEUE_COMANDOS, body=json.dumps(comando).encode('utf-8'))
+
+# Suma contadores de las colas cuyo nombre empieza con el prefijo
+def sumar(estadisticas, prefijo, campo):
+    return sum(datos[campo] for nombre, datos in estadisticas['colas'].items() if nombre.startswith(prefijo))
+
+def main():
+    args = argumentos()
+    marca = time.strftime("%Y%m%d_%H%M%S")
+    directorio = os.path.join(DIRECTORIO_CARGA, marca)
+    os.makedirs(directorio, exist_ok=True)
+    direccion = f"127.0.0.1:{args.puerto}"
+
+    print("=" * 60)
+    print(f" PRUEBA DE CARGA - {args.workers} workers, {args.tasa:.0f} esc/s, {args.duracion:.0f}s")
+    print("=" * 60)
+
+    broker = iniciar_servidor(args.puerto)
+    consumidor = ConsumidorResultados(direccion)
+    consumidor.gestor.conexion() # Declara comandos y resultados antes de arrancar a los demas
+    consumidor.iniciar()
+
+    # El productor y los workers usan el broker local; el TTL del modelo cubre toda la prueba
+    sustituciones = {
+        'BROKER_LOCAL': direccion,
+        'ESCENARIO_INTERVAL': HILOS_MUESTREO / args.tasa,
+        'MODELO_TTL': int((args.duracion + args.drenado + 60) * 1000),
+    }
+    procesos = {}
+    logs = []
+    if args.supervisor:
+        # Los logs de los workers quedan junto a los de la prueba
+        sustituciones_supervisor = dict(sustituciones, DIRECTORIO_SUPERVISOR=directorio)
+        lanzados = [('supervisor', 'supervisor.py',
+                     ['--min', '1', '--max', str(args.workers), '--config', json.dumps(sustituciones)])]
+    else:
+        lanzados = [(f"worker_{i}", 'worker.py', [str(i)]) for i in range(1, args.workers + 1)]
+    for nombre, script, extra in [('productor', 'productor.py', [])] + lanzados:
+        log = open(os.path.join(directorio, f"{nombre}.log"), 'w')
+        logs.append(log)
+        procesos[nombre] = lanzar(script, extra,
+                                  sustituciones_supervisor if nombre == 'supervisor' else sustituciones, log)
+
+    serie = [] # Muestras en el tiempo
+    detenidas = set() # Ejecuciones que la prueba detuvo (sus escenarios pendientes se descartan)
+    try:
+        # Esperar a que el productor escuche comandos y cada worker tenga su cola de control
+        limite = time.time() + 30
+        while time.time() < limite:
+            colas = broker.estadisticas()['colas']
+            workers_listos = sum(1 for nombre in colas if nombre.startswith('control_worker.'))
+            if f"{QUEUE_COMANDOS}" in colas and workers_listos >= (1 if args.supervisor else args.workers) and \
+                    any(nombre.startswith('escenarios') for nombre in colas):
+                break
+            time.sleep(0.2)
+        else:
+            print("[ERROR] El productor o los workers no arrancaron (ver logs)")
+        time.sleep(1) # El productor registra su consumidor de comandos
+
+        consumidor.enviar_comando({'comando': 'iniciar_ejecucion', 'modelo': args.modelo,
+                                   'perfil': args.perfil, 'run_id': 'carga1'})
+        inicio = time.time()
+        cambio_hecho = args.cambio is None
+        print(f"[*] Generando durante {args.duracion:.0f}s (logs en {directorio})")
+
+        while time.time() - inicio < args.duracion:
+            time.sleep(1)
+            transcurrido = time.time() - inicio
+            estadisticas = broker.estadisticas()
+            muestra = {
+                't': round(transcurrido, 1),
+                'rss': {nombre: leer_rss(p.pid) for nombre, p in procesos.items()},
+                'escenarios_en_cola': sumar(estadisticas, 'escenarios', 'listos'),
+                'resultados_en_cola': sumar(estadisticas, 'resultados', 'listos'),
+                'recibidos': consumidor.recibidos,
+                'workers': consumidor.workers(),
+            }
+            serie.append(muestra)
+            if int(transcurrido) % 5 == 0:
+                print(f"    t={transcurrido:5.0f}s | recibidos {muestra['recibidos']:>8} | "
+                      f"escenarios en cola {muestra['escenarios_en_cola']:>6} | "
+                      f"RSS productor {muestra['rss']['productor'] or 0:.0f} MB")
+
+            # Cambio de modelo a la mitad: nueva ejecucion y se detiene la anterior
+            if not cambio_hecho and transcurrido >= args.duracion / 2:
+                consumidor.enviar_comando({'comando': 'iniciar_ejecucion', 'modelo': args.cambio,
+                                           'perfil': args.perfil, 'run_id': 'carga2'})
+                consumidor.enviar_comando({'comando': 'detener_ejecucion', 'run_id': 'carga1'})
+                detenidas.add('carga1')
+                cambio_hecho = True
+                print(f"[*] Cambio de modelo: {args.modelo} -> {args.cambio}")
+
+        # Fin de la generacion: detener el productor y dejar que los workers vacien las colas
+        fin_generacion = time.time()
+        detener(procesos['productor'])
+        limite = time.time() + args.drenado
+        ultimo = -1
+        while time.time() < limite:
+            estadisticas = broker.estadisticas()
+            pendientes = (sumar(estadisticas, 'escenarios', 'listos') +
+                          sumar(estadisticas, 'escenarios', 'sin_confirmar') +
+                          sumar(estadisticas, 'resultados', 'listos'))
+            if pendientes == 0 and consumidor.recibidos == ultimo:
+                break
+            ultimo = consumidor.recibidos
+            time.sleep(1)
+    finally:
+        for nombre, proceso in procesos.items():
+            # El supervisor drena a sus workers antes de terminar
+            detener(proceso, espera=30 if nombre == 'supervisor' else 10)
+        for log in logs:
+            log.close()
+        consumidor.gestor.cerrar()
+
+    # Contabilidad de mensajes con los contadores del broker
+    estadisticas = broker.estadisticas()
+    sin_ruta = sum(estadisticas['sin_ruta'].values())
+    escenarios_publicados = sumar(estadisticas, 'escenarios', 'publicados')
+    escenarios_confirmados = sumar(estadisticas, 'escenarios', 'confirmados')
+    escenarios_pendientes = (sumar(estadisticas, 'escenarios', 'listos') +
+                             sumar(estadisticas, 'escenarios', 'sin_confirmar'))
+    escenarios_expirados = sumar(estadisticas, 'escenarios', 'expirados')
+    resultados_publicados = sumar(estadisticas, 'resultados', 'publicados')
+    resultados_pendientes = (sumar(estadisticas, 'resultados', 'listos') +
+                             sumar(estadisticas, 'resultados', 'sin_confirmar'))
+    # Mensajes de escenarios con ack pero sin resultado (los de ejecuciones detenidas se esperan)
+    # Los contadores del broker son por mensaje: se comparan con los mensajes recibidos
+    descartados = escenarios_confirmados - (resultados_publicados - consumidor.mensajes_duplicados)
+    # Huecos de secuencia en las ejecuciones que no se detuvieron
+    huecos = sum(vistos.huecos() for run_id, vistos in consumidor.vistos.items()
+                 if run_id not in detenidas)
+    perdidos = (sin_ruta + escenarios_pendientes + escenarios_expirados +
+                max(resultados_publicados - consumidor.mensajes - resultados_pendientes, 0) +
+                (huecos if detenidas else max(descartados, 0)))
+
+    latencias = np.array(consumidor.latencias) if consumidor.latencias else np.zeros(1)
+    percentiles = {f"p{p}": float(np.percentile(latencias, p)) for p in (50, 90, 99, 99.9)}
+    # Solo segundos completos dentro de la generacion (los extremos quedan a medias)
+    segundos = range(int(inicio) + 1, int(fin_generacion))
+    en_ventana = sum(consumidor.por_segundo.get(s, 0) for s in segundos)
+    rendimiento = en_ventana / len(segundos) if segundos else 0
+
+    # Crecimiento de memoria despues del calentamiento (primer cuarto de la prueba)
+    crecimiento = {}
+    if serie:
+        base = serie[len(serie) // 4]['rss']
+        for nombre, rss in serie[-1]['rss'].items():
+            if rss is not None and base.get(nombre) is not None:
+                crecimiento[nombre] = rss - base[nombre]
+
+    reporte = {
+        'parametros': vars(args),
+        'latencia_s': dict(percentiles, max=float(latencias.max())),
+        'rendimiento_res_s': rendimiento,
+        'escenarios_publicados': escenarios_publicados,
+        'resultados_recibidos': consumidor.recibidos,
+        'mensajes_recibidos': consumidor.mensajes,
+        'duplicados': consumidor.duplicados,
+        'fallidos': consumidor.fallidos,
+        'perdidos': perdidos,
+        'descartados_por_cambio': max(descartados, 0) if detenidas else 0,
+        'sin_ruta': sin_ruta,
+        'expirados': escenarios_expirados,
+        'crecimiento_rss_mb': crecimiento,
+        'workers': serie[-1]['workers'] if serie else {},
+        'serie': serie,
+    }
+
+    fallas = []
+    if percentiles['p99'] > args.max_p99:
+        fallas.append(f"latencia p99 {percentiles['p99']:.3f}s > {args.max_p99}s")
+    if perdidos > args.max_perdidos:
+        fallas.append(f"{perdidos} mensajes perdidos > {args.max_perdidos}")
+    if consumidor.duplicados > args.max_duplicados:
+        fallas.append(f"{consumidor.duplicados} duplicados > {args.max_duplicados}")
+    if rendimiento < args.min_rendimiento * args.tasa:
+        fallas.append(f"rendimiento {rendimiento:.0f} res/s < {args.min_rendimiento:.0%} de {args.tasa:.0f}")
+    for nombre, mb in crecimiento.items():
+        if mb > args.max_crecimiento_rss:
+            fallas.append(f"RSS de {nombre} crecio {mb:.0f} MB > {args.max_crecimiento_rss} MB")
+    reporte['fallas'] = fallas
+
+    with open(os.path.join(directorio, 'reporte.json'), 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=2)
+
+    print()
+    print("=" * 60)
+    print(" RESULTADOS")
+    print("=" * 60)
+    print(f"Latencia (s): " + ' | '.join(f"{k} {v:.4f}" for k, v in reporte['latencia_s'].items()))
+    print(f"Rendimiento: {rendimiento:,.0f} res/s (pedido {args.tasa:,.0f} esc/s)")
+    print(f"Mensajes de escenarios publicados: {escenarios_publicados} | "
+          f"Resultados recibidos: {consumidor.recibidos} (en {consumidor.mensajes} mensajes)")
+    print(f"Perdidos: {perdidos} | Duplicados: {consumidor.duplicados} | Fallidos: {consumidor.fallidos} | "
+          f"Descartados por cambio de modelo: {reporte['descartados_por_cambio']}")
+    for nombre, mb in sorted(crecimiento.items()):
+        print(f"RSS {nombre}: {serie[-1]['rss'][nombre]:.0f} MB ({mb:+.1f} MB desde el calentamiento)")
+    for worker_id, datos in reporte['workers'].items():
+        tasa = f"{datos['tasa']:.0f} esc/s" if datos['tasa'] is not None else "-"
+        print(f"Worker {worker_id}: {tasa} | prefetch {datos['prefetch']} | {datos['estado']}")
+    print(f"Reporte: {os.path.join(directorio, 'reporte.json')}")
+
+    if fallas:
+        for falla in fallas:
+            print(f"[ERROR] {falla}")
+        sys.exit(1)
+    print("[EXITO] Todos los umbrales se cumplieron")
+
+if __name__ == "__main__":
+    main()
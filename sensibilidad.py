@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SENSIBILIDAD
+# Descripcion: Analisis de sensibilidad global (indices de Sobol) por lotes
+# El productor genera dos matrices independientes A y B (n filas x k variables) y de ellas
+# las matrices AB_i (A con la columna i tomada de B). Todo viaja como un solo lote:
+#   filas = A (n) + B (n) + AB_1 (n) + ... + AB_k (n)
+# El worker evalua cada fila con la formula del modelo y regresa f(A), f(B) y f(AB_i)
+# El agregador acumula los estimadores de forma incremental:
+#   - Primer orden (Saltelli 2010): S_i  = E[(f(B) - c) (f(AB_i) - f(A))] / V
+#     (c = media acumulada; como E[f(AB_i) - f(A)] = 0 no cambia el estimador, pero evita que
+#     una media grande domine la varianza)
+#   - Total (Jansen):               ST_i = E[(f(A) - f(AB_i))^2] / 2 / V
+# V se acumula centrada (media y suma de cuadrados de las desviaciones, combinando cada lote
+# como en Welford) para no perder precision con salidas de media grande
+# Intervalos de confianza con bootstrap de Poisson: cada replica pesa cada fila con
+# un peso Poisson(1), asi las replicas se actualizan en linea sin guardar los lotes
+
+import numpy as np
+from config import SOBOL_BOOTSTRAP, SOBOL_CONFIANZA
+
+# Filas del lote (A, B y AB_i) a partir de A y B (listas de filas)
+def construir_filas(A, B):
+    k = len(A[0]) if A else 0
+    filas = [list(fila) for fila in A] + [list(fila) for fila in B]
+    for i in range(k):
+        for fila_a, fila_b in zip(A, B):
+            fila = list(fila_a)
+            fila[i] = fila_b[i]
+            filas.append(fila)
+    return filas
+
+class IndicesSobol:
+    def __init__(self, variables, replicas=SOBOL_BOOTSTRAP, semilla=None):
+        self.variables = list(variables) # Nombres en el orden de las columnas
+        k = len(self.variables)
+        r = replicas + 1 # La replica 0 (pesos = 1) es la estimacion puntual
+        self.rng = np.random.default_rng(semilla)
+        self.muestras = 0 # Filas base (n) acumuladas
+        self.peso = np.zeros(r) # Suma de pesos por replica (cada peso cuenta f(A) y f(B))
+        self.media = np.zeros(r) # Media ponderada de f(A) y f(B)
+        self.m2 = np.zeros(r) # Suma ponderada de cuadrados de las desviaciones a la media
+        self.primer_orden = np.zeros((r, k)) # Suma de (f(B) - media) (f(AB_i) - f(A))
+        self.total = np.zeros((r, k)) # Suma de (f(A) - f(AB_i))^2 / 2
+
+    # Acumula un lote evaluado (fA y fB de largo n, fAB de k x n)
+    def agregar(self, fA, fB, fAB):
+        fA = np.asarray(fA, dtype=float)
+        fB = np.asarray(fB, dtype=float)
+        fAB = np.asarray(fAB, dtype=float)
+        n = fA.shape[0]
+
+        pesos = self.rng.poisson(1.0, size=(self.peso.shape[0], n)).astype(float)
+        pesos[0] = 1.0
+
+        # Media y m2 del lote y combinacion con lo acumulado (Chan et al., Welford por lotes)
+        peso_lote = pesos.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            media_lote = np.where(peso_lote > 0, pesos @ (fA + fB) / (2 * peso_lote), 0.0)
+            m2_lote = (pesos * ((fA - media_lote[:, None]) ** 2 + (fB - media_lote[:, None]) ** 2)).sum(axis=1)
+            peso_total = self.peso + peso_lote
+            delta = media_lote - self.media
+            self.media = np.where(peso_total > 0, self.media + delta * peso_lote / peso_total, 0.0)
+            self.m2 += m2_lote + np.where(peso_total > 0,
+                                          delta ** 2 * 2 * self.peso * peso_lote / peso_total, 0.0)
+
+        self.muestras += n
+        self.peso = peso_total
+        self.primer_orden += (pesos * (fB - self.media[:, None])) @ (fAB - fA).T
+        self.total += pesos @ ((fA - fAB) ** 2 / 2).T
+
+    # Indices por variable: {'variable': {'S1', 'S1_ic', 'ST', 'ST_ic'}}
+    # Los intervalos son percentiles de las replicas bootstrap (SOBOL_CONFIANZA)
+    def indices(self):
+        if self.muestras < 2:
+            return {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            varianza = self.m2 / (2 * self.peso)
+            s1 = self.primer_orden / self.peso[:, None] / varianza[:, None]
+            st = self.total / self.peso[:, None] / varianza[:, None]
+
+        alfa = (1 - SOBOL_CONFIANZA) / 2 * 100
+        resultado = {}
+        for i, variable in enumerate(self.variables):
+            resultado[variable] = {
+                'S1': float(s1[0, i]),
+                'S1_ic': self.intervalo(s1[1:, i], alfa),
+                'ST': float(st[0, i]),
+                'ST_ic': self.intervalo(st[1:, i], alfa),
+            }
+        return resultado
+
+    # Intervalo de percentiles ignorando replicas sin varianza
+    def intervalo(self, replicas, alfa):
+        replicas = replicas[np.isfinite(replicas)]
+        if replicas.size == 0:
+            return (float('nan'), float('nan'))
+        return (float(np.percentile(replicas, alfa)), float(np.percentile(replicas, 100 - alfa)))
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SUPERVISOR DE WORKERS
+# Descripcion: Administra un grupo de procesos worker en este host
+#   - Escala entre un minimo y un maximo segun los mensajes en cola y la tasa de consumo
+#   - Reinicia los workers que se caen (con espera exponencial si se vuelven a caer pronto)
+#   - Asigna IDs unicos: no usa los de workers que publican latidos (de este u otro host)
+#   - Para reducir drena al worker (comando 'drenar'): termina el escenario en curso, confirma
+#     sus resultados y lo que tenia sin empezar vuelve a la cola
+# Workers necesarios = (llegada + en cola / SUPERVISOR_DRENADO) / (capacidad por worker * SUPERVISOR_UTILIZACION)
+#   - Todo se mide en mensajes (un mensaje puede traer un lote de escenarios)
+#   - llegada: tasa de consumo (latidos de los workers) + crecimiento de la cola
+#   - capacidad por worker: mediana de las tasas medidas mientras hay cola (workers saturados);
+#     antes de la primera medicion, 1 / tiempo por mensaje (mediana de los latidos)
+# Se reduce solo si se necesitan menos workers durante SUPERVISOR_ESPERA_BAJA segundos: asi se
+# recuperan los workers ociosos cuando las ejecuciones terminan o expira su modelo (MODELO_TTL)
+# La salida de cada worker va a DIRECTORIO_SUPERVISOR/worker_<id>.log
+#
+# Uso: python supervisor.py [--min N] [--max N] [--id-base N]
+
+import argparse
+import json
+import math
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+import pika
+from config import (BROKER_LOCAL, PERFILES, NUM_SHARDS, EXCHANGE_LATIDOS, EXCHANGE_CONTROL_WORKERS,
+                    SUPERVISOR_MIN_WORKERS, SUPERVISOR_MAX_WORKERS, SUPERVISOR_INTERVALO,
+                    SUPERVISOR_DRENADO, SUPERVISOR_UTILIZACION, SUPERVISOR_ESPERA_BAJA,
+                    SUPERVISOR_ESPERA_DRENADO, SUPERVISOR_BACKOFF_BASE, SUPERVISOR_BACKOFF_MAX,
+                    SUPERVISOR_ESTABLE, DIRECTORIO_SUPERVISOR)
+from colas import colas_escenarios
+from conexion import GestorConexion, ERRORES_CONEXION
+from agregador import MonitorWorkers, ewma
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Linea de comandos para correr un script del proyecto con valores de config.py sustituidos
+def comando_script(script, args, sustituciones=None):
+    if not sustituciones:
+        return [sys.executable, '-u', script] + list(args)
+    codigo = ("import runpy, sys, config\n"
+              f"for clave, valor in {sustituciones!r}.items():\n"
+              "    setattr(config, clave, valor)\n"
+              f"sys.argv = {[script] + list(args)!r}\n"
+              f"runpy.run_path({script!r}, run_name='__main__')\n")
+    return [sys.executable, '-u', '-c', codigo]
+
+# Un proceso worker administrado por el supervisor
+class ProcesoWorker:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.proceso = None # subprocess.Popen (None mientras espera para reiniciarse)
+        self.inicio = None # Momento en que arranco el proceso actual
+        self.fallos = 0 # Caidas seguidas (se reinicia si el proceso dura SUPERVISOR_ESTABLE)
+        self.reinicio = None # Momento en que se vuelve a arrancar despues de una caida
+        self.drenando = None # Momento en que se pidio drenar
+        self.interrumpido = False # Ya se mando SIGINT por no terminar de drenar
+
+class Supervisor:
+    def __init__(self, minimo=SUPERVISOR_MIN_WORKERS, maximo=SUPERVISOR_MAX_WORKERS, id_base=1,
+                 sustituciones=None):
+        self.minimo = max(int(minimo), 0)
+        self.maximo = max(int(maximo), self.minimo)
+        self.id_base = int(id_base)
+        self.sustituciones = sustituciones or {} # Valores de config.py para los workers
+        broker_local = self.sustituciones.get('BROKER_LOCAL', BROKER_LOCAL)
+        self.gestor = GestorConexion('Supervisor', broker_local=broker_local)
+        self.monitor = MonitorWorkers() # Latidos de todos los workers (de este u otros hosts)
+        self.cola_latidos = f"{EXCHANGE_LATIDOS}.supervisor.{uuid.uuid4().hex[:8]}"
+        self.workers = {} # worker_id -> ProcesoWorker
+        self.shards = NUM_SHARDS # Shards de escenarios que se miden (crece con 'ajustar_shards')
+        self.en_cola_anterior = None # (momento, mensajes en cola) de la medicion anterior
+        self.crecimiento = None # Mensajes/s que crece la cola (EWMA)
+        self.capacidad = None # Mensajes/s de un worker saturado (EWMA, se mide cuando hay cola)
+        self.bajo_desde = None # Desde cuando se necesitan menos workers de los que hay
+        self.corriendo = True
+
+    def declarar_topologia(self, channel):
+        channel.exchange_declare(exchange=EXCHANGE_CONTROL_WORKERS, exchange_type='direct')
+        channel.exchange_declare(exchange=EXCHANGE_LATIDOS, exchange_type='fanout')
+        channel.queue_declare(queue=self.cola_latidos, auto_delete=True)
+        channel.queue_bind(queue=self.cola_latidos, exchange=EXCHANGE_LATIDOS)
+
+    # Lee los latidos acumulados desde la ultima vuelta
+    def leer_latidos(self):
+        channel = self.gestor.canal()
+        while True:
+            method, props, body = channel.basic_get(queue=self.cola_latidos, auto_ack=True)
+            if method is None:
+                return
+            latido = json.loads(body.decode('utf-8'))
+            self.monitor.registrar_latido(latido)
+            if latido.get('shards'):
+                self.shards = max(self.shards, max(latido['shards']) + 1)
+
+    # Mensajes de escenarios listos en las colas de todos los perfiles y shards
+    def mensajes_en_cola(self):
+        total = 0
+        for perfil in PERFILES:
+            for cola in colas_escenarios(perfil, self.shards):
+                try:
+                    method = self.gestor.canal('consultas').queue_declare(queue=cola, passive=True)
+                    total += method.method.message_count
+                except pika.exceptions.ChannelClosedByBroker:
+                    pass # Cola que aun no existe: el canal se recrea en la siguiente consulta
+        return total
+
+    # ID libre mas bajo: ni de este supervisor ni de un worker con latidos recientes
+    def nuevo_id(self):
+        ocupados = set(self.workers) | {worker_id for worker_id, datos in self.monitor.workers.items()
+                                        if datos['estado'] != 'caido'}
+        worker_id = self.id_base
+        while str(worker_id) in ocupados:
+            worker_id += 1
+        return str(worker_id)
+
+    # Arranca (o vuelve a arrancar) el proceso de un worker
+    def lanzar(self, worker):
+        os.makedirs(DIRECTORIO_SUPERVISOR, exist_ok=True)
+        with open(os.path.join(DIRECTORIO_SUPERVISOR, f"worker_{worker.worker_id}.log"), 'a') as log:
+            worker.proceso = subprocess.Popen(
+                comando_script('worker.py', [worker.worker_id], self.sustituciones),
+                cwd=DIRECTORIO, stdout=log, stderr=subprocess.STDOUT)
+        worker.inicio = time.time()
+        worker.reinicio = None
+
+    def agregar_worker(self):
+        worker = ProcesoWorker(self.nuevo_id())
+        self.workers[worker.worker_id] = worker
+        self.lanzar(worker)
+        print(f"[EXITO] Worker {worker.worker_id} iniciado (pid {worker.proceso.pid})")
+
+    # Pide al worker que termine de forma ordenada (si espera reinicio solo se olvida)
+    def drenar(self, worker):
+        if worker.proceso is None:
+            del self.workers[worker.worker_id]
+            print(f"[INFORMACION] Worker {worker.worker_id} retirado (esperaba reinicio)")
+            return
+        worker.drenando = time.time()
+        try:
+            self.gestor.publicar(exchange=EXCHANGE_CONTROL_WORKERS, routing_key=worker.worker_id,
+                                 body=json.dumps({'comando': 'drenar'}).encode('utf-8'))
+            print(f"[INFORMACION] Drenando worker {worker.worker_id}")
+        except Exception as e:
+            print(f"[ADVERTENCIA] No se pudo pedir drenar al worker {worker.worker_id} ({e}), se interrumpe")
+            worker.proceso.send_signal(signal.SIGINT)
+            worker.interrumpido = True
+
+    # Revisa los procesos: drenados que terminaron, caidas y reinicios pendientes
+    def revisar_procesos(self, ahora):
+        for worker in list(self.workers.values()):
+            if worker.proceso is None:
+                if ahora >= worker.reinicio:
+                    self.lanzar(worker)
+                    print(f"[INFORMACION] Worker {worker.worker_id} reiniciado (pid {worker.proceso.pid})")
+                continue
+
+            codigo = worker.proceso.poll()
+            if codigo is None:
+                # Drenado que no termina: primero SIGINT y despues se mata
+                if worker.drenando is not None:
+                    transcurrido = ahora - worker.drenando
+                    if transcurrido > 2 * SUPERVISOR_ESPERA_DRENADO:
+                        print(f"[ADVERTENCIA] Worker {worker.worker_id} no termino de drenar, se mata")
+                        worker.proceso.kill()
+                    elif transcurrido > SUPERVISOR_ESPERA_DRENADO and not worker.interrumpido:
+                        worker.proceso.send_signal(signal.SIGINT)
+                        worker.interrumpido = True
+                continue
+
+            if worker.drenando is not None:
+                del self.workers[worker.worker_id]
+                print(f"[EXITO] Worker {worker.worker_id} drenado y detenido")
+                continue
+
+            # Caida: se reinicia con espera exponencial si se cae seguido
+            worker.fallos = worker.fallos + 1 if ahora - worker.inicio < SUPERVISOR_ESTABLE else 1
+            espera = min(SUPERVISOR_BACKOFF_BASE * 2 ** (worker.fallos - 1), SUPERVISOR_BACKOFF_MAX)
+            worker.proceso = None
+            worker.reinicio = ahora + espera
+            print(f"[ERROR] Worker {worker.worker_id} se cayo (codigo {codigo}), "
+                  f"reinicio en {espera:.0f}s (fallos seguidos: {worker.fallos})")
+
+    # Workers necesarios segun la cola y la tasa de consumo (sin limitar a minimo/maximo)
+    def necesarios(self, ahora, en_cola, activos):
+        if self.en_cola_anterior is not None and ahora > self.en_cola_anterior[0]:
+            cambio = (en_cola - self.en_cola_anterior[1]) / (ahora - self.en_cola_anterior[0])
+            self.crecimiento = ewma(self.crecimiento, cambio)
+        self.en_cola_anterior = (ahora, en_cola)
+
+        latidos = [self.monitor.workers.get(w.worker_id) for w in activos]
+        latidos = [d for d in latidos if d is not None and d['estado'] != 'caido']
+        # Todo en mensajes (la cola se mide en mensajes; un mensaje puede traer varios escenarios)
+        tasa = sum(d['tasa_mensajes'] or 0 for d in latidos)
+        tasas = [d['tasa_mensajes'] for d in latidos if d['tasa_mensajes']]
+        if en_cola > 0 and tasas:
+            # Con cola los workers estan saturados: su tasa es su capacidad (incluye el broker)
+            self.capacidad = ewma(self.capacidad, statistics.median(tasas))
+        if self.capacidad is None:
+            tiempos = [d['tiempo_mensaje'] for d in latidos if d.get('tiempo_mensaje')]
+            if not tiempos:
+                # Sin mediciones todavia: un worker mas mientras haya cola
+                return len(activos) + 1 if en_cola > 0 else len(activos)
+            capacidad = 1 / statistics.median(tiempos)
+        else:
+            capacidad = self.capacidad
+        llegada = max(tasa + (self.crecimiento or 0), 0)
+        return math.ceil((llegada + en_cola / SUPERVISOR_DRENADO) / (SUPERVISOR_UTILIZACION * capacidad))
+
+    # Ajusta el numero de workers entre minimo y maximo
+    def escalar(self, ahora, en_cola):
+        activos = [w for w in self.workers.values() if w.drenando is None]
+        objetivo = min(max(self.necesarios(ahora, en_cola, activos), self.minimo), self.maximo)
+
+        if objetivo > len(activos):
+            self.bajo_desde = None
+            print(f"[INFORMACION] Escalando {len(activos)} -> {objetivo} workers ({en_cola} mensajes en cola)")
+            for _ in range(objetivo - len(activos)):
+                self.agregar_worker()
+        elif objetivo < len(activos):
+            if self.bajo_desde is None:
+                self.bajo_desde = ahora
+            elif ahora - self.bajo_desde >= SUPERVISOR_ESPERA_BAJA:
+                self.bajo_desde = None
+                print(f"[INFORMACION] Reduciendo {len(activos)} -> {objetivo} workers ({en_cola} mensajes en cola)")
+                # Primero los que esperan reinicio, despues los de ID mas alto
+                activos.sort(key=lambda w: (w.proceso is not None, -int(w.worker_id) if w.worker_id.isdigit() else 0))
+                for worker in activos[:len(activos) - objetivo]:
+                    self.drenar(worker)
+        else:
+            self.bajo_desde = None
+
+    # Ciclo del supervisor
+    def ejecutar(self):
+        self.gestor.agregar_topologia(self.declarar_topologia)
+        self.gestor.conexion()
+        print(f"[EXITO] Supervisor conectado | workers: {self.minimo} a {self.maximo}")
+        for _ in range(self.minimo):
+            self.agregar_worker()
+
+        ultimo_reporte = 0
+        while self.corriendo:
+            ahora = time.time()
+            self.revisar_procesos(ahora)
+            try:
+                self.leer_latidos()
+                self.monitor.revisar(ahora)
+                en_cola = self.mensajes_en_cola()
+                self.escalar(ahora, en_cola)
+                if ahora - ultimo_reporte >= 10:
+                    ultimo_reporte = ahora
+                    estados = ', '.join(
+                        f"{w.worker_id}:{'drenando' if w.drenando else 'esperando' if w.proceso is None else 'activo'}"
+                        for w in self.workers.values())
+                    print(f"[INFORMACION] En cola: {en_cola} | Crecimiento: {self.crecimiento or 0:+.1f} msg/s | "
+                          f"Workers: {estados or '-'}")
+            except ERRORES_CONEXION as e:
+                print(f"[ADVERTENCIA] Supervisor - Conexion perdida ({e!r}), se reintenta")
+                self.gestor.descartar()
+            self.gestor.dormir(SUPERVISOR_INTERVALO)
+
+    # Drena todos los workers y espera a que terminen (los que no, se matan)
+    def detener(self):
+        self.corriendo = False
+        for worker in list(self.workers.values()):
+            if worker.drenando is None:
+                self.drenar(worker)
+        limite = time.time() + SUPERVISOR_ESPERA_DRENADO
+        for worker in list(self.workers.values()):
+            try:
+                worker.proceso.wait(timeout=max(limite - time.time(), 0.1))
+            except subprocess.TimeoutExpired:
+                print(f"[ADVERTENCIA] Worker {worker.worker_id} no termino de drenar, se mata")
+                worker.proceso.kill()
+                worker.proceso.wait()
+        self.workers.clear()
+        self.gestor.cerrar()
+
+def main():
+    parser = argparse.ArgumentParser(description="Supervisor de procesos worker")
+    parser.add_argument('--min', type=int, default=SUPERVISOR_MIN_WORKERS, help="Workers minimos")
+    parser.add_argument('--max', type=int, default=SUPERVISOR_MAX_WORKERS, help="Workers maximos")
+    parser.add_argument('--id-base', type=int, default=1, help="Primer ID de worker a usar")
+    parser.add_argument('--config', default=None,
+                        help="JSON con valores de config.py para los workers (p. ej. BROKER_LOCAL)")
+    args = parser.parse_args()
+
+    supervisor = Supervisor(args.min, args.max, args.id_base,
+                            json.loads(args.config) if args.config else None)
+
+    def signal_handler(sig, frame):
+        supervisor.corriendo = False
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    print("=" * 60)
+    print(" SUPERVISOR DE WORKERS - Simulación Montecarlo")
+    print("=" * 60)
+    try:
+        supervisor.ejecutar()
+    except Exception as e:
+        print(f"\n[ERROR] {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        print("\n[*] Deteniendo workers...")
+        supervisor.detener()
+        print("[EXITO] Supervisor detenido")
+
+if __name__ == "__main__":
+    main()
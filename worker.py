@@ -1,168 +1,589 @@
 import pika
 import json
+import math
 import time
 import sys
 import os
+import threading
+from collections import OrderedDict
 from config import *
+from perfilado import Perfilador
+from colas import (obtener_perfil, cola_escenarios, cola_resultados, colas_resultados,
+                   cola_modelo, shard_resultados, shards_de_worker, declarar_cola,
+                   propiedades_mensaje)
+from conexion import GestorConexion
+from catalogo import ModeloInvalido, texto_formula
+from evaluacion import crear_evaluador
+from agregador import ewma
 
 class Worker:
     def __init__(self, worker_id):
         self.worker_id = worker_id # ID del worker
-        self.modelo = None # Modelo cargado
-        self.connection = None # Conexion
-        self.channel = None # Canal
+        # Modelos cargados por ejecucion (run_id -> modelo), los mas recientes al final
+        self.modelos = OrderedDict()
+        # Ejecuciones detenidas o expiradas: sus escenarios se descartan
+        self.ejecuciones_detenidas = OrderedDict()
+        # Conexion con reconexion automatica
+        self.gestor = GestorConexion(f"Worker {worker_id}")
         self.escenarios_procesados = 0 # Numero de escenarios procesados
-        self.esperando_modelo = True # Bandera para esperar el modelo
+        self.mensajes_procesados = 0 # Mensajes procesados (un mensaje puede llevar varios escenarios)
+        self.costos = {} # run_id -> segundos de evaluacion por escenario (EWMA), se reporta en el latido
+        self.perfilador = Perfilador(f"worker_{worker_id}") # Perfilado bajo demanda
+        self.cola_control = f"{QUEUE_CONTROL_WORKER}.{worker_id}" # Cola de control propia
+        # Perfil confirmed-batch: resultados en canal transaccional y acks pendientes
+        self.ultimo_tag_pendiente = None # Ultimo delivery tag sin ack (ack multiple al confirmar)
+        self.pendientes_confirmacion = 0 # Resultados publicados sin confirmar
+        self.temporizador_confirmacion = False # Hay un call_later de confirmacion programado
+        self.shards = set() # Shards de escenarios que consume este worker
+        # Prefetch adaptativo y latidos
+        self.prefetch = PREFETCH_INICIAL # Limite actual de escenarios sin ack (todo el canal)
+        self.tiempo_mensaje = None # Segundos por mensaje (EWMA)
+        self.rtt = None # Segundos de ida y vuelta al broker (EWMA)
+        self.confirmados_recientes = False # Llegaron escenarios confirmed-batch desde el ultimo latido
+        self.temporizador_latido = False # Hay un call_later de latido programado
+        self.drenando = False # Comando 'drenar': no se empiezan mas escenarios y el worker termina
         
     # Conectarse a RabbitMQ
     def conectar(self):
-        creds = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
-        params = pika.ConnectionParameters(host=RABBIT_HOST, credentials=creds)
-        self.connection = pika.BlockingConnection(params)
-        self.channel = self.connection.channel()
+        # La topologia se vuelve a declarar en cada (re)conexion
+        self.gestor.agregar_topologia(self.declarar_topologia)
+        # Tras reconectar, los acks pendientes del canal anterior ya no son validos
+        self.gestor.al_reconectar.append(self.reiniciar_confirmacion)
+        # Los temporizadores de la conexion anterior se perdieron
+        self.gestor.al_reconectar.append(self.reiniciar_latido)
+        self.gestor.conexion()
         
-        # Declarar solo colas de escenarios y resultados
+        print(f"[EXITO] Worker {self.worker_id} conectado a RabbitMQ")
+    
+    # Declara las colas y exchanges que usa el worker
+    def declarar_topologia(self, channel):
+        # Declarar solo colas de escenarios (shards asignados) y resultados de cada perfil
         # NO declarar cola de modelo (la crea el productor con TTL)
-        self.channel.queue_declare(queue=QUEUE_ESCENARIOS, durable=True)
-        self.channel.queue_declare(queue=QUEUE_RESULTADOS, durable=True)
-        
-        # Configurar QoS para procesar un mensaje a la vez
-        self.channel.basic_qos(prefetch_count=1)
+        # Los bindings del exchange de escenarios los administra el productor
+        for perfil in PERFILES:
+            for shard in self.shards:
+                declarar_cola(channel, cola_escenarios(perfil, shard), perfil)
+            for cola in colas_resultados(perfil):
+                declarar_cola(channel, cola, perfil)
         
-        print(f"[EXITO] Worker {self.worker_id} conectado a RabbitMQ")
+        # Cola de control propia: recibe comandos dirigidos a este worker o a todos
+        channel.exchange_declare(exchange=EXCHANGE_CONTROL_WORKERS, exchange_type='direct')
+        channel.queue_declare(queue=self.cola_control, auto_delete=True)
+        channel.queue_bind(queue=self.cola_control, exchange=EXCHANGE_CONTROL_WORKERS,
+                           routing_key=str(self.worker_id))
+        channel.queue_bind(queue=self.cola_control, exchange=EXCHANGE_CONTROL_WORKERS,
+                           routing_key=CONTROL_TODOS)
+        channel.exchange_declare(exchange=EXCHANGE_LATIDOS, exchange_type='fanout')
     
-    # El modelo se lee una sola vez de la cola de modelos
-    def leer_modelo(self):
-        print(f"[*] Worker {self.worker_id} esperando modelo...")
+    # El modelo de cada ejecucion se lee una sola vez de su cola de modelo
+    def leer_modelo(self, run_id):
+        print(f"[*] Worker {self.worker_id} leyendo modelo de la ejecucion {run_id}...")
         
         try:
             # Se usa get() para que el worker pregunte si hay mensaje (modelo) en la cola
             # En caso de que haya modelo, se envia al worker
-            method_frame, header_frame, body = self.channel.basic_get(queue=QUEUE_MODELO, auto_ack=False)
+            channel = self.gestor.canal()
+            # Si otro worker lo esta leyendo en ese momento la cola se ve vacia: se reintenta
+            for intento in range(INTENTOS_MODELO):
+                method_frame, header_frame, body = channel.basic_get(queue=cola_modelo(run_id), auto_ack=False)
+                if method_frame:
+                    break
+                time.sleep(ESPERA_MODELO)
             
             if method_frame:
                 try:
-                    self.modelo = json.loads(body.decode('utf-8')) # Cargamos modelo
+                    modelo = json.loads(body.decode('utf-8')) # Cargamos modelo
+                    # La formula se valida y compila una sola vez por ejecucion (backend de config)
+                    modelo['evaluador'] = crear_evaluador(modelo)
                     
                     # Devolvemos a la cola por medio de un nack para conservar TTL
                     # No lo consume, por lo que otro worker puede consultar el modelo
                     # Solo se hace una vez
-                    self.channel.basic_nack(
+                    channel.basic_nack(
                         delivery_tag=method_frame.delivery_tag,
                         requeue=True  # El mensaje vuelve con su TTL original
                     )
                     
-                    print(f"[EXITO] Worker {self.worker_id} - Modelo recibido: {self.modelo.get('nombre', 'N/A')}")
-                    print(f"    Fórmula: {self.modelo['formula']}")
-                    print(f"    Variables: {list(self.modelo['variables'].keys())}")
-                    self.esperando_modelo = False # Ya tiene modelo cargado
-                    return True
+                    print(f"[EXITO] Worker {self.worker_id} - Modelo recibido: {modelo.get('nombre', 'N/A')} "
+                          f"(ejecucion {run_id})")
+                    print(f"    Fórmula: {texto_formula(modelo)}")
+                    print(f"    Variables: {list(modelo['variables'].keys())}")
+                    
+                    # Guardar en cache (se olvidan los mas viejos)
+                    self.modelos[run_id] = modelo
+                    while len(self.modelos) > MAX_MODELOS_WORKER:
+                        viejo, _ = self.modelos.popitem(last=False)
+                        self.costos.pop(viejo, None)
+                    
+                    # Si el productor ya usa mas shards de los que consumimos, sumarlos
+                    if modelo.get('shards', 0) > len(self.shards):
+                        self.consumir_shards(modelo['shards'])
+                    return modelo
+                except ModeloInvalido as e:
+                    print(f"[ERROR] Worker {self.worker_id} - Modelo rechazado: {e}")
+                    channel.basic_nack(delivery_tag=method_frame.delivery_tag, requeue=True)
+                    return None
                 except Exception as e:
                     print(f"[ERROR] Worker {self.worker_id} - Error al leer modelo: {e}")
                     if method_frame:
-                        self.channel.basic_nack(delivery_tag=method_frame.delivery_tag, requeue=True)
-                    return False
+                        channel.basic_nack(delivery_tag=method_frame.delivery_tag, requeue=True)
+                    return None
             else:
-                return False
+                return None
+        except pika.exceptions.ChannelClosedByBroker:
+            # La cola de modelo ya no existe (ejecucion expirada o detenida)
+            return None
         except Exception as e:
             print(f"[ERROR] Worker {self.worker_id} - Error al consultar cola de modelo: {e}")
-            return False
+            return None
+    
+    # Modelo de una ejecucion: de la cache o leyendolo de su cola
+    # None si la ejecucion ya no esta activa
+    def obtener_modelo(self, run_id):
+        modelo = self.modelos.get(run_id)
+        if modelo is not None:
+            return modelo
+        if run_id in self.ejecuciones_detenidas:
+            return None
+        modelo = self.leer_modelo(run_id)
+        if modelo is None:
+            print(f"[ADVERTENCIA] Worker {self.worker_id} - Ejecucion {run_id} sin modelo "
+                  f"(expirada o detenida), sus escenarios se descartan")
+            self.marcar_detenida(run_id)
+        return modelo
+    
+    # Olvida el modelo de una ejecucion y descarta sus escenarios pendientes
+    def marcar_detenida(self, run_id):
+        self.modelos.pop(run_id, None)
+        self.costos.pop(run_id, None)
+        self.ejecuciones_detenidas[run_id] = True
+        while len(self.ejecuciones_detenidas) > MAX_MODELOS_WORKER * 4:
+            self.ejecuciones_detenidas.popitem(last=False)
     
     # Evalua el modelo con los valores del escenario
-    def evaluar_modelo(self, escenario):
+    # Regresa un valor por salida del modelo (la principal primero)
+    def evaluar_modelo(self, modelo, escenario):
         try:
-            # Crear contexto de variables para eval
-            contexto = escenario.copy()
-            
-            # Evaluar la formula (sin funciones internas de Python)
-            resultado = eval(self.modelo['formula'], {"__builtins__": {}}, contexto)
-            
-            return resultado
+            # Evaluar las formulas ya compiladas (sin funciones internas de Python)
+            return modelo['evaluador'].evaluar(escenario)
         except Exception as e:
             print(f"[ERROR] Worker {self.worker_id} - Error al evaluar: {e}")
             return None
     
-    # Procesa escenarios de la cola
-    def procesar_escenarios(self):
-        print(f"[*] Worker {self.worker_id} procesando escenarios...\n")
+    # Evalua varios escenarios de un mensaje (modo montecarlo) en una sola llamada al backend
+    # Si el lote falla se evalua fila por fila para no perder los escenarios buenos
+    # Regresa una lista de valores por escenario (None en los que no se pudieron evaluar)
+    def evaluar_lote_escenarios(self, modelo, lote):
+        variables = lote['variables']
+        try:
+            return modelo['evaluador'].evaluar_lote(variables, lote['filas']).tolist()
+        except Exception:
+            return [self.evaluar_modelo(modelo, dict(zip(variables, fila))) for fila in lote['filas']]
+    
+    # Registra el costo de evaluacion por escenario de una ejecucion
+    def registrar_costo(self, run_id, segundos, escenarios):
+        if escenarios:
+            self.costos[run_id] = ewma(self.costos.get(run_id), segundos / escenarios)
+    
+    # Indicador (0 o 1) del evento de cola del modelo ('muestreo' -> 'evento'); None si no tiene
+    def evaluar_evento(self, modelo, valor):
+        evento = (modelo.get('muestreo') or {}).get('evento')
+        if not evento:
+            return None
+        if 'menor' in evento:
+            return int(valor < evento['menor'])
+        return int(valor > evento['mayor'])
+    
+    # Evalua un lote de Saltelli (modo sensibilidad) con la misma formula del modelo
+    # Todas las filas van juntas al backend de evaluacion (numpy/numba evaluan por columnas)
+    # Los indices se calculan con la salida principal; las demas salidas se regresan evaluadas
+    # en las filas de A y B (muestras independientes) para compararlas en pares
+    # Regresa {'variables', 'fA', 'fB', 'fAB'[, 'salidas']} o None si alguna fila no se pudo evaluar
+    def evaluar_lote_sensibilidad(self, modelo, lote):
+        variables = lote['variables']
+        n = lote['n']
+        evaluador = modelo['evaluador']
+        try:
+            matriz = evaluador.evaluar_lote(variables, lote['filas'])
+        except Exception as e:
+            print(f"[ERROR] Worker {self.worker_id} - Error al evaluar lote: {e}")
+            return None
+        valores = matriz[:, 0].tolist()
+        k = len(variables)
+        sobol = {
+            'variables': variables,
+            'fA': valores[:n],
+            'fB': valores[n:2 * n],
+            'fAB': [valores[(2 + i) * n:(3 + i) * n] for i in range(k)]
+        }
+        if len(evaluador.salidas) > 1:
+            sobol['salidas'] = {nombre: matriz[:2 * n, j].tolist()
+                                for j, nombre in enumerate(evaluador.salidas) if j > 0}
+        return sobol
+    
+    # Procesa comandos de control (llegan en el mismo hilo que consume escenarios)
+    def procesar_control(self, ch, method, props, body):
+        try:
+            comando = json.loads(body.decode('utf-8'))
+            tipo = comando.get('comando')
+            
+            if tipo == 'perfilar':
+                modo = comando.get('modo', 'cprofile')
+                segundos = comando.get('segundos', 10)
+                if self.perfilador.solicitar(modo, segundos, comando.get('top', 25),
+                                             threading.get_ident()):
+                    if modo == 'cprofile':
+                        # Este es el hilo que consume escenarios: se activa aqui mismo
+                        # y se detiene con un temporizador de la propia conexion
+                        self.perfilador.punto_control()
+                        self.gestor.call_later(float(segundos), self.perfilador.finalizar)
+            elif tipo == 'ejecucion_detenida':
+                # El productor termino la ejecucion: descartar lo que quede de ella
+                self.marcar_detenida(comando['run_id'])
+                print(f"[INFORMACION] Worker {self.worker_id} - Ejecucion {comando['run_id']} detenida")
+            elif tipo == 'drenar':
+                # Salida ordenada (supervisor): se termina el escenario en curso, se confirman los
+                # resultados pendientes y lo recibido sin empezar vuelve a la cola al cerrar
+                self.drenando = True
+                self.gestor.detener_consumo()
+                print(f"[INFORMACION] Worker {self.worker_id} - Drenando: no se toman mas escenarios")
+            elif tipo == 'ajustar_shards':
+                # El productor cambio K: consumir los shards nuevos que nos tocan
+                # (los que dejan de recibir escenarios se siguen drenando)
+                self.consumir_shards(int(comando['k']))
+            else:
+                print(f"[ADVERTENCIA] Worker {self.worker_id} - Comando de control desconocido: {tipo}")
+        except Exception as e:
+            print(f"[ERROR] Worker {self.worker_id} - Error en comando de control: {e}")
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+    
+    # Canal transaccional para los resultados del perfil confirmed-batch (transacciones en vez de
+    # publisher confirms: ver PERFILES en config.py)
+    def canal_confirmado(self):
+        return self.gestor.canal('confirmado', preparar=lambda ch: ch.tx_select())
+    
+    # Confirma el lote de resultados (confirmed-batch): commit de la transaccion
+    # y despues ack multiple de los escenarios que los originaron
+    def confirmar_lote(self):
+        self.temporizador_confirmacion = False
+        if self.pendientes_confirmacion == 0:
+            return
+        self.canal_confirmado().tx_commit()
+        self.gestor.canal('consumo').basic_ack(delivery_tag=self.ultimo_tag_pendiente, multiple=True)
+        self.pendientes_confirmacion = 0
+        self.ultimo_tag_pendiente = None
+    
+    # Tras una reconexion la transaccion sin commit se perdio y los escenarios
+    # sin ack vuelven a la cola: solo hay que olvidar el lote pendiente
+    def reiniciar_confirmacion(self):
+        self.pendientes_confirmacion = 0
+        self.ultimo_tag_pendiente = None
+        self.temporizador_confirmacion = False
+    
+    # Publica un resultado por el camino del perfil y confirma el escenario
+    def publicar_resultado(self, ch, method, perfil, shard, resultado_completo):
+        body = json.dumps(resultado_completo).encode('utf-8')
+        cola = cola_resultados(perfil, shard_resultados(shard))
         
-        def callback(ch, method, props, body):
-            try:
-                # Decodificar escenario
-                escenario = json.loads(body.decode('utf-8'))
-                
-                # VERIFICAR: Las variables del escenario coinciden con el modelo?
-                variables_escenario = set(escenario.keys())
-                variables_modelo = set(self.modelo['variables'].keys())
-                
-                if variables_escenario != variables_modelo:
-                    # Modelo cambio, necesitamos recargar
-                    print(f"\n[ADVERTENCIA] Worker {self.worker_id} - Detectado cambio de modelo")
-                    print(f"    Variables esperadas: {variables_modelo}")
-                    print(f"    Variables recibidas: {variables_escenario}")
-                    print(f"[*] Recargando modelo...\n")
-                    
-                    # Recargar modelo
-                    if self.leer_modelo():
-                        print(f"[EXITO] Worker {self.worker_id} - Modelo actualizado: {self.modelo['nombre']}")
-                        # Reiniciar contador de escenarios procesados
-                        self.escenarios_procesados = 0
-                    else:
-                        print(f"[ADVERTENCIA] Worker {self.worker_id} - No se pudo recargar modelo")
-                        # Rechazar mensaje y continuar
-                        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-                        return
-                
-                # Evaluar modelo
-                resultado = self.evaluar_modelo(escenario)
-                
-                if resultado is not None:
-                    # Preparar resultado completo
-                    resultado_completo = {
-                        "worker_id": self.worker_id,
-                        "escenario": escenario,
-                        "resultado": round(resultado, 4),
-                        "timestamp": time.time(),
-                        "modelo": self.modelo.get('nombre', 'N/A')
+        if not obtener_perfil(perfil)['confirmado']:
+            ch.basic_publish(
+                exchange='',
+                routing_key=cola,
+                body=body,
+                properties=propiedades_mensaje(perfil)
+            )
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+        
+        # confirmed-batch: el ack del escenario espera a que el resultado quede confirmado
+        self.canal_confirmado().basic_publish(
+            exchange='',
+            routing_key=cola,
+            body=body,
+            properties=propiedades_mensaje(perfil)
+        )
+        self.pendientes_confirmacion += 1
+        self.ultimo_tag_pendiente = method.delivery_tag
+        
+        if self.pendientes_confirmacion >= LOTE_CONFIRMACION:
+            self.confirmar_lote()
+        elif not self.temporizador_confirmacion:
+            self.temporizador_confirmacion = True
+            self.gestor.call_later(INTERVALO_CONFIRMACION, self.confirmar_lote)
+    
+    # Procesa un escenario recibido del shard indicado
+    def procesar_escenario(self, ch, method, body, perfil, shard):
+        try:
+            # Decodificar escenario y su ejecucion
+            mensaje = json.loads(body.decode('utf-8'))
+            run_id = mensaje['run_id']
+            escenario = mensaje.get('escenario')
+            
+            # Modelo de la ejecucion (se lee la primera vez que aparece su run_id)
+            modelo = self.obtener_modelo(run_id)
+            if modelo is None:
+                # Ejecucion terminada: el escenario ya no sirve
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                return
+            
+            # Lote de sensibilidad: un solo resultado con todas las evaluaciones del lote
+            if 'sobol' in mensaje:
+                sobol = self.evaluar_lote_sensibilidad(modelo, mensaje['sobol'])
+                if sobol is None:
+                    ch.basic_ack(delivery_tag=method.delivery_tag)
+                    return
+                self.publicar_resultado(ch, method, perfil, shard, {
+                    "worker_id": self.worker_id,
+                    "run_id": run_id,
+                    "sobol": sobol,
+                    "seq": mensaje.get('seq'),
+                    "enviado": mensaje.get('enviado'),
+                    "timestamp": time.time(),
+                    "modelo": modelo.get('nombre', 'N/A')
+                })
+                self.escenarios_procesados += len(mensaje['sobol']['filas'])
+                self.mensajes_procesados += 1
+                return
+            
+            # Barrido: escenarios base evaluados en cada punto de la reticula (salida principal)
+            # Los ejes del modelo viajan en el resultado para que el agregador arme los puntos
+            if 'barrido' in mensaje:
+                inicio = time.perf_counter()
+                filas = self.evaluar_lote_escenarios(modelo, mensaje['barrido'])
+                self.registrar_costo(run_id, time.perf_counter() - inicio, len(filas))
+                # Se publica aunque ningun punto se haya podido evaluar (todo None): el
+                # agregador cuenta los fallidos y la seq no queda como hueco
+                evaluadas = sum(valores is not None for valores in filas)
+                self.publicar_resultado(ch, method, perfil, shard, {
+                    "worker_id": self.worker_id,
+                    "run_id": run_id,
+                    "barrido": {
+                        "ejes": modelo['barrido']['ejes'],
+                        "valores": [None if valores is None else round(valores[0], 4) for valores in filas]
+                    },
+                    "seq": mensaje.get('seq'),
+                    "enviado": mensaje.get('enviado'),
+                    "timestamp": time.time(),
+                    "modelo": modelo.get('nombre', 'N/A')
+                })
+                self.escenarios_procesados += evaluadas
+                self.mensajes_procesados += 1
+                return
+            
+            # Varios escenarios por mensaje: un solo resultado con una lista por campo
+            if 'escenarios' in mensaje:
+                inicio = time.perf_counter()
+                filas = self.evaluar_lote_escenarios(modelo, mensaje['escenarios'])
+                self.registrar_costo(run_id, time.perf_counter() - inicio, len(filas))
+                # Los escenarios que no se pudieron evaluar viajan como None (aunque sean todos)
+                # para que el agregador los cuente como fallidos y no como faltantes
+                evaluadas = [valores for valores in filas if valores is not None]
+                resultado_completo = {
+                    "worker_id": self.worker_id,
+                    "run_id": run_id,
+                    "resultados": [None if valores is None else round(valores[0], 4) for valores in filas],
+                    "seq": mensaje.get('seq'),
+                    "enviado": mensaje.get('enviado'),
+                    "timestamp": time.time(),
+                    "modelo": modelo.get('nombre', 'N/A')
+                }
+                salidas = modelo['evaluador'].salidas
+                if len(salidas) > 1:
+                    resultado_completo["salidas"] = {
+                        nombre: [None if valores is None else round(valores[j], 4) for valores in filas]
+                        for j, nombre in enumerate(salidas) if j > 0
                     }
-                    
-                    # Publicar resultado
-                    ch.basic_publish(
-                        exchange='',
-                        routing_key=QUEUE_RESULTADOS,
-                        body=json.dumps(resultado_completo).encode('utf-8'),
-                        properties=pika.BasicProperties(delivery_mode=2)
-                    )
-                    
-                    self.escenarios_procesados += 1
-                    
-                    # Mostrar progreso cada 10 escenarios
-                    if self.escenarios_procesados % 10 == 0:
-                        print(f"[W{self.worker_id}] Procesados: {self.escenarios_procesados} | Último resultado: {resultado:.4f}")
+                for campo in ('pesos', 'estratos'):
+                    if campo in mensaje:
+                        resultado_completo[campo] = mensaje[campo]
+                if (modelo.get('muestreo') or {}).get('evento'):
+                    resultado_completo["eventos"] = [None if valores is None else self.evaluar_evento(modelo, valores[0])
+                                                     for valores in filas]
+                self.publicar_resultado(ch, method, perfil, shard, resultado_completo)
+                self.escenarios_procesados += len(evaluadas)
+                self.mensajes_procesados += 1
+                return
+            
+            # Evaluar modelo (todas sus salidas sobre el mismo escenario)
+            inicio = time.perf_counter()
+            valores = self.evaluar_modelo(modelo, escenario)
+            self.registrar_costo(run_id, time.perf_counter() - inicio, 1)
+            
+            if valores is not None:
+                resultado = valores[0]
+                # Preparar resultado completo
+                resultado_completo = {
+                    "worker_id": self.worker_id,
+                    "run_id": run_id,
+                    "resultado": round(resultado, 4),
+                    "seq": mensaje.get('seq'),
+                    "enviado": mensaje.get('enviado'),
+                    "timestamp": time.time(),
+                    "modelo": modelo.get('nombre', 'N/A')
+                }
+                # Salidas adicionales (variantes evaluadas con los mismos numeros aleatorios)
+                if len(valores) > 1:
+                    resultado_completo["salidas"] = {
+                        nombre: round(valor, 4)
+                        for nombre, valor in zip(modelo['evaluador'].salidas[1:], valores[1:])
+                    }
+                # Muestreo ponderado: peso y estrato del escenario (y el evento de cola del modelo)
+                for campo in ('peso', 'estrato'):
+                    if campo in mensaje:
+                        resultado_completo[campo] = mensaje[campo]
+                evento = self.evaluar_evento(modelo, resultado)
+                if evento is not None:
+                    resultado_completo["evento"] = evento
                 
-                # Confirmar procesamiento
-                ch.basic_ack(delivery_tag=method.delivery_tag)
+                # Publicar resultado y confirmar procesamiento
+                self.publicar_resultado(ch, method, perfil, shard, resultado_completo)
                 
-            except Exception as e:
-                print(f"[ERROR] Worker {self.worker_id}: {e}")
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                self.escenarios_procesados += 1
+                self.mensajes_procesados += 1
+                
+                # Mostrar progreso cada 10 escenarios
+                if self.escenarios_procesados % 10 == 0:
+                    print(f"[W{self.worker_id}] Procesados: {self.escenarios_procesados} | Último resultado: {resultado:.4f}")
+            else:
+                # No se pudo evaluar: se publica como lote de un escenario con resultado None
+                # (el agregador cuenta la seq como fallida, no como faltante)
+                self.publicar_resultado(ch, method, perfil, shard, {
+                    "worker_id": self.worker_id,
+                    "run_id": run_id,
+                    "resultados": [None],
+                    "seq": mensaje.get('seq'),
+                    "enviado": mensaje.get('enviado'),
+                    "timestamp": time.time(),
+                    "modelo": modelo.get('nombre', 'N/A')
+                })
+                self.mensajes_procesados += 1
+            
+        except Exception as e:
+            print(f"[ERROR] Worker {self.worker_id}: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+    
+    # Callback de consumo que recuerda el perfil y shard de la cola
+    # Mide cuanto tarda cada mensaje (evaluacion + publicacion) para ajustar el prefetch
+    def crear_callback(self, perfil, shard):
+        confirmado = obtener_perfil(perfil)['confirmado']
+        def callback(ch, method, props, body):
+            if self.drenando:
+                return # Sin ack: el broker lo devuelve a la cola al cerrar la conexion
+            inicio = time.perf_counter()
+            self.procesar_escenario(ch, method, body, perfil, shard)
+            self.tiempo_mensaje = ewma(self.tiempo_mensaje, time.perf_counter() - inicio)
+            if confirmado:
+                self.confirmados_recientes = True
+        return callback
+    
+    # Mide el tiempo de ida y vuelta al broker con una operacion sincrona (consulta pasiva)
+    def medir_rtt(self):
+        inicio = time.perf_counter()
+        self.gestor.canal().queue_declare(queue=self.cola_control, passive=True)
+        self.rtt = ewma(self.rtt, time.perf_counter() - inicio)
+    
+    # Recalcula el prefetch: escenarios que el worker procesa mientras un ack va y vuelve,
+    # con margen. Un worker rapido en un enlace lento pide mas; uno lento no acapara escenarios
+    # No baja de PREFETCH_MINIMO por shard consumido; con confirmed-batch no baja de un lote
+    # (el ack espera al lote completo)
+    def ajustar_prefetch(self):
+        if not self.tiempo_mensaje or self.rtt is None:
+            return
+        prefetch = math.ceil(PREFETCH_MARGEN * self.rtt / self.tiempo_mensaje) + 1
+        minimo = LOTE_CONFIRMACION if self.confirmados_recientes else PREFETCH_MINIMO * len(self.shards)
+        prefetch = max(min(prefetch, PREFETCH_MAXIMO), minimo)
+        self.confirmados_recientes = False
+        if prefetch != self.prefetch:
+            self.prefetch = prefetch
+            self.gestor.ajustar_prefetch(prefetch)
+    
+    # Programa el siguiente latido en la conexion de consumo
+    def programar_latido(self):
+        if not self.temporizador_latido:
+            self.temporizador_latido = True
+            self.gestor.call_later(LATIDO_INTERVALO, self.latido)
+    
+    def reiniciar_latido(self):
+        self.temporizador_latido = False
+        self.programar_latido()
+    
+    # Mide, ajusta el prefetch y publica el estado del worker en el exchange de latidos
+    # Corre en el hilo de consumo: si el worker se atora, los latidos se atrasan
+    def latido(self):
+        self.temporizador_latido = False
+        try:
+            self.medir_rtt()
+            self.ajustar_prefetch()
+            self.gestor.canal().basic_publish(
+                exchange=EXCHANGE_LATIDOS,
+                routing_key='',
+                body=json.dumps({
+                    "worker_id": self.worker_id,
+                    "procesados": self.escenarios_procesados,
+                    "mensajes": self.mensajes_procesados,
+                    # Costo por escenario de las ejecuciones cargadas (tamano de lote del productor)
+                    "costos": {run_id: costo for run_id, costo in self.costos.items() if run_id in self.modelos},
+                    "prefetch": self.prefetch,
+                    "tiempo_mensaje": self.tiempo_mensaje,
+                    "rtt": self.rtt,
+                    "shards": sorted(self.shards),
+                    "timestamp": time.time()
+                }).encode('utf-8'),
+                properties=pika.BasicProperties(delivery_mode=1, # Transitorio
+                                                expiration=str(LATIDO_INTERVALO * 1000))
+            )
+        except Exception as e:
+            print(f"[ADVERTENCIA] Worker {self.worker_id} - No se pudo publicar latido: {e}")
+        self.programar_latido()
+    
+    # Empieza a consumir los shards asignados que aun no consume (por cada perfil)
+    # El QoS es por consumidor: confirmed-batch necesita un lote completo sin ack en vuelo
+    def consumir_shards(self, num_shards):
+        nuevos = [s for s in shards_de_worker(self.worker_id, num_shards) if s not in self.shards]
+        if not nuevos:
+            return
+        channel = self.gestor.canal()
+        for shard in nuevos:
+            self.shards.add(shard)
+            for perfil in PERFILES:
+                cola = cola_escenarios(perfil, shard)
+                declarar_cola(channel, cola, perfil)
+                # El limite real lo pone el prefetch adaptativo del canal (compartido por todos
+                # los shards); confirmed-batch necesita ademas un lote completo por consumidor
+                prefetch = LOTE_CONFIRMACION if obtener_perfil(perfil)['confirmado'] else PREFETCH_MAXIMO
+                # Los consumidores se vuelven a registrar si se reconecta
+                self.gestor.consumir(cola, self.crear_callback(perfil, shard), prefetch=prefetch)
+        print(f"[INFORMACION] Worker {self.worker_id} - Shards asignados: {sorted(self.shards)}")
+    
+    # Procesa escenarios de la cola
+    def procesar_escenarios(self):
+        print(f"[*] Worker {self.worker_id} procesando escenarios...\n")
         
-        # Consumir escenarios
-        self.channel.basic_consume(
-            queue=QUEUE_ESCENARIOS,
-            on_message_callback=callback,
-            auto_ack=False
-        )
+        # Consumir los shards asignados (si el productor usa mas, llegan en el modelo
+        # o con el comando 'ajustar_shards')
+        self.consumir_shards(NUM_SHARDS)
+        
+        # Consumir comandos de control en el mismo canal
+        self.gestor.consumir(self.cola_control, self.procesar_control, prefetch=1)
+        
+        # Prefetch compartido del canal (se ajusta en cada latido) y primer latido
+        self.gestor.ajustar_prefetch(self.prefetch)
+        self.programar_latido()
         
         try:
-            self.channel.start_consuming()
+            self.gestor.iniciar_consumo()
         except KeyboardInterrupt:
-            self.channel.stop_consuming()
+            self.gestor.detener_consumo()
     
     # Cerrar la conexion
     def cerrar(self):
-        if self.connection:
-            self.connection.close()
+        try:
+            # No dejar resultados del perfil confirmed-batch sin confirmar
+            if self.gestor.conectado():
+                self.confirmar_lote()
+        except Exception:
+            pass
+        self.gestor.cerrar()
 
 def main():
     if len(sys.argv) < 2:
@@ -181,28 +602,12 @@ def main():
         # Conectar
         worker.conectar()
         
-        # Intentar leer modelo
-        max_intentos = 10
-        intentos = 0
-        
-        print(f"[*] Worker {worker_id} - Intentando leer modelo de la cola...")
-        while worker.esperando_modelo and intentos < max_intentos: # Esperando a leer el modelo
-            if worker.leer_modelo():
-                break
-            intentos += 1
-            print(f"[*] Worker {worker_id} - Esperando modelo... (intento {intentos}/{max_intentos})")
-            time.sleep(2)
-        
-        if worker.esperando_modelo: # Si despues de los intentos aun esta esperando modelo
-            print(f"\n[!] Worker {worker_id} - No se encontró modelo disponible.")
-            print(f"[*] Asegúrate de ejecutar primero:")
-            print(f"    python productor.py <modelo.json>")
-            print()
-            sys.exit(1)
-        
-        # Procesar escenarios con el modelo leido
+        # Procesar escenarios de cualquier ejecucion activa
+        # (el modelo de cada ejecucion se lee cuando llega su primer escenario)
         print(f"[*] Worker {worker_id} - Comenzando a procesar escenarios...")
         worker.procesar_escenarios()
+        if worker.drenando:
+            print(f"[EXITO] Worker {worker_id} drenado ({worker.escenarios_procesados} escenarios procesados)")
         
     except KeyboardInterrupt:
         print(f"\n\n{'=' * 50}")